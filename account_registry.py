@@ -0,0 +1,61 @@
+import bisect
+
+from description_index import REGEX_SPECIAL
+
+'''Registry of account usernames with O(1) membership and a sorted index for prefix queries.'''
+class AccountRegistry:
+    def __init__(self, usernames=()):
+        self.usernames = {} # ordered set {username: None} in registration order
+        self.sorted_usernames = [] # every username in sorted order for prefix queries
+        self.version = 0 # bumped by every registration and deletion
+        for username in usernames:
+            self.add(username)
+
+    def __contains__(self, username):
+        return username in self.usernames
+
+    def __len__(self):
+        return len(self.usernames)
+
+    '''Iterates over a copy of the usernames so accounts can be registered or deleted meanwhile.'''
+    def __iter__(self):
+        return iter(list(self.usernames))
+
+    '''Adds a username. Returns False if it was already registered.'''
+    def add(self, username):
+        if username in self.usernames:
+            return False
+        self.usernames[username] = None
+        bisect.insort(self.sorted_usernames, username)
+        self.version += 1
+        return True
+
+    '''Removes a username. Raises KeyError if it is not registered.'''
+    def remove(self, username):
+        del self.usernames[username]
+        del self.sorted_usernames[bisect.bisect_left(self.sorted_usernames, username)]
+        self.version += 1
+
+    '''Returns the usernames starting with prefix in sorted order.'''
+    def with_prefix(self, prefix):
+        start = bisect.bisect_left(self.sorted_usernames, prefix)
+        end = start
+        while end < len(self.sorted_usernames) and self.sorted_usernames[end].startswith(prefix):
+            end += 1
+        return self.sorted_usernames[start:end]
+
+    '''Answers the empty pattern, "^prefix" and "^exact$" from the indexes. Returns None for any other pattern,
+    which has to be matched against every username.'''
+    def indexed_search(self, pattern):
+        if pattern == "":
+            return list(self.usernames)
+        if pattern.startswith("^"):
+            literal = pattern[1:]
+            exact = literal.endswith("$")
+            if exact:
+                literal = literal[:-1]
+            if not any(c in REGEX_SPECIAL for c in literal):
+                if exact:
+                    return [literal] if literal in self.usernames else []
+                return self.with_prefix(literal)
+        return None
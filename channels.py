@@ -0,0 +1,70 @@
+import threading
+
+import grpc
+
+import new_route_guide_pb2_grpc as proto_grpc
+
+# Ping an idle connection this often, and drop it if the ping is not answered in time, so a dead peer is noticed
+# before the next call instead of after a TCP timeout
+KEEPALIVE_MS = 10000
+KEEPALIVE_TIMEOUT_MS = 5000
+# Reconnect to a peer that went down after at most this long. gRPC's default backoff grows to two minutes, which
+# would outlast a failover
+MAX_RECONNECT_BACKOFF_MS = 1000
+
+CHANNEL_OPTIONS = [
+    ("grpc.keepalive_time_ms", KEEPALIVE_MS),
+    ("grpc.keepalive_timeout_ms", KEEPALIVE_TIMEOUT_MS),
+    ("grpc.keepalive_permit_without_calls", 1),
+    ("grpc.http2.max_pings_without_data", 0),
+    ("grpc.initial_reconnect_backoff_ms", 100),
+    ("grpc.min_reconnect_backoff_ms", 100),
+    ("grpc.max_reconnect_backoff_ms", MAX_RECONNECT_BACKOFF_MS),
+]
+
+# Servers accept the clients' keepalive pings instead of closing the connection for pinging too often
+SERVER_OPTIONS = [
+    ("grpc.keepalive_permit_without_calls", 1),
+    ("grpc.http2.min_recv_ping_interval_without_data_ms", KEEPALIVE_MS // 2),
+    ("grpc.http2.max_ping_strikes", 0),
+]
+
+'''One long-lived channel (and stub) per peer address, shared by everything that talks to that peer.
+
+A channel is created once, with keepalive and short reconnect backoff settings. Keepalive pings hold its connection
+open between calls, so it stays warm. Channels are kept when their peer goes down: gRPC reconnects them in the
+background, and a later failover reuses the existing channel instead of a new TCP and HTTP/2 handshake.
+'''
+class ChannelPool:
+    def __init__(self, options=CHANNEL_OPTIONS):
+        self.options = options
+        self.lock = threading.Lock()
+        self.channels = {} # {address: channel}
+        self.stubs = {} # {address: CalendarStub}
+
+        # Monitoring
+        self.channels_opened = 0
+
+    '''Returns the stub for a "host:port" address, opening its channel on first use.'''
+    def stub(self, address):
+        with self.lock:
+            stub = self.stubs.get(address)
+            if stub is None:
+                channel = grpc.insecure_channel(address, options=self.options)
+                self.channels[address] = channel
+                stub = self.stubs[address] = proto_grpc.CalendarStub(channel)
+                self.channels_opened += 1
+            return stub
+
+    '''Closes the channel to an address, if open.'''
+    def close(self, address):
+        with self.lock:
+            channel = self.channels.pop(address, None)
+            self.stubs.pop(address, None)
+        if channel is not None:
+            channel.close()
+
+    '''Closes every channel.'''
+    def close_all(self):
+        for address in list(self.channels):
+            self.close(address)
@@ -0,0 +1,93 @@
+import threading
+import time
+
+# Consecutive failed calls after which a peer is marked down
+FAILURES_TO_TRIP = 3
+# How often a peer that is down is probed
+PROBE_INTERVAL_SECONDS = 1.0
+
+'''Per-peer circuit breaker for the write path.
+
+Every replication call to a peer reports whether it succeeded. After FAILURES_TO_TRIP failures in a row the peer is
+marked down, and writes skip it instead of waiting for each call to fail. A background thread probes the peers that
+are down. Once a probe answers, on_recovered(peer) catches the peer up on the writes it missed and calls reset(peer)
+when the peer may rejoin the write path; if it does not, the peer stays down and is probed again.
+'''
+class CircuitBreaker:
+    def __init__(self, probe, on_recovered, failures_to_trip=FAILURES_TO_TRIP, probe_interval=PROBE_INTERVAL_SECONDS):
+        self.probe = probe # probe(peer) raises if the peer cannot be reached
+        self.on_recovered = on_recovered
+        self.failures_to_trip = failures_to_trip
+        self.probe_interval = probe_interval
+        self.lock = threading.Lock()
+        self.failures = {} # {peer: consecutive failed calls}
+        self.down = {} # {peer: when it was marked down}
+        self.prober = None
+
+        # Monitoring
+        self.trips = 0 # times a peer was marked down
+        self.recoveries = 0 # times a peer came back
+
+    def is_up(self, peer):
+        return peer not in self.down
+
+    '''Records the outcome of a call to a peer, marking it down after too many failures in a row.'''
+    def record(self, peer, success):
+        with self.lock:
+            if peer in self.down:
+                # Outcome of a call sent before the peer was marked down
+                return
+            if success:
+                self.failures[peer] = 0
+                return
+            self.failures[peer] = self.failures.get(peer, 0) + 1
+            if self.failures[peer] < self.failures_to_trip:
+                return
+            self.trip_locked(peer)
+        print("Backup is down, skipping it until it answers again")
+
+    '''Marks a peer down right away, for a peer that cannot take writes until it is caught up.'''
+    def trip(self, peer):
+        with self.lock:
+            if peer in self.down:
+                return
+            self.trip_locked(peer)
+        print("Backup is behind, skipping it until it is caught up")
+
+    '''Marks a peer down and starts probing. Caller holds the lock.'''
+    def trip_locked(self, peer):
+        self.down[peer] = time.monotonic()
+        self.trips += 1
+        if self.prober is None:
+            self.prober = threading.Thread(target=self.run, daemon=True)
+            self.prober.start()
+
+    '''Puts a peer back on the write path.'''
+    def reset(self, peer):
+        with self.lock:
+            self.failures[peer] = 0
+            if self.down.pop(peer, None) is not None:
+                self.recoveries += 1
+
+    '''Stops tracking a peer that left the cluster.'''
+    def forget(self, peer):
+        with self.lock:
+            self.failures.pop(peer, None)
+            self.down.pop(peer, None)
+
+    '''Prober loop: probes every peer that is down and lets the ones that answer recover.'''
+    def run(self):
+        while True:
+            time.sleep(self.probe_interval)
+            with self.lock:
+                peers = list(self.down)
+            for peer in peers:
+                try:
+                    self.probe(peer)
+                except Exception as e:
+                    # Still down
+                    continue
+                try:
+                    self.on_recovered(peer)
+                except Exception as e:
+                    print("Error catching up a recovered backup")
@@ -1,26 +1,42 @@
 from commands import *
-import grpc
 import new_route_guide_pb2 as proto
-import new_route_guide_pb2_grpc
+import grpc
 import atexit
 import os
 import datetime
+import threading
+import time
+
+from membership import load_members
+from channels import ChannelPool
 
 class CalendarClient:   
     '''Instantiates the CalendarClient and runs the user experience of cycling through calendar functionalities.'''
     def __init__(self, test=False):
+        # Background subscription that receives new events pushed by the server
+        self.subscribed = False
+        self.subscribed_user = None
+        # Read routing (READ_FROM_BACKUPS): LSN of this client's latest write, replicas taking turns serving reads,
+        # and the replica that served the last read, which holds the cursor for its next page
+        self.read_token = 0
+        self.read_replicas = []
+        self.next_read_replica = 0
+        self.read_replica = None
+        # One kept-alive channel per server, reused by every failover instead of reconnecting
+        self.channels = ChannelPool()
+
         if test:
             return 
         
         '''
-        List of ports of replicas in order of priority (for power transfer)
-        List will decrease in size as servers go down; first port in list is the leader
+        Addresses of the replicas, asked in this order which server is the leader
         '''
-        self.replica_addresses = [(SERVER1, PORT1), (SERVER2, PORT2), (SERVER3, PORT3)]
+        self.replica_addresses = [(member.host, member.port) for member in load_members()]
         self.connection = None
 
-        # Establish connection to first server
+        # Establish connection to first server, then learn of servers that joined the cluster since
         self.find_next_leader()
+        self.refresh_members()
 
         atexit.register(self.disconnect)
 
@@ -34,31 +50,86 @@ class CalendarClient:
         self.notify_new_event()
         
         while self.logged_in:
+            # (Re)subscribe after logging in as a new user or after the stream dropped
+            if self.subscribed_user != self.username:
+                self.subscribe_to_events()
             self.display_menu()
-            self.notify_new_event()
+            # Poll only if the server is not pushing events to us
+            if not self.subscribed:
+                self.notify_new_event()
 
-    '''Finds the next leader when the existing leader was down'''
+    '''Finds the current leader by asking the replicas which server leads, waiting out an election if one is running'''
     def find_next_leader(self):
-        while len(self.replica_addresses) > 0:
-            current_leader_server, current_leader_port = self.replica_addresses[0]
-            try:
-                self.connection = new_route_guide_pb2_grpc.CalendarStub(grpc.insecure_channel(f"{current_leader_server}:{current_leader_port}"))
-                response = self.connection.alive_ping(proto.Text(text=IS_ALIVE))
-                if response.text == LEADER_ALIVE:
-                    # Send message notifying new server that they're the leader
-                    confirmation = self.connection.notify_leader(proto.Text(text=LEADER_NOTIFICATION))
-                    if confirmation.text == LEADER_CONFIRMATION:
+        deadline = time.monotonic() + FAILOVER_WAIT_SECONDS
+        while time.monotonic() < deadline:
+            for server, port in self.replica_addresses:
+                try:
+                    replica = self.channels.stub(f"{server}:{port}")
+                    leader = replica.get_leader(proto.Empty(), timeout=HEARTBEAT_INTERVAL_SECONDS)
+                    if leader.address == "":
+                        # This replica is voting in an election
+                        continue
+                    connection = self.channels.stub(leader.address)
+                    response = connection.alive_ping(proto.Text(text=IS_ALIVE), timeout=HEARTBEAT_INTERVAL_SECONDS)
+                    if response.text == LEADER_ALIVE:
+                        self.connection = connection
                         return
-                
-                # If for some reason, it gets here (failure), remove current leader from list of ports
-                self.replica_addresses.pop(0)
-            except Exception as e:
-                # Remove current leader from list of ports
-                self.replica_addresses.pop(0)
-        
+                except Exception as e:
+                    # This replica or the leader it knows of is down, ask the next replica
+                    continue
+            # No replica knows of a live leader yet; the backups elect one within an election timeout
+            time.sleep(HEARTBEAT_INTERVAL_SECONDS)
+
         print("Could not connect to any server (all replicas down).")
         exit()
 
+    '''Replaces the replica addresses with the cluster's current members, as the leader knows them'''
+    def refresh_members(self):
+        try:
+            members = self.connection.get_members(proto.Empty(), timeout=HEARTBEAT_INTERVAL_SECONDS)
+        except Exception as e:
+            # Keep the configured addresses
+            members = None
+        if members is not None and len(members.members) > 0:
+            self.replica_addresses = [(member.host, member.port) for member in members.members]
+        if READ_FROM_BACKUPS:
+            self.read_replicas = [self.channels.stub(f"{server}:{port}") for server, port in self.replica_addresses]
+
+    '''Sends a read RPC and returns its response. With READ_FROM_BACKUPS the replicas take turns answering reads,
+    each only once it has applied this client's writes and is within MAX_READ_STALENESS operations of the leader.
+    Reads a replica cannot answer go to the leader, which raises if it is down. Pass the replica that served the
+    previous page to continue a paged read.'''
+    def read(self, method, request, replica=None):
+        self.read_replica = self.connection
+        if READ_FROM_BACKUPS and len(self.read_replicas) > 0 and replica is not self.connection:
+            if replica is None:
+                replica = self.read_replicas[self.next_read_replica % len(self.read_replicas)]
+                self.next_read_replica += 1
+            request.min_lsn = self.read_token
+            request.max_lag = MAX_READ_STALENESS
+            try:
+                response = getattr(replica, method)(request)
+                if method == "check_user_exists":
+                    status = response.text
+                else:
+                    # Streams are read in full here, so a replica that is behind can be skipped before printing
+                    response = list(response)
+                    status = ""
+                    if len(response) > 0:
+                        status = response[0].returntext if method == "search_events" else response[0].text
+                if status != REPLICA_BEHIND:
+                    self.read_replica = replica
+                    return response
+            except Exception as e:
+                # The replica is down, read from the leader
+                pass
+        return getattr(self.connection, method)(request)
+
+    '''Remembers the LSN of a write so later reads from backups include it.'''
+    def remember_write(self, response):
+        if READ_FROM_BACKUPS:
+            self.read_token = max(self.read_token, response.lsn)
+
     '''Disconnect logs out user when process is interrupted.'''
     def disconnect(self):
         print("Disconecting...")
@@ -93,16 +164,19 @@ class CalendarClient:
             self.display_events()
         elif action == "3":
             print("Press 0 to search by user.")
-            # print("Press 1 to search by start time.")
             print("Press 1 to search by description.")
+            print("Press 2 to search by keywords.")
+            print("Press 3 to search by time.")
 
             option = input("What would you like to do?\n")
             if option=="0":
                 self.search_events(option=SEARCH_USER)
             elif option=="1":
-            #     self.search_events(option=SEARCH_TIME)
-            # elif option=="2":
                 self.search_events(option=SEARCH_DESCRIPTION)
+            elif option=="2":
+                self.search_events(option=SEARCH_KEYWORD)
+            elif option=="3":
+                self.search_events(option=SEARCH_TIME)
             else:
                 print("Invalid input. Try again.")
         elif action == "4":
@@ -151,6 +225,7 @@ class CalendarClient:
                     response = self.connection.login_user(new_text)
                 
                 print(response.text)
+                self.remember_write(response)
                 done = True
 
                 if response.text == LOGIN_SUCCESSFUL:
@@ -166,20 +241,31 @@ class CalendarClient:
 
     '''Displays username accounts for the user to preview given prompt.'''
     def display_accounts(self):
-        recipient = input("What users would you like to see? Use a regular expression. Enter nothing to view all.\n")
+        recipient = input("What users would you like to see? Use a regular expression (start with ^ to match the beginning of usernames). Enter nothing to view all.\n")
         new_text = proto.Text()
         new_text.text = recipient
+        new_text.page_size = PAGE_SIZE
         print("\nUsers:")
-        done = False
-        while not done:
-            try:
-                accounts = self.connection.display_accounts(new_text)
-                for account in accounts:
-                    print(account.text)
-                done = True
-            except Exception as e:
-                # Power transfer to a backup replica
-                self.find_next_leader()
+        replica = None
+        while new_text is not None:
+            next_page_token = ""
+            done = False
+            while not done:
+                try:
+                    accounts = self.read("display_accounts", new_text, replica=replica)
+                    for account in accounts:
+                        print(account.text)
+                        next_page_token = account.next_page_token
+                    done = True
+                except Exception as e:
+                    # Power transfer to a backup replica
+                    self.find_next_leader()
+
+            # Fetch the next page only if the user asks for it, from the replica holding the listing
+            replica = self.read_replica
+            new_text = None
+            if next_page_token != "" and input("Enter m to see more users.\n") == "m":
+                new_text = proto.Text(page_token=next_page_token, page_size=PAGE_SIZE)
 
 
     '''Logs out user.'''
@@ -243,6 +329,32 @@ class CalendarClient:
                 self.find_next_leader()
 
 
+    '''Subscribes to events pushed by the server on a background thread.'''
+    def subscribe_to_events(self):
+        self.subscribed = True
+        self.subscribed_user = self.username
+        listener = threading.Thread(target=self.listen_for_events, args=(self.username,), daemon=True)
+        listener.start()
+
+
+    '''Prints pushed events until the subscription ends, then falls back to polling. A dropped stream (for example,
+    the leader went down) is subscribed again from the menu loop; a server at capacity is only polled.'''
+    def listen_for_events(self, username):
+        at_capacity = False
+        try:
+            events = self.connection.subscribe_events(proto.Text(text=username))
+            for event in events:
+                self.print_event(event)
+        except Exception as e:
+            # Polling takes over until the next subscription
+            at_capacity = isinstance(e, grpc.RpcError) and e.code() == grpc.StatusCode.RESOURCE_EXHAUSTED
+
+        if self.subscribed_user == username:
+            self.subscribed = False
+            if not at_capacity:
+                self.subscribed_user = None
+
+
     '''Helper function to ask for date.'''
     def prompt_date(self):
         os.system(f'cal')
@@ -342,6 +454,7 @@ class CalendarClient:
             try:
                 response = self.connection.schedule_public_event(new_event)
                 print(response.text)
+                self.remember_write(response)
                 done = True
             except Exception as e:
                 # Power transfer to a backup replica
@@ -358,7 +471,7 @@ class CalendarClient:
             done = False
             while not done:
                 try:
-                    response = self.connection.check_user_exists(proto.Text(text=guest))
+                    response = self.read("check_user_exists", proto.Text(text=guest))
                     done = True
                 except Exception as e:
                     # Power transfer to a backup replica
@@ -379,6 +492,7 @@ class CalendarClient:
             try:
                 response = self.connection.schedule_private_event(new_event)
                 print(response.text)
+                self.remember_write(response)
                 done = True
             except Exception as e:
                 # Power transfer to a backup replica
@@ -392,13 +506,13 @@ class CalendarClient:
 
     '''Searches for events for the user.'''
     def search_events(self, display_all=False, option=None, user=None):
-        # 0 = user, 1 = description
+        # 0 = user, 1 = description, 2 = keywords, 3 = time
         done = False
         events = []
         if display_all:
             while not done:
                 try:
-                    events = self.connection.search_events(proto.Search(function=SEARCH_ALL_EVENTS,value=""))
+                    events = self.read("search_events", proto.Search(function=SEARCH_ALL_EVENTS,value="",page_size=PAGE_SIZE))
                     done = True
                 except Exception as e:
                     # Power transfer to a backup replica
@@ -408,7 +522,7 @@ class CalendarClient:
             if option==DISPLAY_USER:
                 while not done:
                     try:
-                        events = self.connection.search_events(proto.Search(function=SEARCH_USER,value=user))
+                        events = self.read("search_events", proto.Search(function=SEARCH_HOST,value=user))
                         done = True
                     except Exception as e:
                         # Power transfer to a backup replica
@@ -418,7 +532,7 @@ class CalendarClient:
                 value=input("What's the user you'd like to search by?\n")
                 while not done:
                     try:
-                        events = self.connection.search_events(proto.Search(function=SEARCH_USER,value=value))
+                        events = self.read("search_events", proto.Search(function=SEARCH_USER,value=value,page_size=PAGE_SIZE))
                         done = True
                     except Exception as e:
                         # Power transfer to a backup replica
@@ -428,19 +542,68 @@ class CalendarClient:
                 value=input("What's the description you'd like to search by?\n")
                 while not done:
                     try:
-                        events = self.connection.search_events(proto.Search(function=SEARCH_DESCRIPTION,value=value))
+                        events = self.read("search_events", proto.Search(function=SEARCH_DESCRIPTION,value=value,page_size=PAGE_SIZE))
+                        done = True
+                    except Exception as e:
+                        # Power transfer to a backup replica
+                        self.find_next_leader()
+
+            elif option==SEARCH_TIME:
+                year, month, day, hour = self.prompt_date()
+                starttime = int(datetime.datetime(int(year), int(month), int(day), int(hour)).timestamp())
+                days = None
+                while days is None:
+                    try:
+                        days = int(input("How many days of events would you like to see?\n"))
+                    except:
+                        print("Number of days inputted incorrectly")
+                value = str(starttime) + SEPARATOR + str(starttime + days * 24 * 60 * 60)
+                if input("Enter y to only see events on your calendar.\n") == "y":
+                    value += SEPARATOR + self.username
+                while not done:
+                    try:
+                        events = self.read("search_events", proto.Search(function=SEARCH_TIME,value=value,page_size=PAGE_SIZE))
+                        done = True
+                    except Exception as e:
+                        # Power transfer to a backup replica
+                        self.find_next_leader()
+
+            elif option==SEARCH_KEYWORD:
+                value=input("What keywords would you like to search by? Separate keywords with spaces.\n")
+                while not done:
+                    try:
+                        events = self.read("search_events", proto.Search(function=SEARCH_KEYWORD,value=value,page_size=PAGE_SIZE))
+                        done = True
+                    except Exception as e:
+                        # Power transfer to a backup replica
+                        self.find_next_leader()
+        self.print_event_pages(events, paged=option!=DISPLAY_USER)
+
+
+    '''Prints streamed events. For paged searches, fetches and prints the next page while the user asks for more.'''
+    def print_event_pages(self, events, paged=True):
+        while events is not None:
+            next_page_token = ""
+            try:
+                for event in events:
+                    if event.returntext in (NO_MATCH, INVALID_PAGE_TOKEN, INVALID_PATTERN, SEARCH_TOO_EXPENSIVE):
+                        print(event.returntext)
+                        return
+                    self.print_event(event)
+                    next_page_token = event.next_page_token
+            except Exception as e:
+                return
+
+            events = None
+            if paged and next_page_token != "" and input("Enter m to see more events.\n") == "m":
+                done = False
+                while not done:
+                    try:
+                        events = self.read("search_events", proto.Search(page_token=next_page_token,page_size=PAGE_SIZE), replica=self.read_replica)
                         done = True
                     except Exception as e:
                         # Power transfer to a backup replica
                         self.find_next_leader()
-        try:
-            for event in events:
-                if event.returntext==NO_MATCH:
-                    print(NO_MATCH)
-                    return
-                self.print_event(event)
-        except Exception as e:
-            return
 
 
     '''Edits an event for the user.'''
@@ -466,7 +629,7 @@ class CalendarClient:
         done = False
         while not done:
             try:
-                user_events = self.connection.search_events(proto.Search(function=SEARCH_USER,value=self.username))
+                user_events = self.read("search_events", proto.Search(function=SEARCH_HOST,value=self.username))
                 done = True
             except Exception as e:
                 # Power transfer to a backup replica
@@ -526,6 +689,7 @@ class CalendarClient:
             try:
                 response = self.connection.edit_event(updated_event)
                 print(response.text)
+                self.remember_write(response)
                 done = True
             except Exception as e:
                 # Power transfer to a backup replica
@@ -552,7 +716,7 @@ class CalendarClient:
         done = False
         while not done:
             try:
-                user_events = self.connection.search_events(proto.Search(function=SEARCH_USER,value=self.username))
+                user_events = self.read("search_events", proto.Search(function=SEARCH_HOST,value=self.username))
                 done = True
             except Exception as e:
                 # Power transfer to a backup replica
@@ -573,6 +737,7 @@ class CalendarClient:
             try:
                 response = self.connection.delete_event(proto.Event(id=event_id))
                 print(response.text)
+                self.remember_write(response)
                 done = True
             except Exception as e:
                 # Power transfer to a backup replica
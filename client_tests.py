@@ -3,6 +3,8 @@ from commands import *
 from unittest.mock import MagicMock
 from unittest.mock import patch
 from io import StringIO
+import new_route_guide_pb2 as proto
+import grpc
 
 # pytest client_tests.py
 
@@ -62,7 +64,7 @@ def test_display_accounts():
 
     # Setting up mocks
     client.connection = MagicMock()
-    client.connection.display_accounts = MagicMock(return_value=[MagicMock(text="dale"), MagicMock(text="dallen")])
+    client.connection.display_accounts = MagicMock(return_value=[MagicMock(text="dale", next_page_token=""), MagicMock(text="dallen", next_page_token="")])
 
     # Test registration
     with patch("builtins.input", side_effect=["dale"]):
@@ -324,6 +326,45 @@ def test_delete_event():
         edited_event = client.connection.delete_event.call_args.args[0]
         assert edited_event.id == 1
 
+        # Permissions are checked with an exact host search
+        args = client.connection.search_events.call_args.args[0]
+        assert args.function == SEARCH_HOST
+        assert args.value == "alyssa"
+
+
+"""Testing events pushed by the server subscription"""
+def test_listen_for_events():
+    client = CalendarClient(test=True)
+
+    # Setting up mocks
+    client.username = "alyssa"
+    client.connection = MagicMock()
+    client.connection.subscribe_events = MagicMock(return_value=[MagicMock(id=1, host="maegan", description="pushed", guestlist="All", starttime=1683003600, duration=1)])
+    client.subscribed = True
+    client.subscribed_user = "alyssa"
+
+    # Test that pushed events are printed and polling resumes when the stream ends
+    with patch('sys.stdout', new = StringIO()) as terminal_output, patch.object(proto, "Text", side_effect=lambda text: text):
+        client.listen_for_events("alyssa")
+        assert "[1] Event By maegan" in terminal_output.getvalue()
+        assert "Event Description: pushed" in terminal_output.getvalue()
+
+    assert client.connection.subscribe_events.call_args.args[0] == "alyssa"
+    assert not client.subscribed
+    # The menu loop subscribes again, so a failover does not leave the client polling for good
+    assert client.subscribed_user is None
+
+    # A server at capacity is polled instead of being asked again
+    class AtCapacity(grpc.RpcError):
+        def code(self):
+            return grpc.StatusCode.RESOURCE_EXHAUSTED
+    client.connection.subscribe_events = MagicMock(side_effect=AtCapacity())
+    client.subscribed = True
+    client.subscribed_user = "alyssa"
+    client.listen_for_events("alyssa")
+    assert not client.subscribed
+    assert client.subscribed_user == "alyssa"
+
 
 """Testing searching events"""""
 def test_search_events():
@@ -355,3 +396,106 @@ def test_search_events():
         args = client.connection.search_events.call_args.args[0]
         assert args.function == SEARCH_DESCRIPTION
         assert args.value == "description"
+
+    # Test searching events by time window on the user's calendar
+    with patch("builtins.input", side_effect=["2023", "5", "2", "1", "7", "y"]):
+        client.search_events(option=SEARCH_TIME)
+        args = client.connection.search_events.call_args.args[0]
+        assert args.function == SEARCH_TIME
+        assert args.value == "1683003600: 1683608400: alyssa"
+
+    # Test searching events by keywords
+    with patch("builtins.input", side_effect=["team review"]):
+        client.search_events(option=SEARCH_KEYWORD)
+        assert client.connection.search_events.call_count == 5
+        args = client.connection.search_events.call_args.args[0]
+        assert args.function == SEARCH_KEYWORD
+        assert args.value == "team review"
+
+
+"""Testing paged search results"""
+def test_search_events_pages():
+    client = CalendarClient(test=True)
+
+    # Setting up mocks
+    client.username = "alyssa"
+    client.connection = MagicMock()
+    client.print_event = MagicMock()
+    first_page = [MagicMock(id=1, returntext="", next_page_token=""), MagicMock(id=2, returntext="", next_page_token="token")]
+    last_page = [MagicMock(id=3, returntext="", next_page_token="")]
+    client.connection.search_events = MagicMock(side_effect=[first_page, last_page])
+
+    # Test asking for the next page resumes the search by token
+    with patch("builtins.input", side_effect=["m"]):
+        client.search_events(display_all=True)
+    assert client.connection.search_events.call_args_list[0].args[0].page_size == PAGE_SIZE
+    args = client.connection.search_events.call_args_list[1].args[0]
+    assert args.page_token == "token"
+    assert args.page_size == PAGE_SIZE
+    assert [call.args[0].id for call in client.print_event.call_args_list] == [1, 2, 3]
+
+    # Test stopping after the first page
+    client.connection.search_events = MagicMock(side_effect=[first_page])
+    with patch("builtins.input", side_effect=[""]):
+        client.search_events(display_all=True)
+    client.connection.search_events.assert_called_once()
+
+
+"""Testing that reads from backups rotate between replicas, skip replicas that are behind and carry the write token"""
+def test_read_from_backups():
+    client = CalendarClient(test=True)
+
+    # Setting up mocks: the first backup is behind, the second one is current
+    client.username = "alyssa"
+    client.connection = MagicMock()
+    client.print_event = MagicMock()
+    behind, current = MagicMock(), MagicMock()
+    behind.search_events = MagicMock(return_value=iter([MagicMock(returntext=REPLICA_BEHIND)]))
+    current.search_events = MagicMock(side_effect=[[MagicMock(id=2, returntext="", next_page_token="token")], [MagicMock(id=3, returntext="", next_page_token="")]])
+    client.connection.search_events = MagicMock(return_value=[MagicMock(id=1, returntext="", next_page_token="")])
+    client.read_replicas = [behind, current]
+
+    with patch("client.READ_FROM_BACKUPS", True):
+        # Reads ask for this client's latest write
+        client.remember_write(MagicMock(lsn=7))
+
+        # The backup that is behind is skipped for the leader
+        client.search_events(display_all=True)
+        assert behind.search_events.call_args.args[0].min_lsn == 7
+        assert behind.search_events.call_args.args[0].max_lag == MAX_READ_STALENESS
+        client.connection.search_events.assert_called_once()
+
+        # The next read goes to the other backup, which also serves the next page
+        with patch("builtins.input", side_effect=["m"]):
+            client.search_events(display_all=True)
+        assert current.search_events.call_args.args[0].page_token == "token"
+        client.connection.search_events.assert_called_once()
+    assert [call.args[0].id for call in client.print_event.call_args_list] == [1, 2, 3]
+
+
+"""Testing that failovers reuse one kept-alive channel per server"""
+def test_channel_reuse():
+    client = CalendarClient(test=True)
+
+    # Setting up mocks: the first server knows the second one leads
+    client.replica_addresses = [("localhost", 1), ("localhost", 2)]
+    replica, leader = MagicMock(), MagicMock()
+    replica.get_leader = MagicMock(return_value=MagicMock(address="localhost:2"))
+    leader.alive_ping = MagicMock(return_value=MagicMock(text=LEADER_ALIVE))
+    client.channels.stubs = {"localhost:1": replica, "localhost:2": leader}
+
+    client.find_next_leader()
+    client.find_next_leader()
+    assert client.connection is leader
+    assert replica.get_leader.call_count == 2
+    assert client.channels.channels_opened == 0
+
+    # A channel is opened once per address until it is closed
+    client.channels.stubs = {}
+    stub = client.channels.stub("localhost:1")
+    assert client.channels.stub("localhost:1") is stub
+    assert client.channels.channels_opened == 1
+    client.channels.close("localhost:1")
+    assert client.channels.stub("localhost:1") is not stub
+    client.channels.close_all()
+    assert client.channels.channels == {}
@@ -15,6 +15,36 @@ ADDRESS2 = (SERVER2, PORT2)
 ADDRESS3 = (SERVER3, PORT3)
 
 REPLICA_IDS = [(1, ADDRESS1), (2, ADDRESS2), (3, ADDRESS3)]
+# Optional file listing the cluster's servers, one "id host port" line each ("id host port reader" for read
+# replicas). When it is missing the cluster is REPLICA_IDS. Servers can also join a running cluster
+CLUSTER_FILE = "cluster.txt"
+
+# Leader election: the leader sends heartbeats this often, and a backup that hears none for a random time within
+# the election timeout starts an election
+HEARTBEAT_INTERVAL_SECONDS = 0.5
+ELECTION_TIMEOUT_SECONDS = (1.5, 3.0)
+# How long a client keeps looking for a leader before giving up
+FAILOVER_WAIT_SECONDS = 10
+
+# Read routing: with READ_FROM_BACKUPS, clients spread searches and account lookups over every replica. A backup
+# answers only once it has applied the client's own writes and is at most MAX_READ_STALENESS operations behind the
+# leader, waiting up to READ_WAIT_SECONDS to catch up; otherwise the client reads from the leader
+## Edit to read from backups
+READ_FROM_BACKUPS = False
+MAX_READ_STALENESS = 16
+READ_WAIT_SECONDS = 0.5
+
+# Replication acknowledgment: the leader answers a write once every backup has responded (sync), once a majority
+# of servers has applied it (quorum), or right away while backups catch up in the background (async)
+ACK_SYNC = "sync"
+ACK_QUORUM = "quorum"
+ACK_ASYNC = "async"
+## Edit to choose the replication policy of this deployment
+REPLICATION_ACK_MODE = ACK_SYNC
+# Most writes an async leader lets run ahead of its backups; further writes wait for room
+MAX_IN_FLIGHT_WRITES = 128
+# A batch a backup has not answered within this long fails, so a hung backup cannot stall writes
+REPLICATION_TIMEOUT_SECONDS = 2
 
 # Data Types
 PURPOSE = "!PURPOSE:"
@@ -57,6 +87,8 @@ EVENT_EDITED = "Event edited."
 EVENT_CONFLICT = "Event conflicts with already existing events."
 UPDATE_SUCCESSFUL = "Update successful."
 EVENT_DELETED = "Event deleted."
+MEMBER_ADDED = "Member added."
+MEMBER_REMOVED = "Member removed."
 
 ACTION_UNSUCCESSFUL = "Action Unsuccessful."
 
@@ -65,14 +97,25 @@ LEADER_ALIVE = "Leader is alive."
 IS_ALIVE = "Are you alive?"
 LEADER_NOTIFICATION = "Leader notification." # Notifies backup that they are now leader
 LEADER_CONFIRMATION = "Leader confirmation." # Notifies client that backup is now leader
+NOT_LEADER = "This server is not the leader." # Refuses a client write sent to a backup
+STALE_TERM = "This write is from the leader of an earlier term." # Refuses a replicated write from a replaced leader
 
 # Search actions
 SEARCH_ALL_EVENTS = "give all events"
 SEARCH_USER = "give by user"
-SEARCH_TIME = "give by time"
+SEARCH_HOST = "give by host" # exact host username
+SEARCH_PARTICIPANT = "give by participant" # exact username of host or guest
+SEARCH_TIME = "give by time" # value is "start: end" or "start: end: username" in epoch seconds
 SEARCH_DESCRIPTION = "give by description"
+SEARCH_KEYWORD = "give by keyword" # space separated words, each matched as a word prefix
 DISPLAY_USER = "display by user"
 NO_MATCH = "No event matches this!"
+INVALID_PAGE_TOKEN = "These results have expired. Please search again."
+INVALID_PATTERN = "That is not a valid regular expression."
+SEARCH_TOO_EXPENSIVE = "That search took too long. Please try a simpler pattern."
+REPLICA_BEHIND = "This replica is behind the leader."
+# Results the client asks for per page of a search or account listing
+PAGE_SIZE = 20
 
 # Other
 DISCONNECT_MESSAGE = "!DISCONNECT"
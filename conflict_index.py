@@ -0,0 +1,192 @@
+import random
+
+SECONDS_PER_HOUR = 3600
+
+'''Returns the half-open [start, end) interval of an event in integer epoch seconds.'''
+def event_interval(starttime, duration):
+    return starttime, starttime + duration * SECONDS_PER_HOUR
+
+
+'''Node of the interval tree. Keyed by (start, event_id) and augmented with the largest end time in its subtree.'''
+class IntervalNode:
+    def __init__(self, start, end, event_id):
+        self.start = start
+        self.end = end
+        self.event_id = event_id
+        self.key = (start, event_id)
+        self.priority = random.random()
+        self.max_end = end
+        self.left = None
+        self.right = None
+
+    '''Recomputes the subtree max end after the children changed.'''
+    def update(self):
+        self.max_end = self.end
+        if self.left is not None and self.left.max_end > self.max_end:
+            self.max_end = self.left.max_end
+        if self.right is not None and self.right.max_end > self.max_end:
+            self.max_end = self.right.max_end
+
+
+'''Augmented interval tree (treap balanced) answering overlap queries in O(log n).'''
+class IntervalTree:
+    def __init__(self):
+        self.root = None
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    '''Inserts the interval [start, end) for the given event.'''
+    def insert(self, start, end, event_id):
+        self.root = self._insert(self.root, IntervalNode(start, end, event_id))
+        self.size += 1
+
+    def _insert(self, node, new_node):
+        if node is None:
+            return new_node
+        if new_node.key < node.key:
+            node.left = self._insert(node.left, new_node)
+            if node.left.priority > node.priority:
+                node = self._rotate_right(node)
+        else:
+            node.right = self._insert(node.right, new_node)
+            if node.right.priority > node.priority:
+                node = self._rotate_left(node)
+        node.update()
+        return node
+
+    '''Removes the interval [start, end) of the given event. Returns whether it was found.'''
+    def remove(self, start, event_id):
+        size = self.size
+        self.root = self._remove(self.root, (start, event_id))
+        return self.size != size
+
+    def _remove(self, node, key):
+        if node is None:
+            return None
+        if key < node.key:
+            node.left = self._remove(node.left, key)
+        elif key > node.key:
+            node.right = self._remove(node.right, key)
+        else:
+            self.size -= 1
+            return self._merge(node.left, node.right)
+        node.update()
+        return node
+
+    def _merge(self, left, right):
+        if left is None:
+            return right
+        if right is None:
+            return left
+        if left.priority > right.priority:
+            left.right = self._merge(left.right, right)
+            left.update()
+            return left
+        right.left = self._merge(left, right.left)
+        right.update()
+        return right
+
+    def _rotate_right(self, node):
+        child = node.left
+        node.left = child.right
+        node.update()
+        child.right = node
+        child.update()
+        return child
+
+    def _rotate_left(self, node):
+        child = node.right
+        node.right = child.left
+        node.update()
+        child.left = node
+        child.update()
+        return child
+
+    '''Returns the id of an event overlapping [start, end), or None if the range is free.'''
+    def find_overlap(self, start, end):
+        node = self.root
+        while node is not None:
+            if node.start < end and start < node.end:
+                return node.event_id
+            # If the left subtree reaches past start, any overlap must be there (classic interval tree argument)
+            if node.left is not None and node.left.max_end > start:
+                node = node.left
+            elif node.start < end:
+                node = node.right
+            else:
+                return None
+        return None
+
+
+'''Conflict index over all scheduled events.
+
+Public events occupy everyone's calendar, so they are kept in a shared tree. Private events are kept in one
+tree per participant (host and guests). A combined tree of every event answers conflicts for new public events.
+'''
+class ConflictIndex:
+    def __init__(self):
+        self.all_events = IntervalTree()
+        self.public_events = IntervalTree()
+        self.private_events = {} # {username: IntervalTree}
+        self.entries = {} # {event_id: (start, end, participants)}; participants is None for public events
+
+    '''Indexes an event. participants is None for public events, otherwise the usernames on the event.'''
+    def add(self, event_id, starttime, duration, participants=None):
+        start, end = event_interval(starttime, duration)
+        if participants is not None:
+            participants = tuple(dict.fromkeys(participants))
+        self.entries[event_id] = (start, end, participants)
+
+        self.all_events.insert(start, end, event_id)
+        if participants is None:
+            self.public_events.insert(start, end, event_id)
+        else:
+            for username in participants:
+                if username not in self.private_events:
+                    self.private_events[username] = IntervalTree()
+                self.private_events[username].insert(start, end, event_id)
+
+    '''Removes an event from the index. Returns the participants it was indexed under.'''
+    def remove(self, event_id):
+        if event_id not in self.entries:
+            return None
+        start, end, participants = self.entries.pop(event_id)
+
+        self.all_events.remove(start, event_id)
+        if participants is None:
+            self.public_events.remove(start, event_id)
+        else:
+            for username in participants:
+                tree = self.private_events.get(username)
+                if tree is None:
+                    continue
+                tree.remove(start, event_id)
+                if len(tree) == 0:
+                    del self.private_events[username]
+        return participants
+
+    '''Returns True if a public event in [start, end) would overlap any existing event.'''
+    def conflicts_public(self, starttime, duration):
+        start, end = event_interval(starttime, duration)
+        return self.all_events.find_overlap(start, end) is not None
+
+    '''Returns True if a private event in [start, end) would overlap a public event or any participant's private events.'''
+    def conflicts_private(self, starttime, duration, participants):
+        start, end = event_interval(starttime, duration)
+        if self.public_events.find_overlap(start, end) is not None:
+            return True
+        for username in participants:
+            tree = self.private_events.get(username)
+            if tree is not None and tree.find_overlap(start, end) is not None:
+                return True
+        return False
+
+
+'''Returns the usernames on a private event: the host followed by every guest.'''
+def event_participants(event):
+    participants = [event.host]
+    if event.guestlist:
+        participants.extend(event.guestlist.split(", "))
+    return participants
@@ -0,0 +1,67 @@
+import collections
+import secrets
+import threading
+import time
+
+# Most result cursors kept open at once; the least recently used ones are dropped first
+MAX_OPEN_CURSORS = 256
+# Seconds a cursor stays resumable after it was last used
+CURSOR_TTL_SECONDS = 300
+
+'''Open cursors over paged search results, keyed by an opaque resume token.
+
+A cursor keeps a reference to the full result sequence and the position of the next page. Event results are
+immutable snapshots (see EventSnapshot), so later pages are consistent with the first one and resuming costs nothing
+but slicing. Tokens can be reused until they expire, so a client can retry a page after a dropped connection.
+'''
+class CursorTable:
+    def __init__(self, max_cursors=MAX_OPEN_CURSORS, ttl=CURSOR_TTL_SECONDS):
+        self.lock = threading.Lock()
+        self.max_cursors = max_cursors
+        self.ttl = ttl
+        self.cursors = collections.OrderedDict() # {token: (expiry, results, position)} least recently used first
+
+    def __len__(self):
+        return len(self.cursors)
+
+    '''Opens a cursor resuming results at position. Returns its token.'''
+    def open(self, results, position):
+        token = secrets.token_hex(16)
+        now = time.monotonic()
+        with self.lock:
+            self.expire_locked(now)
+            while len(self.cursors) >= self.max_cursors:
+                self.cursors.popitem(last=False)
+            self.cursors[token] = (now + self.ttl, results, position)
+        return token
+
+    '''Returns the (results, position) a token resumes, or None if it is unknown or expired.'''
+    def resume(self, token):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.cursors.get(token)
+            if entry is None:
+                return None
+            expiry, results, position = entry
+            if expiry <= now:
+                del self.cursors[token]
+                return None
+            self.cursors[token] = (now + self.ttl, results, position)
+            self.cursors.move_to_end(token)
+            return results, position
+
+    '''Returns the end of the page starting at position and the token resuming after it ("" on the last page).
+    A page size of 0 or less means the rest of the results.'''
+    def page(self, results, position, page_size):
+        if page_size <= 0 or position + page_size >= len(results):
+            return len(results), ""
+        end = position + page_size
+        return end, self.open(results, end)
+
+    '''Drops expired cursors. Caller holds the lock.'''
+    def expire_locked(self, now):
+        while len(self.cursors) > 0:
+            token, (expiry, results, position) = next(iter(self.cursors.items()))
+            if expiry > now:
+                break
+            del self.cursors[token]
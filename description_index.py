@@ -0,0 +1,79 @@
+import bisect
+import re
+
+WORD = re.compile(r"\w+")
+NON_WORD = re.compile(r"\W+")
+# Characters with a special meaning in a regular expression; a pattern without them is a plain substring
+REGEX_SPECIAL = set(".^$*+?{}[]\\|()")
+
+'''Splits a description into lowercase word tokens.'''
+def tokenize(text):
+    return WORD.findall(text.lower())
+
+
+'''Inverted index from description tokens to event ids, with a sorted vocabulary for prefix queries.'''
+class DescriptionIndex:
+    def __init__(self):
+        self.postings = {} # {token: set of event ids}
+        self.vocabulary = [] # sorted list of every token in postings
+        self.event_tokens = {} # {event_id: set of tokens}
+
+    '''Indexes the description of an event.'''
+    def add(self, event_id, description):
+        tokens = set(tokenize(description or ""))
+        self.event_tokens[event_id] = tokens
+        for token in tokens:
+            if token not in self.postings:
+                self.postings[token] = set()
+                bisect.insort(self.vocabulary, token)
+            self.postings[token].add(event_id)
+
+    '''Removes an event from the index.'''
+    def remove(self, event_id):
+        for token in self.event_tokens.pop(event_id, ()):
+            event_ids = self.postings[token]
+            event_ids.discard(event_id)
+            if len(event_ids) == 0:
+                del self.postings[token]
+                del self.vocabulary[bisect.bisect_left(self.vocabulary, token)]
+
+    '''Returns the ids of events with a token starting with prefix.'''
+    def prefix_matches(self, prefix):
+        matches = set()
+        i = bisect.bisect_left(self.vocabulary, prefix)
+        while i < len(self.vocabulary) and self.vocabulary[i].startswith(prefix):
+            matches |= self.postings[self.vocabulary[i]]
+            i += 1
+        return matches
+
+    '''Returns the ids of events containing every query word, each matched as a token prefix.'''
+    def search(self, query):
+        words = tokenize(query)
+        if len(words) == 0:
+            return set()
+        # Most selective words first so the intersection shrinks quickly
+        posting_lists = sorted((self.prefix_matches(word) for word in words), key=len)
+        matches = set(posting_lists[0])
+        for event_ids in posting_lists[1:]:
+            matches &= event_ids
+            if len(matches) == 0:
+                break
+        return matches
+
+    '''Returns a superset of the event ids whose description can match the regular expression, or None
+    when the pattern cannot be narrowed with the index and every event must be scanned.'''
+    def regex_candidates(self, pattern):
+        if any(c in REGEX_SPECIAL for c in pattern):
+            return None
+        # A plain substring: words strictly inside it must be whole tokens and the last word
+        # must start a token if the substring has a word boundary before it
+        pieces = NON_WORD.split(pattern.lower())
+        required = [piece for piece in pieces[1:-1] if piece]
+        candidates = None
+        for token in required:
+            event_ids = self.postings.get(token, set())
+            candidates = set(event_ids) if candidates is None else candidates & event_ids
+        if len(pieces) > 1 and pieces[-1]:
+            event_ids = self.prefix_matches(pieces[-1])
+            candidates = event_ids if candidates is None else candidates & event_ids
+        return candidates
@@ -0,0 +1,114 @@
+import random
+import threading
+import time
+
+from commands import ELECTION_TIMEOUT_SECONDS
+
+FOLLOWER = "follower"
+CANDIDATE = "candidate"
+LEADER = "leader"
+
+'''Term and vote bookkeeping for electing a leader among the replicas, after Raft.
+
+Time is divided into numbered terms with at most one leader each. A leader sends heartbeats; a follower that hears
+none for a randomized election timeout starts a new term, votes for itself and asks the others for votes. Each
+server votes at most once per term, and only for candidates whose log has reached its own LSN, so the winner holds
+every write a majority acknowledged. Seeing a higher term makes any server a follower of that term.
+
+A server waits for its first heartbeat before timing out, so servers started before the leader (for example while
+the persistence server replays its log) do not elect one without it.
+'''
+class Election:
+    def __init__(self, id, timeout=ELECTION_TIMEOUT_SECONDS):
+        self.id = id
+        self.timeout = timeout # (shortest, longest) election timeout in seconds
+        self.lock = threading.Lock()
+        self.term = 0
+        self.voted_for = None # candidate this server voted for in the current term
+        self.leader_id = None # leader of the current term, once known
+        self.role = FOLLOWER
+        self.deadline = None # when a follower or candidate starts the next election
+        self.led_term = 0 # latest term this server led; its new writes carry it even after it steps down
+
+    '''Starts this server in a known term, following (or being) the given leader. Caller starts the timers.'''
+    def bootstrap(self, leader_id, term=1):
+        with self.lock:
+            self.term = term
+            self.leader_id = leader_id
+            self.role = LEADER if leader_id == self.id else FOLLOWER
+            if self.role == LEADER:
+                self.led_term = term
+
+    def reset_deadline(self):
+        self.deadline = time.monotonic() + random.uniform(*self.timeout)
+
+    '''The current term if this server leads it, else None.'''
+    def leading_term(self):
+        with self.lock:
+            return self.term if self.role == LEADER else None
+
+    '''Whether a follower or candidate has waited out its election timeout.'''
+    def timed_out(self):
+        with self.lock:
+            return self.role != LEADER and self.deadline is not None and time.monotonic() >= self.deadline
+
+    '''Moves to a newer term as a follower with no known leader. Caller holds the lock.'''
+    def advance_locked(self, term):
+        self.term = term
+        self.voted_for = None
+        self.leader_id = None
+        self.role = FOLLOWER
+
+    '''Records a heartbeat. Returns False if it comes from the leader of an older term.'''
+    def observe(self, term, leader_id):
+        with self.lock:
+            if term < self.term:
+                return False
+            if term > self.term:
+                self.advance_locked(term)
+            self.role = FOLLOWER
+            self.leader_id = leader_id
+            self.reset_deadline()
+            return True
+
+    '''Becomes a follower if another server reports a higher term. Returns whether it did.'''
+    def step_down(self, term):
+        with self.lock:
+            if term <= self.term:
+                return False
+            self.advance_locked(term)
+            self.reset_deadline()
+            return True
+
+    '''Decides a vote request. Returns whether the vote is granted.'''
+    def vote(self, term, candidate_id, candidate_lsn, lsn):
+        with self.lock:
+            if term < self.term:
+                return False
+            if term > self.term:
+                self.advance_locked(term)
+            if self.voted_for not in (None, candidate_id) or candidate_lsn < lsn:
+                return False
+            self.voted_for = candidate_id
+            self.reset_deadline()
+            return True
+
+    '''Starts a new term as a candidate voting for itself. Returns the new term.'''
+    def start_candidacy(self):
+        with self.lock:
+            self.term += 1
+            self.role = CANDIDATE
+            self.voted_for = self.id
+            self.leader_id = None
+            self.reset_deadline()
+            return self.term
+
+    '''Becomes leader of a term after winning its election. Returns False if the term has since moved on.'''
+    def win(self, term):
+        with self.lock:
+            if self.role != CANDIDATE or self.term != term:
+                return False
+            self.role = LEADER
+            self.leader_id = self.id
+            self.led_term = term
+            return True
@@ -0,0 +1,17 @@
+'''Immutable, versioned view of every event at one point in time.
+
+Event objects are never mutated once they are in the registry (edits replace them), so a snapshot only holds
+references: readers can stream it without locks while writers keep committing newer versions.
+'''
+class EventSnapshot:
+    def __init__(self, version=0, public_events=(), private_events=()):
+        self.version = version
+        self.public_events = tuple(public_events)
+        self.private_events = tuple(private_events)
+        self.events = self.public_events + self.private_events
+
+    def __len__(self):
+        return len(self.events)
+
+    def __iter__(self):
+        return iter(self.events)
@@ -0,0 +1,59 @@
+import threading
+from contextlib import contextmanager
+
+'''Reader-writer lock: any number of readers or a single writer.
+
+Writers are preferred: once a writer is waiting, new readers wait too, so a steady stream of searches cannot
+starve schedule/edit/delete. The lock is not reentrant.
+'''
+class ReadWriteLock:
+    def __init__(self):
+        self.condition = threading.Condition(threading.Lock())
+        self.readers = 0
+        self.writer = False
+        self.waiting_writers = 0
+
+    def acquire_read(self):
+        with self.condition:
+            while self.writer or self.waiting_writers > 0:
+                self.condition.wait()
+            self.readers += 1
+
+    def release_read(self):
+        with self.condition:
+            self.readers -= 1
+            if self.readers == 0:
+                self.condition.notify_all()
+
+    def acquire_write(self):
+        with self.condition:
+            self.waiting_writers += 1
+            while self.writer or self.readers > 0:
+                self.condition.wait()
+            self.waiting_writers -= 1
+            self.writer = True
+
+    def release_write(self):
+        with self.condition:
+            self.writer = False
+            self.condition.notify_all()
+
+    '''Context manager holding the lock for reading.'''
+    @contextmanager
+    def read_locked(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+
+'''Fixed set of locks shared out by key, so operations on different keys (usernames) rarely contend.'''
+class StripedLock:
+    def __init__(self, stripes=16):
+        self.locks = [threading.Lock() for _ in range(stripes)]
+
+    '''Returns the lock guarding the given key.'''
+    def lock_for(self, key):
+        return self.locks[hash(key) % len(self.locks)]
+
@@ -0,0 +1,131 @@
+import bisect
+import os
+import threading
+
+from commands import SEPARATOR
+
+# A checkpoint (line number, LSN, byte offset) is kept every this many lines
+LOG_CHECKPOINT_INTERVAL = 64
+
+'''Returns the log sequence number a log line starts with, or None for lines written before LSNs.'''
+def log_lsn(line):
+    if line.startswith("INFO:root:"):
+        line = line[len("INFO:root:"):]
+    field = line.split(SEPARATOR, 1)[0]
+    if field.isdigit():
+        return int(field)
+    return None
+
+
+'''Returns the term a numbered log line was written in, which follows its LSN, or 0 for lines written before terms.'''
+def log_term(line):
+    if line.startswith("INFO:root:"):
+        line = line[len("INFO:root:"):]
+    fields = line.split(SEPARATOR, 2)
+    if len(fields) == 3 and fields[1].isdigit():
+        return int(fields[1])
+    return 0
+
+
+'''Sparse index of an append-only log file.
+
+The index remembers how far it has read and, every LOG_CHECKPOINT_INTERVAL lines, the line number, LSN and byte
+offset of a line. Refreshing reads only what was appended since the last refresh, and reading a tail seeks to the
+nearest checkpoint instead of reading the file from the start, so catching a backup up costs time and memory in
+proportion to what it is missing rather than to the whole history.
+'''
+class LogIndex:
+    def __init__(self, path, interval=LOG_CHECKPOINT_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.lines = 0 # complete lines indexed so far
+        self.offset = 0 # byte offset just past the last indexed line
+        self.checkpoints = [] # [(line_number, offset)] every interval lines
+        self.lsn_checkpoints = [] # [(lsn, offset)] for checkpointed lines with an LSN, in LSN order
+
+    '''Indexes the complete lines appended since the last refresh.'''
+    def refresh(self):
+        with self.lock:
+            if not os.path.exists(self.path):
+                self.reset()
+                return
+            if os.path.getsize(self.path) < self.offset:
+                # The file was truncated and rewritten, start over
+                self.reset()
+            with open(self.path, "rb") as f:
+                f.seek(self.offset)
+                for raw in f:
+                    if not raw.endswith(b"\n"):
+                        # A line still being written; index it next time
+                        break
+                    if self.lines % self.interval == 0:
+                        self.checkpoints.append((self.lines, self.offset))
+                        lsn = log_lsn(raw.decode("utf-8"))
+                        if lsn is not None and (len(self.lsn_checkpoints) == 0 or lsn > self.lsn_checkpoints[-1][0]):
+                            self.lsn_checkpoints.append((lsn, self.offset))
+                    self.offset += len(raw)
+                    self.lines += 1
+
+    '''Whether the file's lines start with LSNs (files written before LSNs have none).'''
+    def numbered(self):
+        return len(self.lsn_checkpoints) > 0
+
+    '''LSN of the first line, or None if the file is empty or starts with a line written before LSNs.'''
+    def first_lsn(self):
+        if len(self.lsn_checkpoints) > 0 and self.lsn_checkpoints[0][1] == 0:
+            return self.lsn_checkpoints[0][0]
+        return None
+
+    '''Returns the number of complete lines in the file.'''
+    def count_lines(self):
+        self.refresh()
+        return self.lines
+
+    '''Yields the lines from a line number (counting from 0) to the end of the file.'''
+    def lines_from(self, line_number):
+        self.refresh()
+        i = bisect.bisect_right(self.checkpoints, (line_number, float("inf"))) - 1
+        if i < 0:
+            start_line, start = 0, 0
+        else:
+            start_line, start = self.checkpoints[i]
+        for position, line in enumerate(self.read_from(start), start=start_line):
+            if position >= line_number:
+                yield line
+
+    '''Yields the lines with an LSN greater than lsn, in file order.'''
+    def lines_after_lsn(self, lsn):
+        self.refresh()
+        i = bisect.bisect_right(self.lsn_checkpoints, (lsn, float("inf"))) - 1
+        start = 0 if i < 0 else self.lsn_checkpoints[i][1]
+        for line in self.read_from(start):
+            line_lsn = log_lsn(line)
+            if line_lsn is not None and line_lsn > lsn:
+                yield line
+
+    '''Returns the term of the line with an LSN, or None if the file has no line with it.'''
+    def term_at(self, lsn):
+        for line in self.lines_after_lsn(lsn - 1):
+            if log_lsn(line) == lsn:
+                return log_term(line)
+            return None
+        return None
+
+    '''Yields complete lines from a byte offset up to what has been indexed. A missing file has none.'''
+    def read_from(self, start):
+        end = self.offset
+        if start >= end:
+            return
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            position = start
+            while position < end:
+                raw = f.readline()
+                if not raw:
+                    break
+                position += len(raw)
+                yield raw.decode("utf-8")
@@ -0,0 +1,118 @@
+import collections
+import threading
+import time
+from concurrent import futures
+
+from commands import REPLICATION_TIMEOUT_SECONDS
+
+'''Ships batches to one peer over a long-lived ship_batches stream.
+
+Batches are queued and a background thread feeds them into a single bidirectional stream. The peer answers every
+batch in order, which resolves the future send() returned for it. The stream is opened when the first batch is
+queued. If it fails, every batch on it or waiting for it fails too, and the next batch opens a new stream. So a
+peer that is down costs one attempt per batch, the same as a unary call.
+
+A batch the peer has not answered within timeout seconds of being sent fails the stream the same way, and the
+stream is cancelled. So a peer that hangs without refusing connections costs at most timeout per stream.
+'''
+class LogShipper:
+    def __init__(self, open_stream, timeout=REPLICATION_TIMEOUT_SECONDS):
+        self.open_stream = open_stream # open_stream(batches) starts the RPC and returns an iterator of responses
+        self.timeout = timeout
+        self.condition = threading.Condition()
+        self.queue = collections.deque() # (batch, future) not yet written to the stream
+        self.outstanding = collections.deque() # (future, deadline) of batches on the stream, waiting for an answer
+        self.generation = 0 # bumped whenever a stream ends, so its request iterator stops
+        self.call = None # the open stream, cancelled when a batch times out
+        self.thread = None
+
+        # Monitoring
+        self.streams_opened = 0
+        self.batches_shipped = 0
+        self.batches_timed_out = 0
+
+    '''Queues a batch for the peer. Returns a future resolved with the peer's response.'''
+    def send(self, batch):
+        future = futures.Future()
+        with self.condition:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+                threading.Thread(target=self.expire, daemon=True).start()
+            self.queue.append((batch, future))
+            self.condition.notify_all()
+        return future
+
+    '''Shipper loop: waits for a batch, then keeps one stream open for as long as the peer answers.'''
+    def run(self):
+        while True:
+            with self.condition:
+                while len(self.queue) == 0:
+                    self.condition.wait()
+                generation = self.generation
+            self.streams_opened += 1
+            try:
+                call = self.open_stream(self.batches(generation))
+                with self.condition:
+                    self.call = call
+                    timed_out = self.generation != generation
+                if timed_out and hasattr(call, "cancel"):
+                    # A batch timed out while the stream was opening
+                    call.cancel()
+                for response in call:
+                    with self.condition:
+                        if self.generation != generation:
+                            # The stream timed out; its batches have already failed
+                            break
+                        future, deadline = self.outstanding.popleft()
+                    future.set_result(response)
+                error = ConnectionError("Log shipping stream closed")
+            except Exception as e:
+                error = e
+            self.end_stream(generation, error)
+
+    '''Request iterator of one stream: yields queued batches until the stream ends.'''
+    def batches(self, generation):
+        while True:
+            with self.condition:
+                while len(self.queue) == 0 and self.generation == generation:
+                    self.condition.wait()
+                if self.generation != generation:
+                    return
+                batch, future = self.queue.popleft()
+                self.outstanding.append((future, time.monotonic() + self.timeout))
+                self.batches_shipped += 1
+                self.condition.notify_all()
+            yield batch
+
+    '''Deadline loop: ends the stream when its oldest unanswered batch is past its deadline.'''
+    def expire(self):
+        while True:
+            with self.condition:
+                while len(self.outstanding) == 0:
+                    self.condition.wait()
+                future, deadline = self.outstanding[0]
+                remaining = deadline - time.monotonic()
+                if remaining > 0:
+                    self.condition.wait(remaining)
+                    continue
+                generation, call = self.generation, self.call
+                self.batches_timed_out += 1
+            if hasattr(call, "cancel"):
+                call.cancel()
+            self.end_stream(generation, TimeoutError(f"Batch not answered within {self.timeout} seconds"))
+
+    '''Fails the batches on or queued for a stream that ended and stops its request iterator. Does nothing if that
+    stream has already ended.'''
+    def end_stream(self, generation, error):
+        with self.condition:
+            if self.generation != generation:
+                return
+            self.generation += 1
+            self.call = None
+            failed = [future for future, deadline in self.outstanding] + [future for batch, future in self.queue]
+            self.outstanding.clear()
+            self.queue.clear()
+            self.condition.notify_all()
+        for future in failed:
+            future.set_exception(error)
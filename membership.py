@@ -0,0 +1,98 @@
+import os
+import threading
+
+from commands import REPLICA_IDS, CLUSTER_FILE
+
+'''A server of the cluster. Voters elect the leader and count towards quorums; other members are read replicas that
+receive every write but never lead.'''
+class Member:
+    def __init__(self, id, host, port, voter=True):
+        self.id = id
+        self.host = host
+        self.port = port
+        self.voter = voter
+
+    '''The "host:port" gRPC address of the member.'''
+    def address(self):
+        return f"{self.host}:{self.port}"
+
+
+'''Reads the cluster's members from a file with one "id host port" line per server, followed by "reader" for read
+replicas. Blank lines and lines starting with # are skipped. Without the file, the members are REPLICA_IDS.'''
+def load_members(path=CLUSTER_FILE):
+    if not os.path.exists(path):
+        return [Member(replica_id, server, port) for replica_id, (server, port) in REPLICA_IDS]
+    members = []
+    with open(path) as f:
+        for line in f:
+            fields = line.split()
+            if len(fields) == 0 or fields[0].startswith("#"):
+                continue
+            voter = len(fields) < 4 or fields[3] != "reader"
+            members.append(Member(int(fields[0]), fields[1], int(fields[2]), voter))
+    return members
+
+
+'''The current members of the cluster, ordered by id. The lowest voter id leads the first term.
+
+The leader changes membership by replicating add_member and remove_member like any other write, so every server
+(and every log) agrees on the members. Majorities are counted among voters only.
+'''
+class Membership:
+    def __init__(self, members=()):
+        self.lock = threading.Lock()
+        self.members = {} # {id: Member}
+        self.version = 0 # bumped by every change
+        for member in members:
+            self.add(member)
+
+    def __contains__(self, id):
+        return id in self.members
+
+    def __len__(self):
+        return len(self.members)
+
+    '''Iterates over a copy of the members in id order.'''
+    def __iter__(self):
+        with self.lock:
+            return iter(sorted(self.members.values(), key=lambda member: member.id))
+
+    def get(self, id):
+        return self.members.get(id)
+
+    '''Adds or updates a member. Returns False if it was already a member with the same address and role.'''
+    def add(self, member):
+        with self.lock:
+            current = self.members.get(member.id)
+            if current is not None and (current.host, current.port, current.voter) == (member.host, member.port, member.voter):
+                return False
+            self.members[member.id] = member
+            self.version += 1
+            return True
+
+    '''Removes a member. Returns False if it was not a member.'''
+    def remove(self, id):
+        with self.lock:
+            if id not in self.members:
+                return False
+            del self.members[id]
+            self.version += 1
+            return True
+
+    def is_voter(self, id):
+        member = self.members.get(id)
+        return member is not None and member.voter
+
+    def voters(self):
+        return [member for member in self if member.voter]
+
+    '''Number of votes (or acknowledgments, counting the leader) that make a majority of the voters.'''
+    def majority(self):
+        return len(self.voters()) // 2 + 1
+
+    '''Id of the leader of the first term.'''
+    def first_leader(self):
+        voters = self.voters()
+        if len(voters) == 0:
+            return None
+        return voters[0].id
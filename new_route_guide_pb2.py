@@ -13,7 +13,7 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x15new_route_guide.proto\x12\nrouteguide\")\n\x06Search\x12\x10\n\x08\x66unction\x18\x01 \x01(\t\x12\r\n\x05value\x18\x02 \x01(\t\"\x14\n\x04Text\x12\x0c\n\x04text\x18\x01 \x01(\t\"\x82\x01\n\x05\x45vent\x12\n\n\x02id\x18\x01 \x01(\x03\x12\x0c\n\x04host\x18\x02 \x01(\t\x12\x13\n\x0b\x64\x65scription\x18\x03 \x01(\t\x12\x11\n\tstarttime\x18\x04 \x01(\x03\x12\x10\n\x08\x64uration\x18\x05 \x01(\x03\x12\x11\n\tguestlist\x18\x06 \x01(\t\x12\x12\n\nreturntext\x18\x07 \x01(\t\"\x07\n\x05\x45mpty2\x91\x07\n\x08\x43\x61lendar\x12\x32\n\nlogin_user\x12\x10.routeguide.Text\x1a\x10.routeguide.Text\"\x00\x12\x35\n\rregister_user\x12\x10.routeguide.Text\x1a\x10.routeguide.Text\"\x00\x12:\n\x10\x64isplay_accounts\x12\x10.routeguide.Text\x1a\x10.routeguide.Text\"\x00\x30\x01\x12\x39\n\x11\x63heck_user_exists\x12\x10.routeguide.Text\x1a\x10.routeguide.Text\"\x00\x12\x36\n\x0e\x64\x65lete_account\x12\x10.routeguide.Text\x1a\x10.routeguide.Text\"\x00\x12.\n\x06logout\x12\x10.routeguide.Text\x1a\x10.routeguide.Text\"\x00\x12;\n\x10notify_new_event\x12\x10.routeguide.Text\x1a\x11.routeguide.Event\"\x00\x30\x01\x12>\n\x15schedule_public_event\x12\x11.routeguide.Event\x1a\x10.routeguide.Text\"\x00\x12?\n\x16schedule_private_event\x12\x11.routeguide.Event\x1a\x10.routeguide.Text\"\x00\x12\x33\n\nedit_event\x12\x11.routeguide.Event\x1a\x10.routeguide.Text\"\x00\x12\x35\n\x0c\x64\x65lete_event\x12\x11.routeguide.Event\x1a\x10.routeguide.Text\"\x00\x12:\n\rsearch_events\x12\x12.routeguide.Search\x1a\x11.routeguide.Event\"\x00\x30\x01\x12\x34\n\nlog_update\x12\x12.routeguide.Search\x1a\x10.routeguide.Text\"\x00\x12\x32\n\nalive_ping\x12\x10.routeguide.Text\x1a\x10.routeguide.Text\"\x00\x12\x35\n\rnotify_leader\x12\x10.routeguide.Text\x1a\x10.routeguide.Text\"\x00\x12\x34\n\x0cprocess_line\x12\x10.routeguide.Text\x1a\x10.routeguide.Text\"\x00\x42\x36\n\x1bio.grpc.examples.routeguideB\x0fRouteGuideProtoP\x01\xa2\x02\x03RTGb\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x15new_route_guide.proto\x12\nrouteguide\"r\n\x06Search\x12\x10\n\x08\x66unction\x18\x01 \x01(\t\x12\r\n\x05value\x18\x02 \x01(\t\x12\x11\n\tpage_size\x18\x03 \x01(\x05\x12\x12\n\npage_token\x18\x04 \x01(\t\x12\x0f\n\x07min_lsn\x18\x05 \x01(\x03\x12\x0f\n\x07max_lag\x18\x06 \x01(\x03\"\x91\x01\n\x04Text\x12\x0c\n\x04text\x18\x01 \x01(\t\x12\x11\n\tpage_size\x18\x02 \x01(\x05\x12\x12\n\npage_token\x18\x03 \x01(\t\x12\x17\n\x0fnext_page_token\x18\x04 \x01(\t\x12\x0b\n\x03lsn\x18\x05 \x01(\x03\x12\x0f\n\x07min_lsn\x18\x06 \x01(\x03\x12\x0f\n\x07max_lag\x18\x07 \x01(\x03\x12\x0c\n\x04term\x18\x08 \x01(\x03\"\x9b\x01\n\x05\x45vent\x12\n\n\x02id\x18\x01 \x01(\x03\x12\x0c\n\x04host\x18\x02 \x01(\t\x12\x13\n\x0b\x64\x65scription\x18\x03 \x01(\t\x12\x11\n\tstarttime\x18\x04 \x01(\x03\x12\x10\n\x08\x64uration\x18\x05 \x01(\x03\x12\x11\n\tguestlist\x18\x06 \x01(\t\x12\x12\n\nreturntext\x18\x07 \x01(\t\x12\x17\n\x0fnext_page_token\x18\x08 \x01(\t\"\xc0\x01\n\tOperation\x12\x0e\n\x06method\x18\x01 \x01(\t\x12\x1e\n\x04text\x18\x02 \x01(\x0b\x32\x10.routeguide.Text\x12 \n\x05\x65vent\x18\x03 \x01(\x0b\x32\x11.routeguide.Event\x12\"\n\x06search\x18\x04 \x01(\x0b\x32\x12.routeguide.Search\x12\x0b\n\x03lsn\x18\x05 \x01(\x03\x12\"\n\x06member\x18\x06 \x01(\x0b\x32\x12.routeguide.Member\x12\x0c\n\x04term\x18\x07 \x01(\x03\"2\n\x05\x42\x61tch\x12)\n\noperations\x18\x01 \x03(\x0b\x32\x15.routeguide.Operation\"%\n\x08Position\x12\x0b\n\x03lsn\x18\x01 \x01(\x03\x12\x0c\n\x04term\x18\x02 \x01(\x03\"\x19\n\x08LogLines\x12\r\n\x05lines\x18\x01 \x03(\t\"\x1a\n\nStateChunk\x12\x0c\n\x04\x64\x61ta\x18\x01 \x01(\x0c\"9\n\tHeartbeat\x12\x0c\n\x04term\x18\x01 \x01(\x03\x12\x11\n\tleader_id\x18\x02 \x01(\x03\x12\x0b\n\x03lsn\x18\x03 \x01(\x03\"H\n\x04Vote\x12\x0c\n\x04term\x18\x01 \x01(\x03\x12\x14\n\x0c\x63\x61ndidate_id\x18\x02 \x01(\x03\x12\x0b\n\x03lsn\x18\x03 \x01(\x03\x12\x0f\n\x07granted\x18\x04 \x01(\x08\":\n\x06Leader\x12\x0c\n\x04term\x18\x01 \x01(\x03\x12\x11\n\tleader_id\x18\x02 \x01(\x03\x12\x0f\n\x07\x61\x64\x64ress\x18\x03 \x01(\t\"?\n\x06Member\x12\n\n\x02id\x18\x01 \x01(\x03\x12\x0c\n\x04host\x18\x02 \x01(\t\x12\x0c\n\x04port\x18\x03 \x01(\x05\x12\r\n\x05voter\x18\x04 \x01(\x08\"O\n\x07Members\x12#\n\x07members\x18\x01 \x03(\x0b\x32\x12.routeguide.Member\x12\x11\n\tleader_id\x18\x02 \x01(\x03\x12\x0c\n\x04term\x18\x03 \x01(\x03\"\x07\n\x05\x45mpty2\xd0\x0c\n\x08\x43\x61lendar\x12\x32\n\nlogin_user\x12\x10.routeguide.Text\x1a\x10.routeguide.Text\"\x00\x12\x35\n\rregister_user\x12\x10.routeguide.Text\x1a\x10.routeguide.Text\"\x00\x12:\n\x10\x64isplay_accounts\x12\x10.routeguide.Text\x1a\x10.routeguide.Text\"\x00\x30\x01\x12\x39\n\x11\x63heck_user_exists\x12\x10.routeguide.Text\x1a\x10.routeguide.Text\"\x00\x12\x36\n\x0e\x64\x65lete_account\x12\x10.routeguide.Text\x1a\x10.routeguide.Text\"\x00\x12.\n\x06logout\x12\x10.routeguide.Text\x1a\x10.routeguide.Text\"\x00\x12;\n\x10notify_new_event\x12\x10.routeguide.Text\x1a\x11.routeguide.Event\"\x00\x30\x01\x12;\n\x10subscribe_events\x12\x10.routeguide.Text\x1a\x11.routeguide.Event\"\x00\x30\x01\x12>\n\x15schedule_public_event\x12\x11.routeguide.Event\x1a\x10.routeguide.Text\"\x00\x12?\n\x16schedule_private_event\x12\x11.routeguide.Event\x1a\x10.routeguide.Text\"\x00\x12\x33\n\nedit_event\x12\x11.routeguide.Event\x1a\x10.routeguide.Text\"\x00\x12\x35\n\x0c\x64\x65lete_event\x12\x11.routeguide.Event\x1a\x10.routeguide.Text\"\x00\x12:\n\rsearch_events\x12\x12.routeguide.Search\x1a\x11.routeguide.Event\"\x00\x30\x01\x12\x34\n\nlog_update\x12\x12.routeguide.Search\x1a\x10.routeguide.Text\"\x00\x12\x34\n\x0b\x61pply_batch\x12\x11.routeguide.Batch\x1a\x10.routeguide.Text\"\x00\x12\x39\n\x0cship_batches\x12\x11.routeguide.Batch\x1a\x10.routeguide.Text\"\x00(\x01\x30\x01\x12<\n\x0fget_applied_lsn\x12\x11.routeguide.Empty\x1a\x14.routeguide.Position\"\x00\x12:\n\nreplay_log\x12\x14.routeguide.LogLines\x1a\x14.routeguide.Position\"\x00\x12\x41\n\rinstall_state\x12\x16.routeguide.StateChunk\x1a\x14.routeguide.Position\"\x00(\x01\x12\x32\n\nalive_ping\x12\x10.routeguide.Text\x1a\x10.routeguide.Text\"\x00\x12\x35\n\rnotify_leader\x12\x10.routeguide.Text\x1a\x10.routeguide.Text\"\x00\x12\x38\n\theartbeat\x12\x15.routeguide.Heartbeat\x1a\x12.routeguide.Leader\"\x00\x12\x34\n\x0crequest_vote\x12\x10.routeguide.Vote\x1a\x10.routeguide.Vote\"\x00\x12\x35\n\nget_leader\x12\x11.routeguide.Empty\x1a\x12.routeguide.Leader\"\x00\x12\x39\n\x0cjoin_cluster\x12\x12.routeguide.Member\x1a\x13.routeguide.Members\"\x00\x12\x37\n\rleave_cluster\x12\x12.routeguide.Member\x1a\x10.routeguide.Text\"\x00\x12\x37\n\x0bget_members\x12\x11.routeguide.Empty\x1a\x13.routeguide.Members\"\x00\x12\x34\n\x0cprocess_line\x12\x10.routeguide.Text\x1a\x10.routeguide.Text\"\x00\x42\x36\n\x1bio.grpc.examples.routeguideB\x0fRouteGuideProtoP\x01\xa2\x02\x03RTGb\x06proto3')
 
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, globals())
 _builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'new_route_guide_pb2', globals())
@@ -22,13 +22,33 @@ if _descriptor._USE_C_DESCRIPTORS == False:
   DESCRIPTOR._options = None
   DESCRIPTOR._serialized_options = b'\n\033io.grpc.examples.routeguideB\017RouteGuideProtoP\001\242\002\003RTG'
   _SEARCH._serialized_start=37
-  _SEARCH._serialized_end=78
-  _TEXT._serialized_start=80
-  _TEXT._serialized_end=100
-  _EVENT._serialized_start=103
-  _EVENT._serialized_end=233
-  _EMPTY._serialized_start=235
-  _EMPTY._serialized_end=242
-  _CALENDAR._serialized_start=245
-  _CALENDAR._serialized_end=1158
+  _SEARCH._serialized_end=151
+  _TEXT._serialized_start=154
+  _TEXT._serialized_end=299
+  _EVENT._serialized_start=302
+  _EVENT._serialized_end=457
+  _OPERATION._serialized_start=460
+  _OPERATION._serialized_end=652
+  _BATCH._serialized_start=654
+  _BATCH._serialized_end=704
+  _POSITION._serialized_start=706
+  _POSITION._serialized_end=743
+  _LOGLINES._serialized_start=745
+  _LOGLINES._serialized_end=770
+  _STATECHUNK._serialized_start=772
+  _STATECHUNK._serialized_end=798
+  _HEARTBEAT._serialized_start=800
+  _HEARTBEAT._serialized_end=857
+  _VOTE._serialized_start=859
+  _VOTE._serialized_end=931
+  _LEADER._serialized_start=933
+  _LEADER._serialized_end=991
+  _MEMBER._serialized_start=993
+  _MEMBER._serialized_end=1056
+  _MEMBERS._serialized_start=1058
+  _MEMBERS._serialized_end=1137
+  _EMPTY._serialized_start=1139
+  _EMPTY._serialized_end=1146
+  _CALENDAR._serialized_start=1149
+  _CALENDAR._serialized_end=2765
 # @@protoc_insertion_point(module_scope)
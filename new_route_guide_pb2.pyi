@@ -1,20 +1,28 @@
+from google.protobuf.internal import containers as _containers
 from google.protobuf import descriptor as _descriptor
 from google.protobuf import message as _message
-from typing import ClassVar as _ClassVar, Optional as _Optional
+from typing import ClassVar as _ClassVar, Iterable as _Iterable, Mapping as _Mapping, Optional as _Optional, Union as _Union
 
 DESCRIPTOR: _descriptor.FileDescriptor
 
+class Batch(_message.Message):
+    __slots__ = ["operations"]
+    OPERATIONS_FIELD_NUMBER: _ClassVar[int]
+    operations: _containers.RepeatedCompositeFieldContainer[Operation]
+    def __init__(self, operations: _Optional[_Iterable[_Union[Operation, _Mapping]]] = ...) -> None: ...
+
 class Empty(_message.Message):
     __slots__ = []
     def __init__(self) -> None: ...
 
 class Event(_message.Message):
-    __slots__ = ["description", "duration", "guestlist", "host", "id", "returntext", "starttime"]
+    __slots__ = ["description", "duration", "guestlist", "host", "id", "next_page_token", "returntext", "starttime"]
     DESCRIPTION_FIELD_NUMBER: _ClassVar[int]
     DURATION_FIELD_NUMBER: _ClassVar[int]
     GUESTLIST_FIELD_NUMBER: _ClassVar[int]
     HOST_FIELD_NUMBER: _ClassVar[int]
     ID_FIELD_NUMBER: _ClassVar[int]
+    NEXT_PAGE_TOKEN_FIELD_NUMBER: _ClassVar[int]
     RETURNTEXT_FIELD_NUMBER: _ClassVar[int]
     STARTTIME_FIELD_NUMBER: _ClassVar[int]
     description: str
@@ -22,20 +30,135 @@ class Event(_message.Message):
     guestlist: str
     host: str
     id: int
+    next_page_token: str
     returntext: str
     starttime: int
-    def __init__(self, id: _Optional[int] = ..., host: _Optional[str] = ..., description: _Optional[str] = ..., starttime: _Optional[int] = ..., duration: _Optional[int] = ..., guestlist: _Optional[str] = ..., returntext: _Optional[str] = ...) -> None: ...
+    def __init__(self, id: _Optional[int] = ..., host: _Optional[str] = ..., description: _Optional[str] = ..., starttime: _Optional[int] = ..., duration: _Optional[int] = ..., guestlist: _Optional[str] = ..., returntext: _Optional[str] = ..., next_page_token: _Optional[str] = ...) -> None: ...
+
+class Heartbeat(_message.Message):
+    __slots__ = ["leader_id", "lsn", "term"]
+    LEADER_ID_FIELD_NUMBER: _ClassVar[int]
+    LSN_FIELD_NUMBER: _ClassVar[int]
+    TERM_FIELD_NUMBER: _ClassVar[int]
+    leader_id: int
+    lsn: int
+    term: int
+    def __init__(self, term: _Optional[int] = ..., leader_id: _Optional[int] = ..., lsn: _Optional[int] = ...) -> None: ...
+
+class Leader(_message.Message):
+    __slots__ = ["address", "leader_id", "term"]
+    ADDRESS_FIELD_NUMBER: _ClassVar[int]
+    LEADER_ID_FIELD_NUMBER: _ClassVar[int]
+    TERM_FIELD_NUMBER: _ClassVar[int]
+    address: str
+    leader_id: int
+    term: int
+    def __init__(self, term: _Optional[int] = ..., leader_id: _Optional[int] = ..., address: _Optional[str] = ...) -> None: ...
+
+class LogLines(_message.Message):
+    __slots__ = ["lines"]
+    LINES_FIELD_NUMBER: _ClassVar[int]
+    lines: _containers.RepeatedScalarFieldContainer[str]
+    def __init__(self, lines: _Optional[_Iterable[str]] = ...) -> None: ...
+
+class Member(_message.Message):
+    __slots__ = ["host", "id", "port", "voter"]
+    HOST_FIELD_NUMBER: _ClassVar[int]
+    ID_FIELD_NUMBER: _ClassVar[int]
+    PORT_FIELD_NUMBER: _ClassVar[int]
+    VOTER_FIELD_NUMBER: _ClassVar[int]
+    host: str
+    id: int
+    port: int
+    voter: bool
+    def __init__(self, id: _Optional[int] = ..., host: _Optional[str] = ..., port: _Optional[int] = ..., voter: bool = ...) -> None: ...
+
+class Members(_message.Message):
+    __slots__ = ["leader_id", "members", "term"]
+    LEADER_ID_FIELD_NUMBER: _ClassVar[int]
+    MEMBERS_FIELD_NUMBER: _ClassVar[int]
+    TERM_FIELD_NUMBER: _ClassVar[int]
+    leader_id: int
+    members: _containers.RepeatedCompositeFieldContainer[Member]
+    term: int
+    def __init__(self, members: _Optional[_Iterable[_Union[Member, _Mapping]]] = ..., leader_id: _Optional[int] = ..., term: _Optional[int] = ...) -> None: ...
+
+class Operation(_message.Message):
+    __slots__ = ["event", "lsn", "member", "method", "search", "term", "text"]
+    EVENT_FIELD_NUMBER: _ClassVar[int]
+    LSN_FIELD_NUMBER: _ClassVar[int]
+    MEMBER_FIELD_NUMBER: _ClassVar[int]
+    METHOD_FIELD_NUMBER: _ClassVar[int]
+    SEARCH_FIELD_NUMBER: _ClassVar[int]
+    TERM_FIELD_NUMBER: _ClassVar[int]
+    TEXT_FIELD_NUMBER: _ClassVar[int]
+    event: Event
+    lsn: int
+    member: Member
+    method: str
+    search: Search
+    term: int
+    text: Text
+    def __init__(self, method: _Optional[str] = ..., text: _Optional[_Union[Text, _Mapping]] = ..., event: _Optional[_Union[Event, _Mapping]] = ..., search: _Optional[_Union[Search, _Mapping]] = ..., lsn: _Optional[int] = ..., member: _Optional[_Union[Member, _Mapping]] = ..., term: _Optional[int] = ...) -> None: ...
+
+class Position(_message.Message):
+    __slots__ = ["lsn", "term"]
+    LSN_FIELD_NUMBER: _ClassVar[int]
+    TERM_FIELD_NUMBER: _ClassVar[int]
+    lsn: int
+    term: int
+    def __init__(self, lsn: _Optional[int] = ..., term: _Optional[int] = ...) -> None: ...
 
 class Search(_message.Message):
-    __slots__ = ["function", "value"]
+    __slots__ = ["function", "max_lag", "min_lsn", "page_size", "page_token", "value"]
     FUNCTION_FIELD_NUMBER: _ClassVar[int]
+    MAX_LAG_FIELD_NUMBER: _ClassVar[int]
+    MIN_LSN_FIELD_NUMBER: _ClassVar[int]
+    PAGE_SIZE_FIELD_NUMBER: _ClassVar[int]
+    PAGE_TOKEN_FIELD_NUMBER: _ClassVar[int]
     VALUE_FIELD_NUMBER: _ClassVar[int]
     function: str
+    max_lag: int
+    min_lsn: int
+    page_size: int
+    page_token: str
     value: str
-    def __init__(self, function: _Optional[str] = ..., value: _Optional[str] = ...) -> None: ...
+    def __init__(self, function: _Optional[str] = ..., value: _Optional[str] = ..., page_size: _Optional[int] = ..., page_token: _Optional[str] = ..., min_lsn: _Optional[int] = ..., max_lag: _Optional[int] = ...) -> None: ...
+
+class StateChunk(_message.Message):
+    __slots__ = ["data"]
+    DATA_FIELD_NUMBER: _ClassVar[int]
+    data: bytes
+    def __init__(self, data: _Optional[bytes] = ...) -> None: ...
 
 class Text(_message.Message):
-    __slots__ = ["text"]
+    __slots__ = ["lsn", "max_lag", "min_lsn", "next_page_token", "page_size", "page_token", "term", "text"]
+    LSN_FIELD_NUMBER: _ClassVar[int]
+    MAX_LAG_FIELD_NUMBER: _ClassVar[int]
+    MIN_LSN_FIELD_NUMBER: _ClassVar[int]
+    NEXT_PAGE_TOKEN_FIELD_NUMBER: _ClassVar[int]
+    PAGE_SIZE_FIELD_NUMBER: _ClassVar[int]
+    PAGE_TOKEN_FIELD_NUMBER: _ClassVar[int]
+    TERM_FIELD_NUMBER: _ClassVar[int]
     TEXT_FIELD_NUMBER: _ClassVar[int]
+    lsn: int
+    max_lag: int
+    min_lsn: int
+    next_page_token: str
+    page_size: int
+    page_token: str
+    term: int
     text: str
-    def __init__(self, text: _Optional[str] = ...) -> None: ...
+    def __init__(self, text: _Optional[str] = ..., page_size: _Optional[int] = ..., page_token: _Optional[str] = ..., next_page_token: _Optional[str] = ..., lsn: _Optional[int] = ..., min_lsn: _Optional[int] = ..., max_lag: _Optional[int] = ..., term: _Optional[int] = ...) -> None: ...
+
+class Vote(_message.Message):
+    __slots__ = ["candidate_id", "granted", "lsn", "term"]
+    CANDIDATE_ID_FIELD_NUMBER: _ClassVar[int]
+    GRANTED_FIELD_NUMBER: _ClassVar[int]
+    LSN_FIELD_NUMBER: _ClassVar[int]
+    TERM_FIELD_NUMBER: _ClassVar[int]
+    candidate_id: int
+    granted: bool
+    lsn: int
+    term: int
+    def __init__(self, term: _Optional[int] = ..., candidate_id: _Optional[int] = ..., lsn: _Optional[int] = ..., granted: bool = ...) -> None: ...
@@ -49,6 +49,11 @@ class CalendarStub(object):
                 request_serializer=new__route__guide__pb2.Text.SerializeToString,
                 response_deserializer=new__route__guide__pb2.Event.FromString,
                 )
+        self.subscribe_events = channel.unary_stream(
+                '/routeguide.Calendar/subscribe_events',
+                request_serializer=new__route__guide__pb2.Text.SerializeToString,
+                response_deserializer=new__route__guide__pb2.Event.FromString,
+                )
         self.schedule_public_event = channel.unary_unary(
                 '/routeguide.Calendar/schedule_public_event',
                 request_serializer=new__route__guide__pb2.Event.SerializeToString,
@@ -79,6 +84,31 @@ class CalendarStub(object):
                 request_serializer=new__route__guide__pb2.Search.SerializeToString,
                 response_deserializer=new__route__guide__pb2.Text.FromString,
                 )
+        self.apply_batch = channel.unary_unary(
+                '/routeguide.Calendar/apply_batch',
+                request_serializer=new__route__guide__pb2.Batch.SerializeToString,
+                response_deserializer=new__route__guide__pb2.Text.FromString,
+                )
+        self.ship_batches = channel.stream_stream(
+                '/routeguide.Calendar/ship_batches',
+                request_serializer=new__route__guide__pb2.Batch.SerializeToString,
+                response_deserializer=new__route__guide__pb2.Text.FromString,
+                )
+        self.get_applied_lsn = channel.unary_unary(
+                '/routeguide.Calendar/get_applied_lsn',
+                request_serializer=new__route__guide__pb2.Empty.SerializeToString,
+                response_deserializer=new__route__guide__pb2.Position.FromString,
+                )
+        self.replay_log = channel.unary_unary(
+                '/routeguide.Calendar/replay_log',
+                request_serializer=new__route__guide__pb2.LogLines.SerializeToString,
+                response_deserializer=new__route__guide__pb2.Position.FromString,
+                )
+        self.install_state = channel.stream_unary(
+                '/routeguide.Calendar/install_state',
+                request_serializer=new__route__guide__pb2.StateChunk.SerializeToString,
+                response_deserializer=new__route__guide__pb2.Position.FromString,
+                )
         self.alive_ping = channel.unary_unary(
                 '/routeguide.Calendar/alive_ping',
                 request_serializer=new__route__guide__pb2.Text.SerializeToString,
@@ -89,6 +119,36 @@ class CalendarStub(object):
                 request_serializer=new__route__guide__pb2.Text.SerializeToString,
                 response_deserializer=new__route__guide__pb2.Text.FromString,
                 )
+        self.heartbeat = channel.unary_unary(
+                '/routeguide.Calendar/heartbeat',
+                request_serializer=new__route__guide__pb2.Heartbeat.SerializeToString,
+                response_deserializer=new__route__guide__pb2.Leader.FromString,
+                )
+        self.request_vote = channel.unary_unary(
+                '/routeguide.Calendar/request_vote',
+                request_serializer=new__route__guide__pb2.Vote.SerializeToString,
+                response_deserializer=new__route__guide__pb2.Vote.FromString,
+                )
+        self.get_leader = channel.unary_unary(
+                '/routeguide.Calendar/get_leader',
+                request_serializer=new__route__guide__pb2.Empty.SerializeToString,
+                response_deserializer=new__route__guide__pb2.Leader.FromString,
+                )
+        self.join_cluster = channel.unary_unary(
+                '/routeguide.Calendar/join_cluster',
+                request_serializer=new__route__guide__pb2.Member.SerializeToString,
+                response_deserializer=new__route__guide__pb2.Members.FromString,
+                )
+        self.leave_cluster = channel.unary_unary(
+                '/routeguide.Calendar/leave_cluster',
+                request_serializer=new__route__guide__pb2.Member.SerializeToString,
+                response_deserializer=new__route__guide__pb2.Text.FromString,
+                )
+        self.get_members = channel.unary_unary(
+                '/routeguide.Calendar/get_members',
+                request_serializer=new__route__guide__pb2.Empty.SerializeToString,
+                response_deserializer=new__route__guide__pb2.Members.FromString,
+                )
         self.process_line = channel.unary_unary(
                 '/routeguide.Calendar/process_line',
                 request_serializer=new__route__guide__pb2.Text.SerializeToString,
@@ -141,6 +201,12 @@ class CalendarServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def subscribe_events(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
     def schedule_public_event(self, request, context):
         """Missing associated documentation comment in .proto file."""
         context.set_code(grpc.StatusCode.UNIMPLEMENTED)
@@ -177,6 +243,36 @@ class CalendarServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def apply_batch(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def ship_batches(self, request_iterator, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def get_applied_lsn(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def replay_log(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def install_state(self, request_iterator, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
     def alive_ping(self, request, context):
         """Missing associated documentation comment in .proto file."""
         context.set_code(grpc.StatusCode.UNIMPLEMENTED)
@@ -189,6 +285,42 @@ class CalendarServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def heartbeat(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def request_vote(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def get_leader(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def join_cluster(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def leave_cluster(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def get_members(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
     def process_line(self, request, context):
         """Missing associated documentation comment in .proto file."""
         context.set_code(grpc.StatusCode.UNIMPLEMENTED)
@@ -233,6 +365,11 @@ def add_CalendarServicer_to_server(servicer, server):
                     request_deserializer=new__route__guide__pb2.Text.FromString,
                     response_serializer=new__route__guide__pb2.Event.SerializeToString,
             ),
+            'subscribe_events': grpc.unary_stream_rpc_method_handler(
+                    servicer.subscribe_events,
+                    request_deserializer=new__route__guide__pb2.Text.FromString,
+                    response_serializer=new__route__guide__pb2.Event.SerializeToString,
+            ),
             'schedule_public_event': grpc.unary_unary_rpc_method_handler(
                     servicer.schedule_public_event,
                     request_deserializer=new__route__guide__pb2.Event.FromString,
@@ -263,6 +400,31 @@ def add_CalendarServicer_to_server(servicer, server):
                     request_deserializer=new__route__guide__pb2.Search.FromString,
                     response_serializer=new__route__guide__pb2.Text.SerializeToString,
             ),
+            'apply_batch': grpc.unary_unary_rpc_method_handler(
+                    servicer.apply_batch,
+                    request_deserializer=new__route__guide__pb2.Batch.FromString,
+                    response_serializer=new__route__guide__pb2.Text.SerializeToString,
+            ),
+            'ship_batches': grpc.stream_stream_rpc_method_handler(
+                    servicer.ship_batches,
+                    request_deserializer=new__route__guide__pb2.Batch.FromString,
+                    response_serializer=new__route__guide__pb2.Text.SerializeToString,
+            ),
+            'get_applied_lsn': grpc.unary_unary_rpc_method_handler(
+                    servicer.get_applied_lsn,
+                    request_deserializer=new__route__guide__pb2.Empty.FromString,
+                    response_serializer=new__route__guide__pb2.Position.SerializeToString,
+            ),
+            'replay_log': grpc.unary_unary_rpc_method_handler(
+                    servicer.replay_log,
+                    request_deserializer=new__route__guide__pb2.LogLines.FromString,
+                    response_serializer=new__route__guide__pb2.Position.SerializeToString,
+            ),
+            'install_state': grpc.stream_unary_rpc_method_handler(
+                    servicer.install_state,
+                    request_deserializer=new__route__guide__pb2.StateChunk.FromString,
+                    response_serializer=new__route__guide__pb2.Position.SerializeToString,
+            ),
             'alive_ping': grpc.unary_unary_rpc_method_handler(
                     servicer.alive_ping,
                     request_deserializer=new__route__guide__pb2.Text.FromString,
@@ -273,6 +435,36 @@ def add_CalendarServicer_to_server(servicer, server):
                     request_deserializer=new__route__guide__pb2.Text.FromString,
                     response_serializer=new__route__guide__pb2.Text.SerializeToString,
             ),
+            'heartbeat': grpc.unary_unary_rpc_method_handler(
+                    servicer.heartbeat,
+                    request_deserializer=new__route__guide__pb2.Heartbeat.FromString,
+                    response_serializer=new__route__guide__pb2.Leader.SerializeToString,
+            ),
+            'request_vote': grpc.unary_unary_rpc_method_handler(
+                    servicer.request_vote,
+                    request_deserializer=new__route__guide__pb2.Vote.FromString,
+                    response_serializer=new__route__guide__pb2.Vote.SerializeToString,
+            ),
+            'get_leader': grpc.unary_unary_rpc_method_handler(
+                    servicer.get_leader,
+                    request_deserializer=new__route__guide__pb2.Empty.FromString,
+                    response_serializer=new__route__guide__pb2.Leader.SerializeToString,
+            ),
+            'join_cluster': grpc.unary_unary_rpc_method_handler(
+                    servicer.join_cluster,
+                    request_deserializer=new__route__guide__pb2.Member.FromString,
+                    response_serializer=new__route__guide__pb2.Members.SerializeToString,
+            ),
+            'leave_cluster': grpc.unary_unary_rpc_method_handler(
+                    servicer.leave_cluster,
+                    request_deserializer=new__route__guide__pb2.Member.FromString,
+                    response_serializer=new__route__guide__pb2.Text.SerializeToString,
+            ),
+            'get_members': grpc.unary_unary_rpc_method_handler(
+                    servicer.get_members,
+                    request_deserializer=new__route__guide__pb2.Empty.FromString,
+                    response_serializer=new__route__guide__pb2.Members.SerializeToString,
+            ),
             'process_line': grpc.unary_unary_rpc_method_handler(
                     servicer.process_line,
                     request_deserializer=new__route__guide__pb2.Text.FromString,
@@ -407,6 +599,23 @@ class Calendar(object):
             options, channel_credentials,
             insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
 
+    @staticmethod
+    def subscribe_events(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(request, target, '/routeguide.Calendar/subscribe_events',
+            new__route__guide__pb2.Text.SerializeToString,
+            new__route__guide__pb2.Event.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
     @staticmethod
     def schedule_public_event(request,
             target,
@@ -509,6 +718,91 @@ class Calendar(object):
             options, channel_credentials,
             insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
 
+    @staticmethod
+    def apply_batch(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/routeguide.Calendar/apply_batch',
+            new__route__guide__pb2.Batch.SerializeToString,
+            new__route__guide__pb2.Text.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def ship_batches(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.stream_stream(request_iterator, target, '/routeguide.Calendar/ship_batches',
+            new__route__guide__pb2.Batch.SerializeToString,
+            new__route__guide__pb2.Text.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def get_applied_lsn(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/routeguide.Calendar/get_applied_lsn',
+            new__route__guide__pb2.Empty.SerializeToString,
+            new__route__guide__pb2.Position.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def replay_log(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/routeguide.Calendar/replay_log',
+            new__route__guide__pb2.LogLines.SerializeToString,
+            new__route__guide__pb2.Position.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def install_state(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.stream_unary(request_iterator, target, '/routeguide.Calendar/install_state',
+            new__route__guide__pb2.StateChunk.SerializeToString,
+            new__route__guide__pb2.Position.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
     @staticmethod
     def alive_ping(request,
             target,
@@ -543,6 +837,108 @@ class Calendar(object):
             options, channel_credentials,
             insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
 
+    @staticmethod
+    def heartbeat(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/routeguide.Calendar/heartbeat',
+            new__route__guide__pb2.Heartbeat.SerializeToString,
+            new__route__guide__pb2.Leader.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def request_vote(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/routeguide.Calendar/request_vote',
+            new__route__guide__pb2.Vote.SerializeToString,
+            new__route__guide__pb2.Vote.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def get_leader(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/routeguide.Calendar/get_leader',
+            new__route__guide__pb2.Empty.SerializeToString,
+            new__route__guide__pb2.Leader.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def join_cluster(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/routeguide.Calendar/join_cluster',
+            new__route__guide__pb2.Member.SerializeToString,
+            new__route__guide__pb2.Members.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def leave_cluster(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/routeguide.Calendar/leave_cluster',
+            new__route__guide__pb2.Member.SerializeToString,
+            new__route__guide__pb2.Text.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def get_members(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/routeguide.Calendar/get_members',
+            new__route__guide__pb2.Empty.SerializeToString,
+            new__route__guide__pb2.Members.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
     @staticmethod
     def process_line(request,
             target,
@@ -0,0 +1,207 @@
+import heapq
+import queue
+import threading
+
+from locks import StripedLock
+
+# Public feed entries below every reader's cursor are dropped once the feed has grown by this much
+COMPACTION_INTERVAL = 1024
+# Number of locks shared out among users for their cursors and private queues
+NOTIFICATION_LOCK_STRIPES = 16
+# Most event subscription streams served at once; each one holds a server worker thread
+MAX_SUBSCRIBERS = 40
+# How often an idle subscription stream checks whether its client is still connected
+SUBSCRIPTION_POLL_SECONDS = 5
+
+'''Notification log for new events.
+
+Public events are appended once to a shared feed and every user keeps a read cursor into it, so scheduling a
+public event is O(1) regardless of the number of accounts. Private invitations go to per-guest queues.
+The log is thread safe: the shared feed has its own short-lived lock and per-user state is guarded by striped locks.
+'''
+class NotificationLog:
+    def __init__(self, stripes=NOTIFICATION_LOCK_STRIPES):
+        self.public_feed = [] # [event1, event2, event3] public events in scheduling order
+        self.feed_offset = 0 # number of events compacted away from the front of public_feed
+        self.cursors = {} # {username: absolute position of the next unread public event}
+        self.private_queues = {} # {username: [event1, event2]} unread private invitations
+        self.next_compaction = COMPACTION_INTERVAL
+
+        self.feed_lock = threading.Lock() # guards public_feed, feed_offset and compaction
+        self.user_locks = StripedLock(stripes) # guards each user's cursor and private queue
+
+    def __contains__(self, username):
+        return username in self.cursors
+
+    '''Starts tracking notifications for a user. Only events published from now on are delivered.'''
+    def register(self, username):
+        with self.user_locks.lock_for(username):
+            with self.feed_lock:
+                self.cursors[username] = self.feed_offset + len(self.public_feed)
+            self.private_queues[username] = []
+
+    '''Stops tracking notifications for a user.'''
+    def unregister(self, username):
+        with self.user_locks.lock_for(username):
+            del self.cursors[username]
+            del self.private_queues[username]
+
+    '''Publishes a public event to every registered user.'''
+    def publish_public(self, event):
+        with self.feed_lock:
+            self.public_feed.append(event)
+            if len(self.public_feed) >= self.next_compaction:
+                self.compact_locked()
+
+    '''Publishes a private event to the given users.'''
+    def publish_private(self, event, usernames):
+        for username in usernames:
+            with self.user_locks.lock_for(username):
+                if username in self.private_queues:
+                    self.private_queues[username].append(event)
+
+    '''Returns the unread events of a user in scheduling order without marking them read.'''
+    def pending(self, username):
+        with self.user_locks.lock_for(username):
+            return self.unread_locked(username)[0]
+
+    '''Returns the unread events of a user in scheduling order and marks them read.'''
+    def read(self, username):
+        with self.user_locks.lock_for(username):
+            events, end = self.unread_locked(username)
+            self.cursors[username] = end
+            self.private_queues[username] = []
+            return events
+
+    '''Collects a user's unread events and the feed position after them. Caller holds the user's lock.'''
+    def unread_locked(self, username):
+        with self.feed_lock:
+            unread_public = self.public_feed[self.cursors[username] - self.feed_offset:]
+            end = self.feed_offset + len(self.public_feed)
+        public = [event for event in unread_public if event.host != username]
+        return list(heapq.merge(public, self.private_queues[username], key=lambda event: event.id)), end
+
+    '''Returns the log's contents as plain data for a state snapshot, with events serialized by encode_event.'''
+    def dump(self, encode_event):
+        with self.feed_lock:
+            state = {
+                "feed_offset": self.feed_offset,
+                "public_feed": [encode_event(event) for event in self.public_feed],
+                "cursors": dict(self.cursors),
+            }
+        state["private_queues"] = {}
+        for username in list(self.private_queues):
+            with self.user_locks.lock_for(username):
+                if username in self.private_queues:
+                    state["private_queues"][username] = [encode_event(event) for event in self.private_queues[username]]
+        return state
+
+    '''Replaces the log's contents with a snapshot made by dump, with events rebuilt by decode_event.
+    Caller makes sure nothing publishes or reads meanwhile.'''
+    def load(self, state, decode_event):
+        with self.feed_lock:
+            self.feed_offset = state["feed_offset"]
+            self.public_feed = [decode_event(fields) for fields in state["public_feed"]]
+            self.cursors = dict(state["cursors"])
+            self.private_queues = {username: [decode_event(fields) for fields in events] for username, events in state["private_queues"].items()}
+            self.next_compaction = len(self.public_feed) + COMPACTION_INTERVAL
+
+    '''Drops public events every user has already read.'''
+    def compact(self):
+        with self.feed_lock:
+            self.compact_locked()
+
+    def compact_locked(self):
+        # Cursors only move forward, so a slightly stale minimum only keeps a few extra events
+        cursors = list(self.cursors.values())
+        if len(cursors) == 0:
+            oldest_cursor = self.feed_offset + len(self.public_feed)
+        else:
+            oldest_cursor = min(cursors)
+        dropped = oldest_cursor - self.feed_offset
+        if dropped > 0:
+            del self.public_feed[:dropped]
+            self.feed_offset = oldest_cursor
+        self.next_compaction = len(self.public_feed) + COMPACTION_INTERVAL
+
+
+'''A connected client's event subscription.
+
+Events are not copied into the subscription: the stream reads them from the NotificationLog. The subscription only
+buffers a single pending wakeup, so a slow client costs O(1) memory no matter how many events it has not read yet.
+'''
+class Subscription:
+    def __init__(self, username):
+        self.username = username
+        self.wakeups = queue.Queue(maxsize=1)
+        self.closed = False
+
+    '''Wakes the stream up to read new events.'''
+    def notify(self):
+        try:
+            self.wakeups.put_nowait(None)
+        except queue.Full:
+            # A wakeup is already pending and will pick up this event too
+            pass
+
+    '''Ends the stream.'''
+    def close(self):
+        self.closed = True
+        self.notify()
+
+    '''Blocks until woken up or the timeout expires.'''
+    def wait(self, timeout):
+        try:
+            self.wakeups.get(timeout=timeout)
+        except queue.Empty:
+            pass
+
+
+'''Tracks the event subscriptions of connected users.'''
+class SubscriptionHub:
+    def __init__(self, max_subscribers=MAX_SUBSCRIBERS):
+        self.lock = threading.Lock()
+        self.max_subscribers = max_subscribers
+        self.subscriptions = {} # {username: [subscription1, subscription2]}
+        self.count = 0
+
+    '''Opens a subscription for a user. Returns None if the server is at capacity.'''
+    def subscribe(self, username):
+        with self.lock:
+            if self.count >= self.max_subscribers:
+                return None
+            subscription = Subscription(username)
+            self.subscriptions.setdefault(username, []).append(subscription)
+            self.count += 1
+            return subscription
+
+    '''Removes a subscription once its stream has ended.'''
+    def unsubscribe(self, subscription):
+        with self.lock:
+            subscriptions = self.subscriptions.get(subscription.username, [])
+            if subscription in subscriptions:
+                subscriptions.remove(subscription)
+                self.count -= 1
+                if len(subscriptions) == 0:
+                    del self.subscriptions[subscription.username]
+
+    '''Wakes every subscriber except the given user (the host of a public event).'''
+    def notify_all(self, except_username=None):
+        with self.lock:
+            for username, subscriptions in self.subscriptions.items():
+                if username != except_username:
+                    for subscription in subscriptions:
+                        subscription.notify()
+
+    '''Wakes the subscribers of the given users.'''
+    def notify(self, usernames):
+        with self.lock:
+            for username in usernames:
+                for subscription in self.subscriptions.get(username, ()):
+                    subscription.notify()
+
+    '''Ends every subscription of a user (on logout or account deletion).'''
+    def close(self, username):
+        with self.lock:
+            for subscription in self.subscriptions.get(username, ()):
+                subscription.close()
@@ -0,0 +1,140 @@
+import collections
+import re
+import threading
+import time
+from concurrent import futures
+try:
+    from re import _parser as sre_parse
+except ImportError:
+    import sre_parse
+
+# Most compiled search patterns kept; the least recently used ones are dropped first
+MAX_CACHED_PATTERNS = 256
+# Threads evaluating user-supplied regular expressions, separate from the gRPC workers
+REGEX_WORKERS = 2
+# Longest a single search may spend matching its regular expression
+REGEX_TIME_BUDGET_SECONDS = 2.0
+
+'''Raised when a regular expression search runs over its time budget.'''
+class SearchBudgetExceeded(Exception):
+    pass
+
+
+'''Returns whether the pattern repeats a group that itself contains an unbounded repeat, such as (a+)+ or (a*b)*.
+Such nested quantifiers can backtrack exponentially on a near match.'''
+def has_nested_quantifier(parsed, repeated=False):
+    for op, av in parsed:
+        if op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT):
+            low, high, subpattern = av
+            if repeated and high == sre_parse.MAXREPEAT:
+                return True
+            if has_nested_quantifier(subpattern, repeated or high > 1):
+                return True
+            continue
+        for child in subpatterns(av):
+            if has_nested_quantifier(child, repeated):
+                return True
+    return False
+
+
+'''Yields the subpatterns nested in an opcode's arguments (groups, alternatives, lookarounds).'''
+def subpatterns(av):
+    if isinstance(av, sre_parse.SubPattern):
+        yield av
+    elif isinstance(av, (tuple, list)):
+        for item in av:
+            yield from subpatterns(item)
+
+
+'''Thread safe LRU cache of compiled regular expressions keyed by pattern.'''
+class PatternCache:
+    def __init__(self, max_patterns=MAX_CACHED_PATTERNS):
+        self.lock = threading.Lock()
+        self.max_patterns = max_patterns
+        self.patterns = collections.OrderedDict() # {pattern: compiled pattern} least recently used first
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.patterns)
+
+    '''Returns the compiled pattern. Raises re.error if the pattern is invalid and SearchBudgetExceeded if it nests
+    quantifiers.'''
+    def compile(self, pattern):
+        with self.lock:
+            compiled = self.patterns.get(pattern)
+            if compiled is not None:
+                self.patterns.move_to_end(pattern)
+                self.hits += 1
+                return compiled
+            self.misses += 1
+        # Compile outside the lock; invalid and pathological patterns raise here and are not cached
+        compiled = re.compile(pattern)
+        if has_nested_quantifier(sre_parse.parse(pattern)):
+            raise SearchBudgetExceeded(pattern)
+        with self.lock:
+            self.patterns[pattern] = compiled
+            self.patterns.move_to_end(pattern)
+            while len(self.patterns) > self.max_patterns:
+                self.patterns.popitem(last=False)
+        return compiled
+
+
+'''Evaluates user-supplied regular expressions on a dedicated worker pool under a time budget.
+
+Patterns with nested quantifiers are rejected before they run. For the rest, the caller waits at most the budget
+and then gets SearchBudgetExceeded, so a slow pattern costs a gRPC worker thread a bounded amount of time. Python
+cannot interrupt a single running match, so a regex worker past its deadline stays busy until the match returns.
+Those workers are counted as stuck, and once every worker is stuck new searches are refused right away instead of
+queueing behind them.
+'''
+class RegexGuard:
+    def __init__(self, workers=REGEX_WORKERS, budget=REGEX_TIME_BUDGET_SECONDS, max_patterns=MAX_CACHED_PATTERNS):
+        self.patterns = PatternCache(max_patterns)
+        self.workers = workers
+        self.executor = futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="regex")
+        self.budget = budget
+        self.lock = threading.Lock()
+        self.stuck = 0 # scans still running past their deadline
+
+        # Monitoring
+        self.searches_refused = 0 # searches refused because every worker was stuck
+
+    '''Returns the rows whose key matches the pattern, in order. Raises re.error for invalid patterns and
+    SearchBudgetExceeded when the pattern nests quantifiers, matching takes longer than the budget or every worker
+    is stuck.'''
+    def filter(self, pattern, rows, key=None):
+        compiled = self.patterns.compile(pattern)
+        with self.lock:
+            if self.stuck >= self.workers:
+                self.searches_refused += 1
+                raise SearchBudgetExceeded(pattern)
+        deadline = time.monotonic() + self.budget
+        cancelled = threading.Event()
+        future = self.executor.submit(self.scan, compiled, rows, key, deadline, cancelled)
+        try:
+            return future.result(timeout=self.budget)
+        except futures.TimeoutError:
+            cancelled.set()
+            if not future.cancel():
+                # Already running: the worker is stuck until its current match returns
+                with self.lock:
+                    self.stuck += 1
+                future.add_done_callback(self.unstick)
+            raise SearchBudgetExceeded(pattern)
+
+    '''Done callback of a scan that ran past its deadline: its worker is free again.'''
+    def unstick(self, future):
+        with self.lock:
+            self.stuck -= 1
+
+    '''Matches rows until done, cancelled or past the deadline. Runs on the regex worker pool.'''
+    def scan(self, compiled, rows, key, deadline, cancelled):
+        matches = []
+        for row in rows:
+            if cancelled.is_set() or time.monotonic() > deadline:
+                raise SearchBudgetExceeded(compiled.pattern)
+            text = row if key is None else key(row)
+            if compiled.search(text) is not None:
+                matches.append(row)
+        return matches
@@ -0,0 +1,186 @@
+import threading
+import time
+
+from commands import ACK_SYNC, ACK_QUORUM, ACK_ASYNC, MAX_IN_FLIGHT_WRITES
+
+# How long the batcher waits for more writes after the first one arrives before shipping a batch
+BATCH_WINDOW_SECONDS = 0.002
+# Most operations shipped in one batch; a full batch is shipped without waiting out the window
+BATCH_MAX_OPS = 64
+
+'''A write waiting to be replicated: its (peer, operation) entries and the acknowledgments it has collected.'''
+class PendingWrite:
+    def __init__(self, entries):
+        self.entries = entries
+        self.peers = set(peer for peer, operation in entries)
+        self.acked_peers = set()
+        self.responded_peers = set()
+        self.submitted = time.monotonic()
+        self.acknowledged = threading.Event() # set once the writer may answer its client
+        self.replicated = False # whether the acknowledgment mode's requirement was met
+
+
+'''Group commit for replication.
+
+Handlers submit the operations of one write, each addressed to a peer, and pass the returned write to wait. A single
+flusher thread collects the operations of concurrent writes for a short window (or until the batch is full) and
+sends every peer one Batch with its operations in submission order. send must deliver each peer's batches in the
+order they were sent (LogShipper streams them), so each peer applies operations in submission order while the
+peers proceed independently of each other.
+
+When the writer is released depends on the acknowledgment mode:
+    ACK_SYNC: once every peer has responded.
+    ACK_QUORUM: once enough voting peers have applied the write for a majority of all the voters, counting this one.
+        Voters that the write skipped count as not having applied it.
+    ACK_ASYNC: right away. While more than max_in_flight writes are waiting for peers to answer, writers wait for
+        room before answering. They wait in wait, after submitting, so a full window never holds up the locks
+        writes are submitted under.
+'''
+class ReplicationBatcher:
+    def __init__(self, send, window=BATCH_WINDOW_SECONDS, max_ops=BATCH_MAX_OPS, ack_mode=ACK_SYNC, max_in_flight=MAX_IN_FLIGHT_WRITES,
+                 is_voter=lambda peer: True, voter_count=None):
+        if ack_mode not in (ACK_SYNC, ACK_QUORUM, ACK_ASYNC):
+            raise ValueError(f"Unknown replication acknowledgment mode: {ack_mode}")
+        self.send = send # send(peer, operations) ships a batch and returns a future of the peer's response
+        self.window = window
+        self.max_ops = max_ops
+        self.ack_mode = ack_mode
+        self.max_in_flight = max_in_flight
+        self.is_voter = is_voter # is_voter(peer) tells whether the peer counts towards a quorum; read replicas do not
+        # voter_count() is the number of voters in the cluster, counting this server; by default the voting peers
+        # of each write and this server
+        self.voter_count = voter_count
+        self.condition = threading.Condition()
+        self.pending = [] # [PendingWrite] waiting to be shipped, in submission order
+        self.pending_ops = 0
+        self.in_flight = 0 # writes submitted but not yet answered by every peer
+        self.flusher = None
+
+        # Monitoring
+        self.batches_sent = 0 # number of batches sent
+        self.writes_acknowledged = 0 # writes released to their clients
+        self.ack_seconds = 0.0 # total time writes waited before release
+        self.writes_unreplicated = 0 # writes that did not meet the mode's requirement
+
+    '''Average time a write waited for replication before being released, in seconds.'''
+    def average_ack_seconds(self):
+        if self.writes_acknowledged == 0:
+            return 0.0
+        return self.ack_seconds / self.writes_acknowledged
+
+    '''Queues the (peer, operation) entries of one write without blocking. Returns the PendingWrite to pass to wait.'''
+    def submit(self, entries):
+        write = PendingWrite(entries)
+        if len(entries) == 0:
+            write.replicated = self.ack_mode != ACK_ASYNC and self.required_acks(write) == 0
+            write.acknowledged.set()
+            return write
+        with self.condition:
+            if self.flusher is None:
+                self.flusher = threading.Thread(target=self.run, daemon=True)
+                self.flusher.start()
+            self.pending.append(write)
+            self.pending_ops += len(entries)
+            self.in_flight += 1
+            self.condition.notify_all()
+        if self.ack_mode == ACK_ASYNC:
+            self.release(write)
+        return write
+
+    '''Blocks until the writer of a submitted write may answer its client: the acknowledgment mode released it and,
+    in ACK_ASYNC, the in-flight window has room.'''
+    def wait(self, write):
+        write.acknowledged.wait()
+        if self.ack_mode != ACK_ASYNC:
+            return
+        with self.condition:
+            # Bounded window: writers that would run too far ahead of the backups wait here
+            while self.in_flight > self.max_in_flight:
+                self.condition.wait()
+
+    '''Flusher loop: waits for writes, lets more accumulate for the window and ships them as one batch per peer.'''
+    def run(self):
+        while True:
+            with self.condition:
+                while len(self.pending) == 0:
+                    self.condition.wait()
+                deadline = time.monotonic() + self.window
+                while self.pending_ops < self.max_ops:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+                writes = self.pending
+                self.pending = []
+                self.pending_ops = 0
+            self.flush(writes)
+
+    '''Sends each peer its operations from the given writes as one batch, without waiting for the answers. Each
+    peer's answers release writers as soon as their acknowledgment mode allows, so a slow peer only delays the
+    writes that need it.'''
+    def flush(self, writes):
+        batches = {} # {peer: [operation1, operation2]} in submission order
+        for write in writes:
+            for peer, operation in write.entries:
+                batches.setdefault(peer, []).append(operation)
+
+        for peer, operations in batches.items():
+            try:
+                call = self.send(peer, operations)
+            except Exception as e:
+                print("Backup is down")
+                self.respond(writes, peer, False)
+                continue
+            call.add_done_callback(lambda call, peer=peer: self.respond(writes, peer, call.exception() is None))
+        self.batches_sent += len(batches)
+
+    '''Records a peer's response to a batch and releases the writes whose requirement is now met. A write every
+    peer has answered is released even if its requirement was not met, so writers are never left waiting.'''
+    def respond(self, writes, peer, success):
+        for write in writes:
+            if peer not in write.peers:
+                continue
+            with self.condition:
+                write.responded_peers.add(peer)
+                if success:
+                    write.acked_peers.add(peer)
+                ready = self.requirement_met(write)
+                answered = len(write.responded_peers) == len(write.peers)
+                if answered:
+                    self.in_flight -= 1
+                    self.condition.notify_all()
+            if ready or answered:
+                self.release(write)
+
+    '''Whether a write may be released under the acknowledgment mode. Caller holds the condition.'''
+    def requirement_met(self, write):
+        if self.ack_mode == ACK_QUORUM:
+            return self.acks(write) >= self.required_acks(write)
+        return len(write.responded_peers) == len(write.peers)
+
+    '''Lets the writer answer its client. Only the first release of a write counts.'''
+    def release(self, write):
+        with self.condition:
+            if write.acknowledged.is_set():
+                return
+            write.replicated = self.ack_mode != ACK_ASYNC and self.acks(write) >= self.required_acks(write)
+            if self.ack_mode != ACK_ASYNC and not write.replicated:
+                self.writes_unreplicated += 1
+            self.writes_acknowledged += 1
+            self.ack_seconds += time.monotonic() - write.submitted
+            write.acknowledged.set()
+
+    '''Number of peer acknowledgments a write needs to count as replicated.'''
+    def required_acks(self, write):
+        if self.ack_mode == ACK_QUORUM:
+            # With this server, voters // 2 acknowledgments make a majority of the voters
+            if self.voter_count is None:
+                return (len([peer for peer in write.peers if self.is_voter(peer)]) + 1) // 2
+            return self.voter_count() // 2
+        return len(write.peers)
+
+    '''Number of acknowledgments a write has that count towards its requirement. Caller holds the condition.'''
+    def acks(self, write):
+        if self.ack_mode == ACK_QUORUM:
+            return len([peer for peer in write.acked_peers if self.is_voter(peer)])
+        return len(write.acked_peers)
@@ -0,0 +1,56 @@
+import collections
+import threading
+
+# Most cached query results kept; the least recently used ones are dropped first
+MAX_CACHED_QUERIES = 512
+# Most result rows kept across all cached queries
+MAX_CACHED_ROWS = 100000
+
+'''LRU cache of read query results keyed by (function, value).
+
+Each result is stored with the data version it was computed from. A lookup with a different version is a miss
+and drops the entry, so mutations invalidate results just by bumping the version. Cached results are shared
+between readers and must not be modified.
+'''
+class ResultCache:
+    def __init__(self, max_queries=MAX_CACHED_QUERIES, max_rows=MAX_CACHED_ROWS):
+        self.lock = threading.Lock()
+        self.max_queries = max_queries
+        self.max_rows = max_rows
+        self.results = collections.OrderedDict() # {key: (version, results)} least recently used first
+        self.rows = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.results)
+
+    '''Returns the cached results of a query at this version, or None.'''
+    def get(self, key, version):
+        with self.lock:
+            entry = self.results.get(key)
+            if entry is not None and entry[0] == version:
+                self.results.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                # Computed from older data
+                self.drop_locked(key)
+            self.misses += 1
+            return None
+
+    '''Caches the results of a query computed at this version. Results too large to cache are skipped.'''
+    def put(self, key, version, results):
+        if len(results) > self.max_rows:
+            return
+        with self.lock:
+            if key in self.results:
+                self.drop_locked(key)
+            self.results[key] = (version, results)
+            self.rows += len(results)
+            while len(self.results) > self.max_queries or self.rows > self.max_rows:
+                self.drop_locked(next(iter(self.results)))
+
+    def drop_locked(self, key):
+        version, results = self.results.pop(key)
+        self.rows -= len(results)
@@ -0,0 +1,13 @@
+from server import *
+import sys
+
+# Adds a server to a running cluster: python3 run_calendar_server_join.py <id> <host> <port> <any server host:port> [reader]
+replica_id, host, port, seed_address = int(sys.argv[1]), sys.argv[2], int(sys.argv[3]), sys.argv[4]
+voter = len(sys.argv) < 6 or sys.argv[5] != "reader"
+calendar_server = ServerRunner(id=replica_id, address=(host, port))
+print("[STARTING] joining server is starting...")
+calendar_server.start()
+
+calendar_server.join_cluster(seed_address, voter=voter)
+
+calendar_server.wait_for_termination()
\ No newline at end of file
@@ -8,42 +8,238 @@ import threading
 from concurrent import futures
 import re
 from commands import *
+from conflict_index import ConflictIndex, event_interval, event_participants
+from description_index import DescriptionIndex
+from account_registry import AccountRegistry
+from time_index import StartTimeIndex
+from notifications import NotificationLog, SubscriptionHub, MAX_SUBSCRIBERS, SUBSCRIPTION_POLL_SECONDS
+from locks import ReadWriteLock
+from event_snapshot import EventSnapshot
+from cursors import CursorTable
+from regex_guard import RegexGuard, SearchBudgetExceeded
+from result_cache import ResultCache
+from replication_batch import ReplicationBatcher
+from log_shipping import LogShipper
+from election import Election, LEADER
+from membership import Membership, Member, load_members
+from channels import ChannelPool, SERVER_OPTIONS
+from circuit_breaker import CircuitBreaker
+from state_transfer import encode_state, decode_state, state_chunks, event_fields, event_from_fields, STATE_CHUNK_BYTES, SNAPSHOT_THRESHOLD_LSNS
+from log_index import LogIndex, LOG_CHECKPOINT_INTERVAL, log_lsn
 
 import logging
 import threading
-import datetime
+import time
+import functools
+
+# Most log lines sent to a lagging backup in one replay_log call
+REPLAY_CHUNK_LINES = 512
+# Worker threads reserved for members that join after the server starts, each of which may hold a ship_batches stream
+MEMBER_HEADROOM = 5
+
+# Servicer methods a leader replicates through batches, and the Operation field holding their request
+REPLICATED_METHODS = {
+    "register_user": "text",
+    "login_user": "text",
+    "logout": "text",
+    "delete_account": "text",
+    "schedule_public_event": "event",
+    "schedule_private_event": "event",
+    "edit_event": "event",
+    "delete_event": "event",
+    "log_update": "search",
+    "add_member": "member",
+    "remove_member": "member",
+}
+
+
+'''Runs a client write handler while holding the servicer's write gate for reading, so a state snapshot (which takes
+the gate for writing) never sees a write that changed state but has not been logged under its LSN yet. Only the
+leader takes client writes (context set); other servers refuse them, so they never number writes of their own.'''
+def gated_write(handler):
+    @functools.wraps(handler)
+    def gated(self, request, context):
+        if context is not None and not self.is_leader:
+            # The client finds the leader and retries there
+            context.abort(grpc.StatusCode.FAILED_PRECONDITION, NOT_LEADER)
+            return proto.Text(text=NOT_LEADER)
+        self.write_gate.acquire_read()
+        try:
+            return handler(self, request, context)
+        finally:
+            self.write_gate.release_read()
+    return gated
 
-mutex_accounts = threading.Lock()
-mutex_active_accounts = threading.Lock()
-mutex_new_event_notifications = threading.Lock()
-mutex_events = threading.Lock()
 
 class CalendarServicer(proto_grpc.CalendarServicer):
     '''Initializes CalendarServicer that sets up the datastructures to store user accounts and messages.'''
-    def __init__(self, id=0, address=(None, None)):
+    def __init__(self, id=0, address=(None, None), ack_mode=REPLICATION_ACK_MODE, max_in_flight=MAX_IN_FLIGHT_WRITES):
         self.ip, self.port = address
         self.id = id
 
-        self.accounts = [] # Usernames of all accounts
-        self.active_accounts = [] # Username of all accounts that are currently logged in
-        self.new_event_notifications = {} # {username: [event1, event2, event3]}
-
-        # three event-related databases that follow will be guarded by mutex_events (only one edit to all events at a time)
-        self.public_events = [] # [event1, event2, event3]
-        self.private_events = [] # [event1, event2, event3]
+        # Locks belong to this servicer, so several servicers in one process do not contend
+        self.accounts_lock = ReadWriteLock() # guards accounts
+        self.mutex_active_accounts = threading.Lock() # guards active_accounts
+        # event-related databases are guarded by events_lock: searches share it, schedule/edit/delete take it exclusively
+        self.events_lock = ReadWriteLock()
+        # writes hold the gate for reading from their first change until they are logged; snapshots hold it for writing
+        self.write_gate = ReadWriteLock()
+
+        self.accounts = AccountRegistry() # Usernames of all accounts
+        self.active_accounts = set() # Username of all accounts that are currently logged in
+        self.new_event_notifications = NotificationLog() # shared public event feed with per-user cursors, plus private invitations (locks per user internally)
+        self.subscriptions = SubscriptionHub() # clients connected through subscribe_events
+
+        # registry of every event object keyed by id; the single source of truth for events
+        self.events = {} # {event_id: event}
+        self.public_event_ids = {} # ordered set {event_id: None} of public events
+        self.private_event_ids = {} # ordered set {event_id: None} of private events
+        # interval index over event times so scheduling does not scan every event for conflicts
+        self.conflict_index = ConflictIndex()
+        # maps host username to the events they created (public and private)
+        self.host_events = {} # {username: {event_id1: None, event_id2: None}}
+        # inverted index from description tokens to event ids
+        self.description_index = DescriptionIndex()
+        # sorted start times for time-window searches
+        self.time_index = StartTimeIndex()
         # maps username to list of private events they are a part of or they are hosting
         self.private_mappings = {} # {username: [event_id1, event_id2, event_id3]}
+        # bumped by every committed write to the event registry; readers stream the snapshot of the latest version
+        self.events_version = 0
+        self.published_snapshot = EventSnapshot()
+        # open cursors of paged searches and account listings
+        self.search_cursors = CursorTable()
+        self.account_cursors = CursorTable()
+        # compiled pattern cache and time-bounded worker pool for user-supplied regular expressions
+        self.regex_guard = RegexGuard()
+        # results of repeated searches and account listings, valid until the next event or account write
+        self.search_cache = ResultCache() # {(function, value): converted events}
+        self.account_cache = ResultCache() # {pattern: usernames}
 
         self.is_leader = False
         self.backup_connections = {} # len 1 if a backup, len 2 if leader (at start)
         self.other_servers = {} # for logging purposes
         self.next_event_id = 1
+        # Log sequence number of the last operation this server committed (leader) or applied (backup)
+        self.applied_lsn = 0
+        self.applied_term = 0 # term the operation at applied_lsn was written in; with its LSN, it identifies it
+        self.lsn_lock = threading.Lock() # orders LSN assignment, local logging and batch submission
+        self.applying = threading.local() # LSN of the replicated operation being applied on this thread, if any
+        self.apply_lock = threading.Lock() # applies numbered operations one at a time, in LSN order
+        self.log_indexes = {} # {log file path: LogIndex} for reading log tails without rereading whole files
+        # groups the replication and log writes of concurrent requests into one batch per peer
+        # and releases writers according to the replication acknowledgment mode
+        self.replication_batcher = ReplicationBatcher(self.ship,
+                                                      ack_mode=ack_mode, max_in_flight=max_in_flight,
+                                                      is_voter=lambda peer: self.membership.is_voter(self.other_servers.get(peer)),
+                                                      voter_count=lambda: len(self.membership.voters()))
+        self.log_shippers = {} # {peer: LogShipper} streaming batches to each peer over one ship_batches call
+        self.log_shippers_lock = threading.Lock()
+        # marks peers down after repeated failures so writes skip them, and catches them up when they answer again
+        self.peer_breaker = CircuitBreaker(self.probe_peer, self.recover_peer)
+        # servers of the cluster, from CLUSTER_FILE or REPLICA_IDS, changed by add_member and remove_member
+        self.membership = Membership(load_members())
+        self.member_connections = {} # {member id: stub}
+        self.channels = ChannelPool() # one kept-alive channel per member, reused across failovers
+        self.member_loggers = set() # ids of the members whose log copy this server writes
+        # term, vote and known leader for heartbeat-driven leader election among the voting members
+        self.election = Election(self.id)
+        self.election_timer = None
+        # last LSN the leader reported in a heartbeat, and when, for answering reads within a staleness bound
+        self.leader_lsn = 0
+        self.leader_heard = None
 
         # Sets up logging functionality
-        for replica_id, address in REPLICA_IDS:
-            self.setup_logger(f'{replica_id}', f'{replica_id}.log')
+        for member in self.membership:
+            self.member_logger(member.id)
         
 
+    '''List of public events in scheduling order, read from the event registry. Assigning a list replaces them.'''
+    @property
+    def public_events(self):
+        return [self.events[event_id] for event_id in self.public_event_ids]
+
+    @public_events.setter
+    def public_events(self, events):
+        for event_id in list(self.public_event_ids):
+            self.remove_event(event_id)
+        for event in events:
+            self.add_event(event, public=True)
+            self.next_event_id = max(self.next_event_id, event.id + 1)
+
+    '''List of private events in scheduling order, read from the event registry. Assigning a list replaces them.'''
+    @property
+    def private_events(self):
+        return [self.events[event_id] for event_id in self.private_event_ids]
+
+    @private_events.setter
+    def private_events(self, events):
+        for event_id in list(self.private_event_ids):
+            self.remove_event(event_id)
+        for event in events:
+            self.add_event(event, public=False)
+            self.next_event_id = max(self.next_event_id, event.id + 1)
+
+    '''Adds an event to the registry and conflict index. Caller holds the events write lock.'''
+    def add_event(self, event, public):
+        self.events[event.id] = event
+        self.host_events.setdefault(event.host, {})[event.id] = None
+        self.description_index.add(event.id, event.description)
+        self.time_index.add(event.id, event.starttime, event.duration)
+        if public:
+            self.public_event_ids[event.id] = None
+            self.conflict_index.add(event.id, event.starttime, event.duration)
+        else:
+            self.private_event_ids[event.id] = None
+            self.conflict_index.add(event.id, event.starttime, event.duration, participants=event_participants(event))
+        self.events_version += 1
+
+    '''Replaces a registered event with an updated copy, keeping its place in the registry. Events are never
+    changed in place, so snapshots already handed to readers keep the old version. Caller holds the events write lock.'''
+    def replace_event(self, event):
+        self.events[event.id] = event
+        self.description_index.remove(event.id)
+        self.description_index.add(event.id, event.description)
+        self.time_index.remove(event.id)
+        self.time_index.add(event.id, event.starttime, event.duration)
+        self.conflict_index.remove(event.id)
+        if event.id in self.public_event_ids:
+            self.conflict_index.add(event.id, event.starttime, event.duration)
+        else:
+            self.conflict_index.add(event.id, event.starttime, event.duration, participants=event_participants(event))
+        self.events_version += 1
+
+    '''Returns an immutable snapshot of every event at the latest committed version. The snapshot is built on the
+    first read after a write and shared by every later reader, so writes stay cheap and reads never copy.'''
+    def event_snapshot(self):
+        snapshot = self.published_snapshot
+        if snapshot.version == self.events_version:
+            return snapshot
+        with self.events_lock.read_locked():
+            snapshot = EventSnapshot(self.events_version, self.public_events, self.private_events)
+            # No write can commit while the read lock is held, so concurrent builders all publish the same version.
+            # Publishing is a single reference assignment: readers see either the old or the new snapshot
+            self.published_snapshot = snapshot
+        return snapshot
+
+    '''Removes an event from the registry and conflict index. Caller holds the events write lock.'''
+    def remove_event(self, event_id):
+        event = self.events.pop(event_id, None)
+        if event is None:
+            return None
+        self.public_event_ids.pop(event_id, None)
+        self.private_event_ids.pop(event_id, None)
+        self.conflict_index.remove(event_id)
+        self.description_index.remove(event_id)
+        self.time_index.remove(event_id)
+        hosted = self.host_events.get(event.host)
+        if hosted is not None:
+            hosted.pop(event_id, None)
+            if len(hosted) == 0:
+                del self.host_events[event.host]
+        self.events_version += 1
+        return event
+
     '''Initializes the logging meta settings'''
     def setup_logger(self, logger_name, log_file, level=logging.INFO):
         l = logging.getLogger(logger_name)
@@ -57,6 +253,12 @@ class CalendarServicer(proto_grpc.CalendarServicer):
         l.addHandler(fileHandler)
         l.addHandler(streamHandler) 
 
+    '''Sets up the log file of a member the first time it is needed.'''
+    def member_logger(self, member_id):
+        if member_id not in self.member_loggers:
+            self.member_loggers.add(member_id)
+            self.setup_logger(f'{member_id}', f'{member_id}.log')
+
     '''Server sends its log writes to other replicas so all machines have same set of log files'''
     def log_update(self, request, context):
         machine = request.function
@@ -65,15 +267,288 @@ class CalendarServicer(proto_grpc.CalendarServicer):
         logger.info(log_message)
         return proto.Text(text="Done")
 
+    '''Applies a batch of replicated writes in order. Operations at or below the applied LSN were already applied
+    and are skipped. Operations from the leader of an earlier term are refused, with our term, so that leader
+    steps down instead of counting us towards its acknowledgments. Log copies keep the term of the line they copy,
+    so they are not refused.'''
+    def apply_batch(self, request, context):
+        for operation in request.operations:
+            if operation.lsn != 0 and operation.term < self.election.term:
+                return proto.Text(text=STALE_TERM, term=self.election.term, lsn=self.applied_lsn)
+            if self.election.step_down(operation.term) and self.is_leader:
+                print("A server of a later term replicates to us, stepping down")
+                self.is_leader = False
+            field = REPLICATED_METHODS.get(operation.method)
+            if field is None:
+                print(f"Cannot apply operation {operation.method}")
+                continue
+            handler, request = getattr(self, operation.method), getattr(operation, field)
+            if operation.lsn == 0:
+                # Log copies and operations from servers without LSNs
+                handler(request, None)
+            elif not self.apply_with_lsn(operation.lsn, lambda: handler(request, None), term=operation.term):
+                # An earlier batch was lost, or we applied writes of a replaced leader: tell the leader how far we
+                # got so it catches us up
+                return proto.Text(text=REPLICA_BEHIND, lsn=self.applied_lsn)
+        return proto.Text(text="Done")
+
+    '''Applies each batch a peer ships over its log shipping stream and answers it, in order.'''
+    def ship_batches(self, request_iterator, context):
+        for batch in request_iterator:
+            yield self.apply_batch(batch, context)
+
+    '''Returns the shipper streaming batches to a peer, starting it on first use.'''
+    def log_shipper(self, peer):
+        with self.log_shippers_lock:
+            shipper = self.log_shippers.get(peer)
+            if shipper is None:
+                shipper = self.log_shippers[peer] = LogShipper(peer.ship_batches)
+            return shipper
+
+    '''Ships a batch to a peer and records the outcome with the peer's circuit breaker. Returns a future of the
+    peer's response, failed if the peer is down or could not apply the batch because it missed an earlier one.'''
+    def ship(self, peer, operations):
+        future = futures.Future()
+        if not self.peer_breaker.is_up(peer):
+            # Skipped peers count as failed, so they still count against the acknowledgment mode
+            future.set_exception(ConnectionError("Backup is down"))
+            return future
+        def shipped(call):
+            error = call.exception()
+            if error is None and call.result().text == STALE_TERM:
+                # A later term has started without us: stop leading. The write is not counted as replicated
+                if self.election.step_down(call.result().term):
+                    print("A backup is in a later term, stepping down")
+                if self.election.role != LEADER:
+                    self.is_leader = False
+                error = ConnectionError(f"Backup is in term {call.result().term}")
+            elif error is None and call.result().text == REPLICA_BEHIND:
+                # Stop sending the peer writes it cannot apply; the breaker catches it up once it answers a probe
+                self.peer_breaker.trip(peer)
+                error = ConnectionError(f"Backup is behind at LSN {call.result().lsn}")
+            else:
+                self.peer_breaker.record(peer, error is None)
+            if error is None:
+                future.set_result(call.result())
+            else:
+                future.set_exception(error)
+        self.log_shipper(peer).send(proto.Batch(operations=operations)).add_done_callback(shipped)
+        return future
+
+    '''Raises if a peer that is down still does not answer.'''
+    def probe_peer(self, peer):
+        peer.alive_ping(proto.Text(text=IS_ALIVE), timeout=HEARTBEAT_INTERVAL_SECONDS)
+
+    '''Puts a peer that answers again back on the write path. The leader first sends a backup the writes it missed.'''
+    def recover_peer(self, peer):
+        if not self.is_leader or peer not in self.backup_connections:
+            self.peer_breaker.reset(peer)
+            return
+        if self.catch_up(peer, lambda: self.peer_breaker.reset(peer)):
+            print("Backup is back up and synced")
+
+    '''Runs apply for the operation the leader numbered lsn in term, so this server logs it under the same LSN and
+    term. Operations are applied strictly in order: one already applied is skipped, and one after a missing LSN is
+    not applied. An operation at or below our LSN from a later term than ours is not one we applied: our last
+    operations came from a replaced leader. Returns False if an earlier operation is missing or we diverged.'''
+    def apply_with_lsn(self, lsn, apply, term=None):
+        with self.apply_lock:
+            if lsn <= self.applied_lsn:
+                return term is None or term <= self.applied_term
+            if lsn != self.applied_lsn + 1:
+                return False
+            self.applying.lsn = lsn
+            self.applying.term = term
+            try:
+                apply()
+            finally:
+                self.applying.lsn = None
+                self.applying.term = None
+                self.applied_lsn = max(self.applied_lsn, lsn)
+                if term is not None:
+                    self.applied_term = term
+            return True
+
+    '''Returns the LSN and term of the last operation this server applied.'''
+    def get_applied_lsn(self, request, context):
+        with self.lsn_lock:
+            return proto.Position(lsn=self.applied_lsn, term=self.applied_term)
+
+    '''Applies log lines this server missed, in order, and returns the LSN it has reached. Lines after a missing
+    one are not applied, so the LSN reached tells the leader whether every line was.'''
+    def replay_log(self, request, context):
+        for line in request.lines:
+            self.process_line(line)
+        return proto.Position(lsn=self.applied_lsn)
+
+    '''Installs a state snapshot streamed by the leader and returns the LSN it was taken at. The leader then sends
+    the log lines after that LSN.'''
+    def install_state(self, request_iterator, context):
+        state = decode_state(b"".join(chunk.data for chunk in request_iterator))
+        with self.apply_lock:
+            self.load_state(state)
+        return proto.Position(lsn=self.applied_lsn, term=self.applied_term)
+
+    '''Serializes accounts, logins, events, private mappings, notifications, members and the next event id,
+    together with the LSN of the last write they include. Writes wait while the state is read.'''
+    def capture_state(self):
+        self.write_gate.acquire_write()
+        try:
+            self.events_lock.acquire_read()
+            self.accounts_lock.acquire_read()
+            self.mutex_active_accounts.acquire()
+            try:
+                state = {
+                    "lsn": self.applied_lsn,
+                    "term": self.applied_term,
+                    "next_event_id": self.next_event_id,
+                    "accounts": list(self.accounts),
+                    "active_accounts": list(self.active_accounts),
+                    "public_events": [event_fields(self.events[event_id]) for event_id in self.public_event_ids],
+                    "private_events": [event_fields(self.events[event_id]) for event_id in self.private_event_ids],
+                    "private_mappings": self.private_mappings,
+                    "notifications": self.new_event_notifications.dump(event_fields),
+                    "members": [[member.id, member.host, member.port, member.voter] for member in self.membership],
+                }
+                return encode_state(state)
+            finally:
+                self.mutex_active_accounts.release()
+                self.accounts_lock.release_read()
+                self.events_lock.release_read()
+        finally:
+            self.write_gate.release_write()
+
+    '''Replaces this server's state with a snapshot made by capture_state.'''
+    def load_state(self, state):
+        self.write_gate.acquire_write()
+        try:
+            self.events_lock.acquire_write()
+            self.accounts_lock.acquire_write()
+            self.mutex_active_accounts.acquire()
+            try:
+                self.public_events = [event_from_fields(fields) for fields in state["public_events"]]
+                self.private_events = [event_from_fields(fields) for fields in state["private_events"]]
+                self.next_event_id = state["next_event_id"]
+                self.private_mappings = {username: list(event_ids) for username, event_ids in state["private_mappings"].items()}
+                self.accounts = AccountRegistry(state["accounts"])
+                self.active_accounts = set(state["active_accounts"])
+                self.new_event_notifications.load(state["notifications"], event_from_fields)
+                self.applied_lsn = state["lsn"]
+                self.applied_term = state.get("term", 0)
+            finally:
+                self.mutex_active_accounts.release()
+                self.accounts_lock.release_write()
+                self.events_lock.release_write()
+            if "members" in state:
+                self.set_members(Member(*fields) for fields in state["members"])
+        finally:
+            self.write_gate.release_write()
+
+    '''Makes the members those of a snapshot, connecting to the added ones and disconnecting from the removed ones,
+    as the member changes before the snapshot would have.'''
+    def set_members(self, members):
+        members = {member.id: member for member in members}
+        for member in self.membership:
+            if member.id not in members:
+                self.membership.remove(member.id)
+                if member.id != self.id:
+                    self.disconnect_member(member)
+        for member in members.values():
+            self.membership.add(member)
+            if member.id != self.id:
+                self.connect_member(member)
+
+    '''Streams this server's state to a replica in chunks. Returns the LSN the replica reached.'''
+    def transfer_state(self, replica):
+        chunks = state_chunks(self.capture_state(), STATE_CHUNK_BYTES)
+        return replica.install_state(proto.StateChunk(data=chunk) for chunk in chunks).lsn
+
+    '''Returns the (backup, operation) entries that replicate a write to every backup.'''
+    def replicate(self, method, request):
+        operation = proto.Operation(method=method, **{REPLICATED_METHODS[method]: request})
+        return [(replica, operation) for replica in list(self.backup_connections)]
+
+    '''Writes a line to this server's log, then ships its copy on every other server together with any replication
+    entries through the replication batcher. Blocks until the acknowledgment mode lets the write be answered.
+    Returns the write's LSN.'''
+    def log_to_servers(self, text, replication=()):
+        lsn, write = self.submit_log(text, replication)
+        return self.wait_for_replication(lsn, write)
+
+    '''Numbers a write, logs it and submits its replication without waiting for it. Handlers call this while they
+    still hold the lock their change was made under, so writes get LSNs in the order they changed the state.
+    Returns the LSN and the pending write to pass to wait_for_replication.'''
+    def submit_log(self, text, replication=()):
+        entries = list(replication)
+        with self.lsn_lock:
+            # Replicated operations keep the leader's LSN and term; new writes get the next LSN in the term we lead.
+            # Numbering, logging and submitting under one lock makes LSN order the order of the log and of every
+            # backup's batches
+            lsn = getattr(self.applying, "lsn", None)
+            if lsn is None:
+                lsn = self.applied_lsn + 1
+            term = getattr(self.applying, "term", None)
+            if term is None:
+                term = self.election.led_term if self.is_leader else self.election.term
+            if lsn >= self.applied_lsn:
+                self.applied_lsn, self.applied_term = lsn, term
+            text = str(lsn) + SEPARATOR + str(term) + SEPARATOR + text
+
+            logger = logging.getLogger(f'{self.id}')
+            logger.info(text)
+            for replica, operation in entries:
+                operation.lsn = lsn
+                operation.term = term
+            log_operation = proto.Operation(method="log_update", search=proto.Search(function=f'{self.id}', value=text), term=term)
+            entries += [(other, log_operation) for other in list(self.other_servers)]
+            write = self.replication_batcher.submit(entries)
+        return lsn, write
+
+    '''Blocks until the acknowledgment mode lets a submitted write be answered. Returns its LSN. A backup applying
+    the leader's writes only ships log copies and does not wait for them, so a slow peer cannot hold up apply_lock
+    and the leader's batch.'''
+    def wait_for_replication(self, lsn, write):
+        if self.is_leader and getattr(self.applying, "lsn", None) is None:
+            self.replication_batcher.wait(write)
+
+        # Keep the index of our own log current a little at a time, so failover only reads the newest lines
+        if lsn % LOG_CHECKPOINT_INTERVAL == 0:
+            self.log_index(f'{self.id}.log').refresh()
+        return lsn
+
+    '''Returns the index of a log file, creating it on first use.'''
+    def log_index(self, path):
+        index = self.log_indexes.get(path)
+        if index is None:
+            index = self.log_indexes.setdefault(path, LogIndex(path))
+        return index
+
         
-    '''Processes log files for starting the persistence server'''
-    def process_line(self, line):
+    '''Processes log files for starting the persistence server. Numbered lines are applied in the term they were
+    written in, unless keep_term is False: a log replayed to rebuild the cluster is rewritten in our term.'''
+    def process_line(self, line, keep_term=True):
         header = "INFO:root:"
         line = line[:-1] # remove newline char at end of string
         if line.startswith(header):
                 line = line[len(header):]
         parsed_line = line.split(SEPARATOR)
-        
+
+        # Lines starting with a log sequence number are applied once, under that LSN; older logs have none. The term
+        # follows the LSN, except in lines written before terms
+        lsn = log_lsn(line)
+        if lsn is not None:
+            fields, term = parsed_line[1:], None
+            if len(fields) > 1 and fields[0].isdigit():
+                fields, term = fields[1:], int(fields[0])
+            if not keep_term:
+                term = None
+            if not self.apply_with_lsn(lsn, lambda: self.apply_log_fields(fields), term=term):
+                print(f"Missing operations before LSN {lsn} or applied others in its place, not applying it")
+        else:
+            self.apply_log_fields(parsed_line)
+
+    '''Applies the operation described by the fields of a log line.'''
+    def apply_log_fields(self, parsed_line):
         purpose = parsed_line[0]
 
         # Handles all actions and replicates in the new server
@@ -147,78 +622,391 @@ class CalendarServicer(proto_grpc.CalendarServicer):
             request.text = username
 
             self.logout(request, None)
+
+        elif purpose == MEMBER_ADDED:
+            request = proto.Member(id=int(parsed_line[1]), host=parsed_line[2], port=int(parsed_line[3]), voter=parsed_line[4] == "voter")
+            self.add_member(request, None)
+
+        elif purpose == MEMBER_REMOVED:
+            request = proto.Member(id=int(parsed_line[1]))
+            self.remove_member(request, None)
     
     '''Sets up a server from the log file'''
     def set_state_from_file(self, logfile):
         f = open(logfile, "r")
         for line in f:
-            self.process_line(line)
+            self.process_line(line, keep_term=False)
 
         f.close()
 
-    '''Connects each replica based on the hierarchy of backups'''
+    '''Connects to every other member. The first leader replicates to all of them; a backup keeps the members after
+    it as backups for when it becomes leader.'''
     def connect_to_replicas(self, logfile=None):
-        if self.id == 1:
+        first_leader = self.membership.first_leader()
+        after_self = False
+        for member in self.membership:
+            if member.id == self.id:
+                after_self = True
+                continue
+            replica = self.connect_member(member)
+            if self.id == first_leader or after_self:
+                self.backup_connections[replica] = member.id
+        if self.id == first_leader:
             self.is_leader = True
             print("I am the leader")
-            connection1 = proto_grpc.CalendarStub(grpc.insecure_channel(f"{SERVER2}:{PORT2}"))
-            connection2 = proto_grpc.CalendarStub(grpc.insecure_channel(f"{SERVER3}:{PORT3}"))
-            self.backup_connections[connection1] = 2
-            self.backup_connections[connection2] = 3
-            self.other_servers[connection1] = 2
-            self.other_servers[connection2] = 3
-
-            
-        elif self.id == 2:
-            print("I am first backup")
-            connection1 = proto_grpc.CalendarStub(grpc.insecure_channel(f"{SERVER1}:{PORT1}"))
-            connection3 = proto_grpc.CalendarStub(grpc.insecure_channel(f"{SERVER3}:{PORT3}"))
-            self.backup_connections[connection3] = 3
-            self.other_servers[connection1] = 1
-            self.other_servers[connection3] = 3
         else:
-            print("I am second backup")
-            connection1 = proto_grpc.CalendarStub(grpc.insecure_channel(f"{SERVER1}:{PORT1}"))
-            connection2 = proto_grpc.CalendarStub(grpc.insecure_channel(f"{SERVER2}:{PORT2}"))
-            self.other_servers[connection1] = 1
-            self.other_servers[connection2] = 2
-        
+            print(f"I am a backup (server {self.id})")
+
         print("Replica communication channels established.")
+        # The lowest voter id leads the first term; elections replace it if its heartbeats stop. The term is set
+        # before replaying a log, so the replayed writes reach the backups in the term they are in
+        self.election.bootstrap(leader_id=first_leader)
         if logfile:
             # Persistence: all servers went down and set up this server from the log file
             self.set_state_from_file(logfile)
 
+        self.start_election_timer()
+
+    '''Opens a channel to a member and starts writing its log copy. Returns the stub.'''
+    def connect_member(self, member):
+        replica = self.member_connections.get(member.id)
+        if replica is None:
+            replica = self.channels.stub(member.address())
+            self.member_connections[member.id] = replica
+            self.other_servers[replica] = member.id
+        self.member_logger(member.id)
+        return replica
+
+    '''Stops replicating to and exchanging heartbeats with a member and closes its channel.'''
+    def disconnect_member(self, member):
+        replica = self.member_connections.pop(member.id, None)
+        if replica is not None:
+            self.other_servers.pop(replica, None)
+            self.backup_connections.pop(replica, None)
+            with self.log_shippers_lock:
+                self.log_shippers.pop(replica, None)
+            self.peer_breaker.forget(replica)
+        self.channels.close(member.address())
+
+    '''The members, with the leader and term this server knows of.'''
+    def members_message(self):
+        members = [proto.Member(id=member.id, host=member.host, port=member.port, voter=member.voter) for member in self.membership]
+        return proto.Members(members=members, leader_id=self.election.leader_id or 0, term=self.election.term)
+
+    '''Returns the cluster's members, so clients can find every replica.'''
+    def get_members(self, request, context):
+        return self.members_message()
+
+    '''Adds a server to the cluster (leader only). The new server is caught up like a lagging backup, then every
+    member learns of it through a replicated add_member. Returns the members, or no members if this server is not the leader.'''
+    def join_cluster(self, request, context):
+        if not self.is_leader or request.id == self.id:
+            return proto.Members()
+        member = Member(request.id, request.host, request.port, request.voter)
+        replica = self.connect_member(member)
+        def attach():
+            self.backup_connections[replica] = request.id
+        if not self.catch_up(replica, attach):
+            # Not a member: stop sending it log copies and heartbeats
+            if request.id not in self.membership:
+                self.disconnect_member(member)
+            return proto.Members()
+        self.add_member(request, None)
+        return self.members_message()
+
+    '''Sends a backup the writes it is missing, then runs attach (which puts it on the write path) between writes,
+    so it misses none. Returns whether the backup was caught up.'''
+    def catch_up(self, replica, attach):
+        leader_log = self.log_index(f'{self.id}.log')
+        if not self.sync_backup(replica, leader_log):
+            return False
+        self.write_gate.acquire_write()
+        try:
+            # No write is between its first change and its log line, so the writes logged during the first sync are
+            # all that is left, and every later write replicates to the backup
+            if not self.sync_backup(replica, leader_log, snapshot=False):
+                return False
+            attach()
+            return True
+        finally:
+            self.write_gate.release_write()
+
+    '''Removes a server from the cluster (leader only). The leader cannot remove itself.'''
+    def leave_cluster(self, request, context):
+        if not self.is_leader or request.id == self.id or request.id not in self.membership:
+            return proto.Text(text=ACTION_UNSUCCESSFUL)
+        return self.remove_member(request, None)
+
+    '''Joins a running cluster: asks a server for the leader, has the leader add this server, then connects to the
+    other members and follows the leader. Read replicas (voter False) never vote or lead.'''
+    def join_cluster_through(self, seed_address, voter=False):
+        # Our own log: add_member skips our id, and a server joining with a new id is in no cluster file
+        self.member_logger(self.id)
+        seed = self.channels.stub(seed_address)
+        leader = seed.get_leader(proto.Empty())
+        if leader.address == "":
+            raise ConnectionError("The cluster is electing a leader, try again")
+        request = proto.Member(id=self.id, host=self.ip, port=self.port, voter=voter)
+        members = self.channels.stub(leader.address).join_cluster(request)
+        if len(members.members) == 0:
+            raise ConnectionError(f"Server {leader.leader_id} did not add this server")
+        for member in members.members:
+            self.membership.add(Member(member.id, member.host, member.port, member.voter))
+            if member.id != self.id:
+                self.connect_member(self.membership.get(member.id))
+        self.election.bootstrap(leader_id=members.leader_id, term=members.term)
+        self.start_election_timer()
+
+    '''Adds or updates a member and connects to it. Replicated and logged like other writes.'''
+    @gated_write
+    def add_member(self, request, context):
+        member = Member(request.id, request.host, request.port, request.voter)
+        self.membership.add(member)
+        if member.id != self.id:
+            self.connect_member(member)
+
+        # If leader, sync replicas
+        replication = []
+        if self.is_leader:
+            # Backups are updated in the same batch as the log copies below
+            replication = self.replicate("add_member", request)
+
+        # Write to logs
+        text = MEMBER_ADDED + SEPARATOR + SEPARATOR.join([str(member.id), member.host, str(member.port), "voter" if member.voter else "reader"])
+        lsn = self.log_to_servers(text, replication)
+
+        return proto.Text(text=MEMBER_ADDED, lsn=lsn)
+
+    '''Removes a member and disconnects from it. Replicated and logged like other writes.'''
+    @gated_write
+    def remove_member(self, request, context):
+        member = self.membership.get(request.id)
+        self.membership.remove(request.id)
+
+        # If leader, sync replicas; the removed member still receives this write
+        replication = []
+        if self.is_leader:
+            replication = self.replicate("remove_member", request)
+
+        # Write to logs
+        text = MEMBER_REMOVED + SEPARATOR + str(request.id)
+        lsn = self.log_to_servers(text, replication)
+        if member is not None and member.id != self.id:
+            self.disconnect_member(member)
+
+        return proto.Text(text=MEMBER_REMOVED, lsn=lsn)
+
     '''Determines whether server being pinged is alive and can respond.'''
     def alive_ping(self, request, context):
         return proto.Text(text=LEADER_ALIVE)
 
-    '''Notify the server that they are the new leader.'''
+    '''Notify the server that they are the new leader. With elections running, the server stands for election
+    instead, so a client cannot make a second leader.'''
     def notify_leader(self, request, context):
+        if self.election_timer is not None:
+            if self.is_leader or self.run_election():
+                return proto.Text(text=LEADER_CONFIRMATION)
+            return proto.Text(text=ACTION_UNSUCCESSFUL)
         self.sync_backups()
         print("Backup syncing is done")
         self.is_leader = True
         return proto.Text(text=LEADER_CONFIRMATION)
 
+    '''Starts the background thread that sends heartbeats as leader and starts elections as a backup.'''
+    def start_election_timer(self):
+        if self.election_timer is None:
+            self.election_timer = threading.Thread(target=self.run_election_timer, daemon=True)
+            self.election_timer.start()
+            threading.Thread(target=self.run_heartbeat_timer, daemon=True).start()
+
+    '''Election timer loop: a backup that has not heard a heartbeat within its election timeout runs an election.'''
+    def run_election_timer(self):
+        while True:
+            if not self.is_leader and self.membership.is_voter(self.id) and self.election.timed_out():
+                self.run_election()
+            time.sleep(HEARTBEAT_INTERVAL_SECONDS / 5)
+
+    '''Heartbeat loop: sends heartbeats every HEARTBEAT_INTERVAL_SECONDS while this server leads its term. It runs
+    apart from the election timer, so a new leader keeps its followers from timing out while it catches them up.'''
+    def run_heartbeat_timer(self):
+        while True:
+            next_heartbeat = time.monotonic() + HEARTBEAT_INTERVAL_SECONDS
+            self.send_heartbeats()
+            time.sleep(max(0, next_heartbeat - time.monotonic()))
+
+    '''Sends a heartbeat to every other server in parallel if this server leads its term. Steps down if one of them
+    is in a later term.'''
+    def send_heartbeats(self):
+        term = self.election.leading_term()
+        if term is None:
+            return
+        calls = [other.heartbeat.future(proto.Heartbeat(term=term, leader_id=self.id, lsn=self.applied_lsn), timeout=HEARTBEAT_INTERVAL_SECONDS)
+                 for other in list(self.other_servers)]
+        for call in calls:
+            try:
+                reply = call.result()
+            except Exception as e:
+                # A server that is down misses this heartbeat
+                continue
+            if self.election.step_down(reply.term):
+                print(f"Server {reply.leader_id} is in a later term, stepping down")
+                self.is_leader = False
+
+    '''Records a heartbeat from the leader and returns the term and leader this server knows of.'''
+    def heartbeat(self, request, context):
+        if self.election.observe(request.term, request.leader_id):
+            self.leader_lsn = request.lsn
+            self.leader_heard = time.monotonic()
+        if self.is_leader and self.election.role != LEADER:
+            # Another server leads a term at least as recent as ours
+            self.is_leader = False
+        return self.leader_info()
+
+    '''Votes for a candidate whose term is current and whose log has reached our LSN.'''
+    def request_vote(self, request, context):
+        # Read replicas do not vote
+        granted = self.membership.is_voter(self.id) and self.election.vote(request.term, request.candidate_id, request.lsn, self.applied_lsn)
+        if self.is_leader and self.election.role != LEADER:
+            # Voting in a later term ends our own
+            self.is_leader = False
+        return proto.Vote(term=self.election.term, candidate_id=request.candidate_id, granted=granted)
+
+    '''Returns the leader this server knows of, so clients can find it without probing every server.'''
+    def get_leader(self, request, context):
+        return self.leader_info()
+
+    '''The term and leader this server knows of, with the leader's address.'''
+    def leader_info(self):
+        term, leader_id = self.election.term, self.election.leader_id
+        leader = self.membership.get(leader_id)
+        if leader is None:
+            return proto.Leader(term=term)
+        return proto.Leader(term=term, leader_id=leader_id, address=leader.address())
+
+    '''Whether this server may answer a read: it has applied the client's writes (min_lsn) and, when the client
+    bounds staleness (max_lag), it heard from the leader within an election timeout and is at most max_lag
+    operations behind it. A backup waits up to READ_WAIT_SECONDS to catch up.'''
+    def read_is_current(self, request):
+        if self.is_leader or self.election_timer is None:
+            # The leader is always current, and a server outside a replica group has no leader to lag behind
+            return True
+        deadline = time.monotonic() + READ_WAIT_SECONDS
+        while True:
+            current = self.applied_lsn >= request.min_lsn
+            if request.max_lag > 0:
+                heard = self.leader_heard is not None and time.monotonic() - self.leader_heard <= ELECTION_TIMEOUT_SECONDS[1]
+                current = current and heard and self.leader_lsn - self.applied_lsn <= request.max_lag
+            if current:
+                return True
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(READ_WAIT_SECONDS / 10)
+
+    '''Stands for election in a new term. On winning a majority of the voters, catches the other servers up and
+    becomes leader. Returns whether this server won.'''
+    def run_election(self):
+        term = self.election.start_candidacy()
+        print(f"Starting election for term {term}")
+        request = proto.Vote(term=term, candidate_id=self.id, lsn=self.applied_lsn)
+        calls = [other.request_vote.future(request, timeout=HEARTBEAT_INTERVAL_SECONDS)
+                 for other, other_id in list(self.other_servers.items()) if self.membership.is_voter(other_id)]
+        votes = 1 # our own
+        for call in calls:
+            try:
+                reply = call.result()
+            except Exception as e:
+                continue
+            if reply.granted:
+                votes += 1
+            elif self.election.step_down(reply.term):
+                return False
+        if votes < self.membership.majority() or not self.election.win(term):
+            return False
+
+        print(f"I am the leader for term {term}")
+        # Replicate to every other server, then send them the writes they missed before taking client writes
+        self.backup_connections = dict(self.other_servers)
+        self.send_heartbeats()
+        self.sync_backups()
+        self.is_leader = self.election.role == LEADER and self.election.term == term
+        return self.is_leader
+
     '''Syncs the backups with the new leader's state.'''
     def sync_backups(self):
         # Operates on the assumption that the new leader is the first (of all the backups) to sync with ex-leader
         # Send all accounts to backups
-        new_leader_log_file = f'{self.id}.log'
-        for replica in self.backup_connections:
-            replica_log_file = f'{self.backup_connections[replica]}.log'
-            
-            lines1 = list(open(new_leader_log_file, "r"))
-            lines2 = list(open(replica_log_file, "r"))
+        leader_log = self.log_index(f'{self.id}.log')
+        for replica in list(self.backup_connections):
+            self.sync_backup(replica, leader_log)
+
+    '''Sends a backup the writes in our log that it has not applied, as a state snapshot first if it is far behind
+    and snapshot is True. A backup whose last operation is not ours (it is past our LSN, or was written in another
+    term) applied writes of a replaced leader, and only a snapshot replaces them. Returns False if the backup could
+    not be reached or did not apply every line sent.'''
+    def sync_backup(self, replica, leader_log, snapshot=True):
+        leader_log.refresh()
+        if leader_log.numbered() or (leader_log.lines == 0 and self.applied_lsn > 0):
+            # Send exactly the operations after the backup's applied LSN, streamed from the tail of our log in
+            # chunks so memory does not grow with the backlog
+            try:
+                position = replica.get_applied_lsn(proto.Empty())
+                applied_lsn = position.lsn
+                diverged = applied_lsn > 0 and self.term_at(leader_log, applied_lsn) != position.term
+                if diverged and not snapshot:
+                    return False
+                first_lsn = leader_log.first_lsn()
+                if leader_log.lines == 0:
+                    # Our log is missing or empty (we were brought up from a snapshot): only a snapshot has our writes
+                    first_lsn = self.applied_lsn + 1
+                if diverged or (snapshot and (self.applied_lsn - applied_lsn > SNAPSHOT_THRESHOLD_LSNS or (first_lsn is not None and applied_lsn < first_lsn - 1))):
+                    # Diverged, far behind, or missing lines our log does not have: send a snapshot, then the lines
+                    # after it
+                    applied_lsn = self.transfer_state(replica)
+                chunk = []
+                for line in leader_log.lines_after_lsn(applied_lsn):
+                    chunk.append(line)
+                    if len(chunk) == REPLAY_CHUNK_LINES:
+                        if not self.replay_on(replica, chunk):
+                            return False
+                        chunk = []
+                if len(chunk) > 0 and not self.replay_on(replica, chunk):
+                    return False
+            except Exception as e:
+                print("Error syncing backups")
+                return False
+            return True
 
-            if len(lines1) > len(lines2):
-                # Not synced; lines1 must have more lines
-                for unsynced_line in lines1[len(lines2):]:
-                    try:
-                        replica.process_line(unsynced_line)
-                    except Exception as e:
-                        print("Error syncing backups")
+        # Logs written before LSNs: assume the backup's log is a prefix of ours and send the lines after it
+        replica_log = self.log_index(f'{self.backup_connections.get(replica, self.other_servers.get(replica))}.log')
+        for unsynced_line in leader_log.lines_from(replica_log.count_lines()):
+            try:
+                replica.process_line(unsynced_line)
+            except Exception as e:
+                print("Error syncing backups")
+        return True
+
+    '''Returns the term of the operation we applied at lsn, or None if we have not applied it or our log no longer
+    has it.'''
+    def term_at(self, leader_log, lsn):
+        with self.lsn_lock:
+            applied_lsn, applied_term = self.applied_lsn, self.applied_term
+        if lsn == applied_lsn:
+            return applied_term
+        if lsn > applied_lsn:
+            return None
+        return leader_log.term_at(lsn)
+
+    '''Replays log lines on a replica. Returns whether it reached the last one; a replica refuses lines after one
+    it is missing.'''
+    def replay_on(self, replica, lines):
+        reached = replica.replay_log(proto.LogLines(lines=lines)).lsn
+        if reached < log_lsn(lines[-1]):
+            print(f"Backup stopped at LSN {reached} while catching up")
+            return False
+        return True
 
     '''Logins the user by checking the list of accounts stored in the server session.'''
+    @gated_write
     def login_user(self, request, context):
         print("Logging in user")
         username = request.text
@@ -229,35 +1017,26 @@ class CalendarServicer(proto_grpc.CalendarServicer):
             return proto.Text(text="User is already logged in.")
         else:
             # Log in user
-            mutex_active_accounts.acquire()
-            self.active_accounts.append(username)
-            mutex_active_accounts.release()
+            self.mutex_active_accounts.acquire()
+            self.active_accounts.add(username)
+            self.mutex_active_accounts.release()
         
         # If leader, sync replicas
+        replication = []
         if self.is_leader:
             new_text = proto.Text()
             new_text.text = username
-            for replica in self.backup_connections:
-                response = None
-                # Block until backups have been successfully updated
-                try:
-                    response = replica.login_user(new_text)
-                except Exception as e:
-                    print("Backup is down")
+            # Backups are updated in the same batch as the log copies below
+            replication = self.replicate("login_user", new_text)
         
         # Write to logs
         text = LOGIN_SUCCESSFUL + SEPARATOR + username
-        try:
-            logger = logging.getLogger(f'{self.id}')
-            logger.info(text)
-            for other in self.other_servers:
-                other.log_update(proto.Search(function=f'{self.id}', value=text))
-        except Exception as e:
-            print("Error logging to other servers")
+        lsn = self.log_to_servers(text, replication)
         
-        return proto.Text(text=LOGIN_SUCCESSFUL)
+        return proto.Text(text=LOGIN_SUCCESSFUL, lsn=lsn)
 
     '''Registers user given the client's input and compares with existing account stores.'''
+    @gated_write
     def register_user(self, request, context):
         username = request.text
         # Additional check for log reading in persistence
@@ -272,50 +1051,40 @@ class CalendarServicer(proto_grpc.CalendarServicer):
         else:
             print(f"Registering {username}")
             # Register and log in user
-            mutex_active_accounts.acquire()
-            self.active_accounts.append(username)
-            mutex_active_accounts.release()
+            self.mutex_active_accounts.acquire()
+            self.active_accounts.add(username)
+            self.mutex_active_accounts.release()
 
-            mutex_accounts.acquire()
-            self.accounts.append(username)
-            mutex_accounts.release()
+            self.accounts_lock.acquire_write()
+            self.accounts.add(username)
+            self.accounts_lock.release_write()
 
-            mutex_new_event_notifications.acquire()
-            self.new_event_notifications[username] = []
-            mutex_new_event_notifications.release()
+            self.new_event_notifications.register(username)
 
-            mutex_events.acquire()
+            self.events_lock.acquire_write()
             self.private_mappings[username] = []
-            mutex_events.release()
 
             # If leader, sync replicas
+            replication = []
             if self.is_leader:
                 new_text = proto.Text()
                 new_text.text = username
                 print("Backup Connections: ", self.backup_connections)
-                for replica in self.backup_connections:
-                    response = None
-                    # Block until backups have been successfully updated
-                    try:
-                        response = replica.register_user(new_text)
-                    except Exception as e:
-                        print("Backup is down")
+                # Backups are updated in the same batch as the log copies below
+                replication = self.replicate("register_user", new_text)
             
-            # Write to logs
+            # Number the write before an event write can invite the new user, so every server registers them first
             text = REGISTRATION_SUCCESSFUL + SEPARATOR + username
-            try:
-                logger = logging.getLogger(f'{self.id}')
-                logger.info(text)
-                for other in self.other_servers:
-                    print(f"{self.id}")
-                    other.log_update(proto.Search(function=f'{self.id}', value=text))
-            except Exception as e:
-                print("Error logging update")
+            lsn, write = self.submit_log(text, replication)
+            self.events_lock.release_write()
+            self.wait_for_replication(lsn, write)
 
-            return proto.Text(text=LOGIN_SUCCESSFUL)
+            return proto.Text(text=LOGIN_SUCCESSFUL, lsn=lsn)
         
     '''Determines whether the user is currently in the registered list of users.'''
     def check_user_exists(self, request, context):
+        if not self.read_is_current(request):
+            return proto.Text(text=REPLICA_BEHIND)
         username = request.text
         if username in self.accounts:
             return proto.Text(text="User exists.")
@@ -324,119 +1093,144 @@ class CalendarServicer(proto_grpc.CalendarServicer):
         
 
     '''Deletes the account for the client requesting the deletion'''
+    @gated_write
     def delete_account(self, request, context):
         username = request.text
         try: 
-            mutex_active_accounts.acquire()
-            self.active_accounts.remove(username)
-            mutex_active_accounts.release()
-
-            mutex_new_event_notifications.acquire()
-            del self.new_event_notifications[username]
-            mutex_new_event_notifications.release()
-
-            mutex_events.acquire()
-            # Delete all private events user is a part of
-            del self.private_mappings[username]
-
-            # Delete all public events created by this user
-            new_public_events = []
-            for event in self.public_events:
-                if event.host != username:
-                    new_public_events.append(event)
-            self.public_events = new_public_events
-            
-            # Delete all private events created by this user
-            new_private_events = []
-            for event in self.private_events:
-                if event.host == username:
-                    continue
-                
-                # Remove user from guestlists of private events
-                guests = event.guestlist.split(", ")
-                if username in guests:
-                    guests.remove(username)
-                    # If no more guests, remove event
-                    if len(guests) != 0:
-                        new_private_events.append(event)
-                    
-                    event.guestlist = ", ".join(guests)
-            self.private_events = new_private_events
-
-            mutex_events.release()
-
-            mutex_accounts.acquire()
-            self.accounts.remove(username)
-            mutex_accounts.release()
-        except Exception as e:
-            return proto.Text(text=ACTION_UNSUCCESSFUL)
+            self.mutex_active_accounts.acquire()
+            try:
+                self.active_accounts.remove(username)
+            finally:
+                self.mutex_active_accounts.release()
 
-        # If leader, sync replicas
-        if self.is_leader:
-            new_text = proto.Text()
-            new_text.text = username
-            for replica in self.backup_connections:
-                response = None
-                # Block until backups have been successfully updated
+            self.new_event_notifications.unregister(username)
+            self.subscriptions.close(username)
+
+            self.events_lock.acquire_write()
+            try:
+                # Delete all private events user is a part of
+                del self.private_mappings[username]
+
+                for event in list(self.events.values()):
+                    # Delete all public and private events created by this user
+                    if event.host == username:
+                        self.remove_private_mappings(self.remove_event(event.id))
+                        continue
+                    if event.id not in self.private_event_ids:
+                        continue
+
+                    # Remove user from guestlists of private events
+                    guests = event.guestlist.split(", ")
+                    if username in guests:
+                        guests.remove(username)
+                        # If no more guests, remove event
+                        if len(guests) != 0:
+                            self.replace_event(Event(id=event.id, host=event.host, starttime=event.starttime, duration=event.duration, description=event.description, guestlist=", ".join(guests)))
+                        else:
+                            self.remove_private_mappings(self.remove_event(event.id))
+
+                self.accounts_lock.acquire_write()
                 try:
-                    response = replica.delete_account(new_text)
-                except Exception as e:
-                    print("Backup is down")
+                    self.accounts.remove(username)
+                finally:
+                    self.accounts_lock.release_write()
 
-        # Write to logs
-        text = DELETION_SUCCESSFUL + SEPARATOR + username
-        try:
-            logger = logging.getLogger(f'{self.id}')
-            logger.info(text)
-            for other in self.other_servers:
-                other.log_update(proto.Search(function=f'{self.id}', value=text))
+                # If leader, sync replicas
+                replication = []
+                if self.is_leader:
+                    new_text = proto.Text()
+                    new_text.text = username
+                    # Backups are updated in the same batch as the log copies below
+                    replication = self.replicate("delete_account", new_text)
+
+                # Number the write before the next event write can commit, so every server deletes the account's
+                # events and invitations at the same point
+                text = DELETION_SUCCESSFUL + SEPARATOR + username
+                lsn, write = self.submit_log(text, replication)
+            finally:
+                self.events_lock.release_write()
         except Exception as e:
-            print("Error logging to other servers")
+            return proto.Text(text=ACTION_UNSUCCESSFUL)
+
+        self.wait_for_replication(lsn, write)
         
-        return proto.Text(text=DELETION_SUCCESSFUL)
+        return proto.Text(text=DELETION_SUCCESSFUL, lsn=lsn)
     
     '''Displays the current registered accounts that match the regex expression given by the client'''
     def display_accounts(self, request, context):
-        none_found = True
-        username = request.text
-        for account in self.accounts:
-            x = re.search(username, account)
-            if x is not None:
-                none_found = False
-                yield proto.Text(text = x.string)
-        if none_found:
-            yield proto.Text(text = "No user matches this!")
+        if request.page_token:
+            # Resume a paged listing where its previous page ended
+            cursor = self.account_cursors.resume(request.page_token)
+            if cursor is None:
+                yield proto.Text(text = INVALID_PAGE_TOKEN)
+                return
+            matches, start = cursor
+        else:
+            if not self.read_is_current(request):
+                yield proto.Text(text = REPLICA_BEHIND)
+                return
+            username = request.text
+            # Listings are cached by pattern until the next registration or deletion. The registry is part of the
+            # version so replacing it also invalidates the cache
+            accounts = self.accounts
+            version = (accounts, accounts.version)
+            matches = self.account_cache.get(username, version)
+            if matches is None:
+                # Anchored prefix and exact patterns are answered by the account registry's sorted index
+                self.accounts_lock.acquire_read()
+                try:
+                    matches = accounts.indexed_search(username)
+                    if matches is None:
+                        usernames = list(accounts)
+                finally:
+                    self.accounts_lock.release_read()
+                # Other patterns are matched after releasing the lock, under the regex time budget
+                if matches is None:
+                    try:
+                        matches = self.regex_guard.filter(username, usernames)
+                    except re.error:
+                        yield proto.Text(text = INVALID_PATTERN)
+                        return
+                    except SearchBudgetExceeded:
+                        yield proto.Text(text = SEARCH_TOO_EXPENSIVE)
+                        return
+                self.account_cache.put(username, version, matches)
+            start = 0
+            if len(matches) == 0:
+                yield proto.Text(text = "No user matches this!")
+                return
+
+        end, next_page_token = self.account_cursors.page(matches, start, request.page_size)
+        for i in range(start, end):
+            message = proto.Text(text = matches[i])
+            if i == end - 1 and next_page_token:
+                message.next_page_token = next_page_token
+            yield message
 
     '''Logs out the user. Assumes that the user is already logged in and is displayed as an active account'''
+    @gated_write
     def logout(self, request, context):
         username = request.text
-        mutex_active_accounts.acquire()
-        self.active_accounts.remove(username)
-        mutex_active_accounts.release()
+        self.mutex_active_accounts.acquire()
+        try:
+            self.active_accounts.remove(username)
+        finally:
+            self.mutex_active_accounts.release()
+        self.subscriptions.close(username)
 
         # If leader, sync replicas
+        replication = []
         if self.is_leader:
             new_text = proto.Text()
             new_text.text = username
-            for replica in self.backup_connections:
-                response = None
-                # Block until backups have been successfully updated
-                try:
-                    response = replica.logout(new_text)
-                except Exception as e:
-                    print("Backup is down")
+            # Backups are updated in the same batch as the log copies below
+            replication = self.replicate("logout", new_text)
         
         # Write to logs
         text = LOGOUT_SUCCESSFUL + SEPARATOR + username
-        try:
-            logger = logging.getLogger(f'{self.id}')
-            logger.info(text)
-            for other in self.other_servers:
-                other.log_update(proto.Search(function=f'{self.id}', value=text))
-        except Exception as e:
-            print("Error logging to other servers")
+        lsn = self.log_to_servers(text, replication)
 
-        return proto.Text(text=LOGOUT_SUCCESSFUL)
+        return proto.Text(text=LOGOUT_SUCCESSFUL, lsn=lsn)
     
     '''Helper function to convert the data into a gRPC message'''
     def convert_event_to_proto(self, event):
@@ -453,106 +1247,107 @@ class CalendarServicer(proto_grpc.CalendarServicer):
     '''Notifies a new event for the user.'''
     def notify_new_event(self, request, context):
         username = request.text
-        mutex_new_event_notifications.acquire()
-        new_events = self.new_event_notifications[username]
+        # Read everything after the user's cursor, then stream without holding the lock
+        new_events = self.new_event_notifications.read(username)
         for new_event in new_events:
             yield self.convert_event_to_proto(new_event)
-        self.new_event_notifications[username] = []
-        mutex_new_event_notifications.release()
         return proto.Text(text=UPDATE_SUCCESSFUL)
     
+    '''Streams new events to the user as they are committed until they log out or disconnect.'''
+    def subscribe_events(self, request, context):
+        username = request.text
+        subscription = self.subscriptions.subscribe(username)
+        if subscription is None:
+            # At capacity; the client keeps polling notify_new_event instead
+            if context is not None:
+                context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, "Too many subscribers.")
+            return
+
+        try:
+            while not subscription.closed and (context is None or context.is_active()):
+                # Events come from the notification log, so nothing is lost or delivered twice
+                new_events = self.new_event_notifications.read(username) if username in self.new_event_notifications else None
+                if new_events is None:
+                    break
+                for new_event in new_events:
+                    yield self.convert_event_to_proto(new_event)
+                subscription.wait(SUBSCRIPTION_POLL_SECONDS)
+        finally:
+            self.subscriptions.unsubscribe(subscription)
+    
     '''Helper function to return True if there's a conflict, False if not'''
     def check_conflict(self, event1, event2, private=False):
-        event1_starttime = datetime.datetime.fromtimestamp(event1.starttime)
-        event1_endtime = event1_starttime + datetime.timedelta(hours=event1.duration)
-        event2_starttime = datetime.datetime.fromtimestamp(event2.starttime)
-        event2_endtime = event2_starttime + datetime.timedelta(hours=event2.duration)
+        event1_starttime, event1_endtime = event_interval(event1.starttime, event1.duration)
+        event2_starttime, event2_endtime = event_interval(event2.starttime, event2.duration)
 
         return not (event1_endtime <= event2_starttime or event2_endtime <= event1_starttime)
     
 
     '''Schedules a new public event for the user.'''
+    @gated_write
     def schedule_public_event(self, request, context):
         host = request.host
         starttime = request.starttime
         duration = request.duration
         description = request.description
-        new_event = Event(id=self.next_event_id, host=host, starttime=starttime, duration=duration, description=description, guestlist="All")
-        mutex_events.acquire()
-        
-        # Check conflict with public events
-        for event in self.public_events:
-            if self.check_conflict(new_event, event):
-                mutex_events.release()
-                return proto.Text(text=EVENT_CONFLICT)
+        self.events_lock.acquire_write()
         
-        # Check conflict with private events
-        for event in self.private_events:
-            if self.check_conflict(new_event, event):
-                mutex_events.release()
-                return proto.Text(text=EVENT_CONFLICT)
+        # Check conflict with all public and private events
+        if self.conflict_index.conflicts_public(starttime, duration):
+            self.events_lock.release_write()
+            return proto.Text(text=EVENT_CONFLICT)
 
-        self.public_events.append(new_event)
+        new_event = Event(id=self.next_event_id, host=host, starttime=starttime, duration=duration, description=description, guestlist="All")
+        self.add_event(new_event, public=True)
         self.next_event_id += 1
-        mutex_events.release()
 
-        # Update notifications for all accounts
-        for user in self.accounts:
-            if user != host:
-                mutex_new_event_notifications.acquire()
-                self.new_event_notifications[user].append(new_event)
-                mutex_new_event_notifications.release()
+        # Update notifications for all accounts (published once, read through each user's cursor)
+        self.new_event_notifications.publish_public(new_event)
 
         # If leader, sync replicas
+        replication = []
         if self.is_leader:    
             print("Backup Connections: ", self.backup_connections)
-            for replica in self.backup_connections:
-                response = None
-                # Block until backups have been successfully updated
-                try:
-                    response = replica.schedule_public_event(request)
-                except Exception as e:
-                    print("Backup is down")
+            # Backups are updated in the same batch as the log copies below
+            replication = self.replicate("schedule_public_event", request)
 
+        # Number the write before the next event write can commit, so every server assigns event ids in this order
         text = PUBLIC_EVENT_SCHEDULED + SEPARATOR + host + SEPARATOR + str(starttime) + SEPARATOR + str(duration) + SEPARATOR + description
-        try:
-            logger = logging.getLogger(f'{self.id}')
-            logger.info(text)
-            for other in self.other_servers:
-                print(f"{self.id}")
-                other.log_update(proto.Search(function=f'{self.id}', value=text))
-        except Exception as e:
-            print("Error logging update")
+        lsn, write = self.submit_log(text, replication)
+        self.events_lock.release_write()
+
+        # Push the event to connected subscribers
+        self.subscriptions.notify_all(except_username=host)
 
-        return proto.Text(text=PUBLIC_EVENT_SCHEDULED)
+        self.wait_for_replication(lsn, write)
+
+        return proto.Text(text=PUBLIC_EVENT_SCHEDULED, lsn=lsn)
 
 
     '''Schedules a new private event for the user.'''
+    @gated_write
     def schedule_private_event(self, request, context):
         host = request.host
         starttime = request.starttime
         duration = request.duration
         description = request.description
         guestlist = request.guestlist
-        new_event = Event(id=self.next_event_id, host=host, starttime=starttime, duration=duration, description=description, guestlist=guestlist)
-        mutex_events.acquire()
+        self.events_lock.acquire_write()
         
         try:
-            # Check conflict with public events
-            for event in self.public_events:
-                if self.check_conflict(new_event, event):
-                    mutex_events.release()
-                    return proto.Text(text=EVENT_CONFLICT)
-            
-            # Check conflict with private events for each person on guestlist
+            # Every guest must have an account
             for guest in guestlist.split(", "):
-                event_ids = self.private_mappings[guest]
-                for event in self.private_events:
-                    if event.id in event_ids and self.check_conflict(new_event, event):
-                        mutex_events.release()
-                        return proto.Text(text=EVENT_CONFLICT)
+                if guest not in self.private_mappings:
+                    raise KeyError(guest)
+
+            # Check conflict with public events and the private events of the host and each person on guestlist
+            new_event = Event(id=self.next_event_id, host=host, starttime=starttime, duration=duration, description=description, guestlist=guestlist)
+            participants = event_participants(new_event)
+            if self.conflict_index.conflicts_private(starttime, duration, participants):
+                self.events_lock.release_write()
+                return proto.Text(text=EVENT_CONFLICT)
 
-            self.private_events.append(new_event)
+            self.add_event(new_event, public=False)
             for guest in guestlist.split(", "):
                 self.private_mappings[guest].append(new_event.id)
             self.private_mappings[host].append(new_event.id)
@@ -560,250 +1355,266 @@ class CalendarServicer(proto_grpc.CalendarServicer):
             self.next_event_id += 1
 
             # Update notifications for all invited accounts
-            for user in guestlist.split(", "):
-                if user != host:
-                    mutex_new_event_notifications.acquire()
-                    self.new_event_notifications[user].append(new_event)
-                    mutex_new_event_notifications.release()
-            
-            mutex_events.release()
+            self.new_event_notifications.publish_private(new_event, [user for user in guestlist.split(", ") if user != host])
             
         except Exception as e:
-            mutex_events.release()
+            self.events_lock.release_write()
             print("Error scheduling private event")
             return
 
         # If leader, sync replicas
+        replication = []
         if self.is_leader:    
             print("Backup Connections: ", self.backup_connections)
-            for replica in self.backup_connections:
-                response = None
-                # Block until backups have been successfully updated
-                try:
-                    replica.schedule_private_event(request)
-                except Exception as e:
-                    print("Backup is down")
+            # Backups are updated in the same batch as the log copies below
+            replication = self.replicate("schedule_private_event", request)
 
+        # Number the write before the next event write can commit, so every server assigns event ids in this order
         text = PRIVATE_EVENT_SCHEDULED + SEPARATOR + host + SEPARATOR + str(starttime) + SEPARATOR + str(duration) + SEPARATOR + description + SEPARATOR + guestlist
-        try:
-            logger = logging.getLogger(f'{self.id}')
-            logger.info(text)
-            for other in self.other_servers:
-                print(f"{self.id}")
-                other.log_update(proto.Search(function=f'{self.id}', value=text))
-        except Exception as e:
-            print("Error logging update")
+        lsn, write = self.submit_log(text, replication)
+        self.events_lock.release_write()
+
+        # Push the invitation to connected guests
+        self.subscriptions.notify([user for user in guestlist.split(", ") if user != host])
+
+        self.wait_for_replication(lsn, write)
 
-        return proto.Text(text=PRIVATE_EVENT_SCHEDULED)
+        return proto.Text(text=PRIVATE_EVENT_SCHEDULED, lsn=lsn)
     
 
+    '''Returns the events with the given ids in scheduling order. Caller holds the events lock.'''
+    def events_by_id(self, event_ids):
+        return [self.events[event_id] for event_id in sorted(set(event_ids)) if event_id in self.events]
+
+
+    '''Returns the events matching a search function and value answered from the indexes. Caller holds the events lock.'''
+    def find_events(self, function, value):
+        # All events
+        if function==SEARCH_ALL_EVENTS:
+            return self.public_events + self.private_events
+        # Events hosted by exactly this user
+        elif function==SEARCH_HOST:
+            return self.events_by_id(self.host_events.get(value, ()))
+        # Events this user hosts or is invited to
+        elif function==SEARCH_PARTICIPANT:
+            return self.events_by_id(list(self.host_events.get(value, ())) + list(self.private_mappings.get(value, ())))
+        # Events overlapping a time window, optionally only those on one user's calendar
+        elif function==SEARCH_TIME:
+            try:
+                window = value.split(SEPARATOR)
+                start, end = int(window[0]), int(window[1])
+                participant = window[2] if len(window) > 2 else None
+            except (ValueError, IndexError):
+                return []
+
+            event_ids = self.time_index.overlapping(start, end)
+            if participant is not None:
+                # Public events are on everyone's calendar
+                own_ids = set(self.host_events.get(participant, ())) | set(self.private_mappings.get(participant, ()))
+                event_ids = [event_id for event_id in event_ids if event_id in own_ids or event_id in self.public_event_ids]
+            return [self.events[event_id] for event_id in event_ids if event_id in self.events]
+        # Events whose description contains every keyword (matched as word prefixes)
+        elif function==SEARCH_KEYWORD:
+            return self.events_by_id(self.description_index.search(value))
+        return None
+
+
+    '''Returns the events matching a regular expression search (SEARCH_USER or SEARCH_DESCRIPTION). The events lock
+    is held only for index lookups; the pattern is matched afterwards by the regex guard, so a slow pattern never
+    blocks writers. Raises re.error for invalid patterns and SearchBudgetExceeded for runaway ones.'''
+    def find_events_by_pattern(self, function, value):
+        # Events for hosts matching a regular expression
+        if function==SEARCH_USER:
+            # Match each distinct host once and read their events from the host index
+            self.events_lock.acquire_read()
+            try:
+                hosts = list(self.host_events)
+            finally:
+                self.events_lock.release_read()
+            hosts = self.regex_guard.filter(value, hosts)
+            self.events_lock.acquire_read()
+            try:
+                return self.events_by_id([event_id for host in hosts for event_id in self.host_events.get(host, ())])
+            finally:
+                self.events_lock.release_read()
+
+        # Events for a particular description
+        # Only run the regular expression over events the description index cannot rule out
+        self.events_lock.acquire_read()
+        try:
+            candidate_ids = self.description_index.regex_candidates(value)
+            if candidate_ids is not None:
+                candidates = self.events_by_id(candidate_ids)
+        finally:
+            self.events_lock.release_read()
+        if candidate_ids is None:
+            candidates = self.event_snapshot().events
+        # Events are immutable, so matching needs no lock
+        return self.regex_guard.filter(value, candidates, key=lambda event: event.description)
+
+
     '''Searches for events for the user.'''
     def search_events(self, request, context):
-        function = request.function
-        value = request.value
+        if request.page_token:
+            # Resume a paged search where its previous page ended
+            cursor = self.search_cursors.resume(request.page_token)
+            if cursor is None:
+                yield proto.Event(returntext=INVALID_PAGE_TOKEN)
+                return
+            matches, start = cursor
+            yield from self.event_page(matches, start, request.page_size)
+            return
+        if not self.read_is_current(request):
+            yield proto.Event(returntext=REPLICA_BEHIND)
+            return
 
-        all_events = self.public_events + self.private_events
+        function, value = request.function, request.value
+        # Converted results are cached by query until the next event write. The version is read first, so a result
+        # computed while a write commits is stored under the older version and never served as current
+        version = self.events_version
+        messages = self.search_cache.get((function, value), version)
+        if messages is None:
+            if function==SEARCH_ALL_EVENTS:
+                # Read the latest snapshot: no lock is held, so writers never wait on this search
+                matches = self.event_snapshot().events
+            elif function==SEARCH_USER or function==SEARCH_DESCRIPTION:
+                try:
+                    matches = self.find_events_by_pattern(function, value)
+                except re.error:
+                    yield proto.Event(returntext=INVALID_PATTERN)
+                    return
+                except SearchBudgetExceeded:
+                    yield proto.Event(returntext=SEARCH_TOO_EXPENSIVE)
+                    return
+            else:
+                # Index lookups are short; the matched events are immutable so they are converted after releasing the lock
+                self.events_lock.acquire_read()
+                try:
+                    matches = self.find_events(function, value)
+                finally:
+                    self.events_lock.release_read()
+
+            if matches is None:
+                return
+            messages = tuple(self.convert_event_to_proto(event) for event in matches)
+            self.search_cache.put((function, value), version, messages)
+
+        if len(messages) == 0:
+            yield proto.Event(returntext=NO_MATCH)
+            return
+        yield from self.event_page(messages, 0, request.page_size)
 
-        # Displays all events
-        if function==SEARCH_ALL_EVENTS:
-            if len(all_events) == 0:
-                return proto.Event(returntext=NO_MATCH)
-            for event in all_events:
-                yield self.convert_event_to_proto(event)
-        # Displays events for a particular user
-        elif function==SEARCH_USER:
-            none_found = True
-            for event in all_events:
-                x = re.search(value, event.host)
-                if x is not None:
-                    none_found=False
-                    yield self.convert_event_to_proto(event)
-            if none_found:
-                yield proto.Event(returntext=NO_MATCH)
-        # Displays events for a particular description
-        elif function==SEARCH_DESCRIPTION:
-            none_found = True
-            for event in all_events:
-                x = re.search(value, event.description)
-                if x is not None:
-                    none_found=False
-                    yield self.convert_event_to_proto(event)
-            if none_found:
-                yield proto.Event(returntext=NO_MATCH)
+
+    '''Yields one page of converted events starting at position. The last event of a page that has more results
+    after it carries the token resuming the search.'''
+    def event_page(self, messages, start, page_size):
+        end, next_page_token = self.search_cursors.page(messages, start, page_size)
+        for i in range(start, end):
+            message = messages[i]
+            if i == end - 1 and next_page_token:
+                # Cached messages are shared between searches, so the token goes on a copy
+                message = proto.Event()
+                message.CopyFrom(messages[i])
+                message.next_page_token = next_page_token
+            yield message
 
 
     '''Edits an event for the user.'''
+    @gated_write
     def edit_event(self, request, context):
         event_id = request.id
-        new_event = Event(id=event_id, host=request.host, starttime=request.starttime, duration=request.duration, description=request.description)
         
-        mutex_events.acquire()
+        self.events_lock.acquire_write()
 
-        # Check conflicts against all public events
-        for event in self.public_events:
-            if self.check_conflict(new_event, event) and event.id != event_id:
-                return proto.Text(text=EVENT_CONFLICT)
-        
-        # Check conflicts against all private events
-        guestlist = None
-        for event in self.private_events:
-            if event.id == event_id:
-                guestlist = event.guestlist
-                break
-        
-        if guestlist is not None:
-            for guest in guestlist:
-                if guest in self.private_mappings:
-                    event_ids = self.private_mappings[guest]
-                    for event in self.private_events:
-                        if event.id in event_ids and self.check_conflict(new_event, event):
-                            return proto.Text(text=EVENT_CONFLICT)
-        
-        for event in self.public_events:
-            if event.id == event_id:
-                event.starttime = request.starttime
-                event.duration = request.duration
-                event.description = request.description
+        event_to_edit = self.events.get(event_id)
+        if event_to_edit is None:
+            self.events_lock.release_write()
+            return proto.Text(text=ACTION_UNSUCCESSFUL)
 
-                mutex_events.release()
+        # Take the event out of the conflict index so it does not conflict with itself
+        participants = self.conflict_index.remove(event_id)
+        if participants is None:
+            # Public events conflict with every other event
+            conflict = self.conflict_index.conflicts_public(request.starttime, request.duration)
+        else:
+            # Private events conflict with public events and the private events of their participants
+            conflict = self.conflict_index.conflicts_private(request.starttime, request.duration, participants)
 
-                # If leader, sync replicas
-                if self.is_leader:    
-                    print("Backup Connections: ", self.backup_connections)
-                    for replica in self.backup_connections:
-                        response = None
-                        # Block until backups have been successfully updated
-                        try:
-                            response = replica.edit_event(request)
-                        except Exception as e:
-                            print("Backup is down")
-
-                text = EVENT_EDITED + SEPARATOR + str(event_id) + SEPARATOR + str(request.starttime) + SEPARATOR + str(request.duration) + SEPARATOR + request.description
-                try:
-                    logger = logging.getLogger(f'{self.id}')
-                    logger.info(text)
-                    for other in self.other_servers:
-                        print(f"{self.id}")
-                        other.log_update(proto.Search(function=f'{self.id}', value=text))
-                except Exception as e:
-                    print("Error logging update")
-
-                # Update other servers and then log
-                return proto.Text(text=UPDATE_SUCCESSFUL)
-        
-        for event in self.private_events:
-            if event.id == event_id:
-                event.starttime = request.starttime
-                event.duration = request.duration
-                event.description = request.description
+        if conflict:
+            self.conflict_index.add(event_id, event_to_edit.starttime, event_to_edit.duration, participants=participants)
+            self.events_lock.release_write()
+            return proto.Text(text=EVENT_CONFLICT)
 
-                mutex_events.release()
+        # Replace rather than change the event so snapshots being streamed keep the old version
+        self.replace_event(Event(id=event_id, host=event_to_edit.host, starttime=request.starttime, duration=request.duration, description=request.description, guestlist=event_to_edit.guestlist))
 
-                # If leader, sync replicas
-                if self.is_leader:    
-                    print("Backup Connections: ", self.backup_connections)
-                    for replica in self.backup_connections:
-                        response = None
-                        # Block until backups have been successfully updated
-                        try:
-                            response = replica.edit_event(request)
-                        except Exception as e:
-                            print("Backup is down")
-
-                text = EVENT_EDITED + SEPARATOR + str(event_id) + SEPARATOR + str(request.starttime) + SEPARATOR + str(request.duration) + SEPARATOR + request.description
-                try:
-                    logger = logging.getLogger(f'{self.id}')
-                    logger.info(text)
-                    for other in self.other_servers:
-                        print(f"{self.id}")
-                        other.log_update(proto.Search(function=f'{self.id}', value=text))
-                except Exception as e:
-                    print("Error logging update")
-
-                # Update other servers and then log
-                return proto.Text(text=UPDATE_SUCCESSFUL)
-        
-        mutex_events.release()
-        return proto.Text(text=ACTION_UNSUCCESSFUL)
+        # If leader, sync replicas
+        replication = []
+        if self.is_leader:    
+            print("Backup Connections: ", self.backup_connections)
+            # Backups are updated in the same batch as the log copies below
+            replication = self.replicate("edit_event", request)
+
+        # Update other servers and then log, numbered in the order event writes commit
+        text = EVENT_EDITED + SEPARATOR + str(event_id) + SEPARATOR + str(request.starttime) + SEPARATOR + str(request.duration) + SEPARATOR + request.description
+        lsn, write = self.submit_log(text, replication)
+        self.events_lock.release_write()
+        self.wait_for_replication(lsn, write)
+
+        return proto.Text(text=UPDATE_SUCCESSFUL, lsn=lsn)
     
 
+    '''Removes a private event from the private mappings of its host and guests. Caller holds the events write lock.'''
+    def remove_private_mappings(self, event):
+        if event is None:
+            return
+        for username in event_participants(event):
+            if username in self.private_mappings and event.id in self.private_mappings[username]:
+                self.private_mappings[username].remove(event.id)
+
+
     '''Deletes an event for the user.'''
+    @gated_write
     def delete_event(self, request, context):
         event_id = request.id
-        for event in self.public_events:
-            if event.id == event_id:
-                mutex_events.acquire()
-                self.public_events.remove(event)
-                mutex_events.release()
 
-                # If leader, sync replicas
-                if self.is_leader:    
-                    print("Backup Connections: ", self.backup_connections)
-                    for replica in self.backup_connections:
-                        response = None
-                        # Block until backups have been successfully updated
-                        try:
-                            response = replica.delete_event(request)
-                        except Exception as e:
-                            print("Backup is down")
-
-                text = DELETE_EVENT + SEPARATOR + str(event_id)
-                try:
-                    logger = logging.getLogger(f'{self.id}')
-                    logger.info(text)
-                    for other in self.other_servers:
-                        print(f"{self.id}")
-                        other.log_update(proto.Search(function=f'{self.id}', value=text))
-                except Exception as e:
-                    print("Error logging update")
-
-                return proto.Text(text=EVENT_DELETED)
-    
-        for event in self.private_events:
-            if event.id == event_id:
-                mutex_events.acquire()
-                self.private_events.remove(event)
+        self.events_lock.acquire_write()
+        event = self.remove_event(event_id)
+        if event is None:
+            self.events_lock.release_write()
+            return proto.Text(text=ACTION_UNSUCCESSFUL)
+        self.remove_private_mappings(event)
 
-                for username in event.guestlist.split(","):
-                    self.private_mappings[username].remove(event_id)
-                self.private_mappings[event.host].remove(event_id)
+        # If leader, sync replicas
+        replication = []
+        if self.is_leader:    
+            print("Backup Connections: ", self.backup_connections)
+            # Backups are updated in the same batch as the log copies below
+            replication = self.replicate("delete_event", request)
 
-                mutex_events.release()
+        # Numbered in the order event writes commit
+        text = EVENT_DELETED + SEPARATOR + str(event_id)
+        lsn, write = self.submit_log(text, replication)
+        self.events_lock.release_write()
+        self.wait_for_replication(lsn, write)
 
-                # If leader, sync replicas
-                if self.is_leader:    
-                    print("Backup Connections: ", self.backup_connections)
-                    for replica in self.backup_connections:
-                        # Block until backups have been successfully updated
-                        try:
-                            replica.delete_event(request)
-                        except Exception as e:
-                            print("Backup is down")
-
-                text = DELETE_EVENT + SEPARATOR + str(event_id)
-                try:
-                    logger = logging.getLogger(f'{self.id}')
-                    logger.info(text)
-                    for other in self.other_servers:
-                        print(f"{self.id}")
-                        other.log_update(proto.Search(function=f'{self.id}', value=text))
-                except Exception as e:
-                    print("Error logging update")
-
-                return proto.Text(text=EVENT_DELETED)
-        
-        return proto.Text(text=ACTION_UNSUCCESSFUL)
+        return proto.Text(text=EVENT_DELETED, lsn=lsn)
     
 
 '''Class for running server backend functionality.'''
 class ServerRunner:
     '''Initialize a server instance.'''
-    def __init__(self, id = 0, address = (None, None)):
+    def __init__(self, id = 0, address = (None, None), ack_mode = REPLICATION_ACK_MODE, max_in_flight = MAX_IN_FLIGHT_WRITES):
         self.id = id
         self.ip, self.port = address
 
-        self.server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
-        self.calendar_servicer = CalendarServicer(id=self.id, address=address)
+        self.calendar_servicer = CalendarServicer(id=self.id, address=address, ack_mode=ack_mode, max_in_flight=max_in_flight)
+        # Each event subscription and each inbound ship_batches stream holds a worker thread for as long as it is open,
+        # so reserve threads for them on top of regular requests. Calls beyond the pool are refused with
+        # RESOURCE_EXHAUSTED instead of queueing behind the streams
+        workers = 10 + MAX_SUBSCRIBERS + len(self.calendar_servicer.membership) + MEMBER_HEADROOM
+        self.server = grpc.server(futures.ThreadPoolExecutor(max_workers=workers), options=SERVER_OPTIONS,
+                                  maximum_concurrent_rpcs=workers)
     
     '''Function for starting server.'''
     def start(self):
@@ -819,7 +1630,11 @@ class ServerRunner:
     def connect_to_replicas(self, logfile=None):
         self.calendar_servicer.connect_to_replicas(logfile=logfile)
 
+    '''Function for joining a running cluster through any of its servers, given as "host:port".'''
+    def join_cluster(self, seed_address, voter=False):
+        self.calendar_servicer.join_cluster_through(seed_address, voter=voter)
+
     '''Function for stopping server.'''
     def stop(self):
         self.server.stop(grace=None)
-        self.thread_pool.shutdown(wait=False)
+        self.calendar_servicer.channels.close_all()
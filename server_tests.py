@@ -1,9 +1,22 @@
 from server import CalendarServicer
+from conflict_index import ConflictIndex
+from account_registry import AccountRegistry
+from replication_batch import ReplicationBatcher, PendingWrite
+from log_index import LogIndex
+from log_shipping import LogShipper
+from election import Election
+from membership import Membership, Member, load_members
+from circuit_breaker import CircuitBreaker, FAILURES_TO_TRIP
+from regex_guard import RegexGuard, SearchBudgetExceeded
+from concurrent import futures
 from commands import *
 from unittest.mock import MagicMock
 from unittest.mock import patch
 import new_route_guide_pb2 as proto
 from io import StringIO
+import re
+import threading
+import time
 
 # pytest server_tests.py
 
@@ -51,6 +64,696 @@ def test_backup_sync():
     assert args_list[3][0][0] == "Logout successful.: dale1\n"
 
 
+"""Testing that concurrent writes reach each backup as one ordered batch and that backups apply batches"""
+def test_batched_replication():
+    server = CalendarServicer()
+    server.is_leader = True
+    server.replication_batcher.window = 0.2
+
+    # Setting up mocks: each backup records the batches it receives over its log shipping stream
+    batches = {}
+    def stub(name):
+        replica = MagicMock()
+        def ship_batches(request_iterator):
+            for batch in request_iterator:
+                batches.setdefault(name, []).append(list(batch.operations))
+                yield proto.Text(text="Done")
+        replica.ship_batches.side_effect = ship_batches
+        return replica
+    backup1, backup2 = stub("backup1"), stub("backup2")
+    server.backup_connections = {backup1: 2, backup2: 3}
+    server.other_servers = {backup1: 2, backup2: 3}
+
+    # Three users schedule events at once
+    requests = [proto.Event(host="alyssa", starttime=i * 3600, duration=1, description=f"event {i}") for i in range(3)]
+    writers = [threading.Thread(target=server.schedule_public_event, args=(request, None)) for request in requests]
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join(timeout=5)
+    assert not any(writer.is_alive() for writer in writers)
+
+    # Each backup gets fewer batches than writes over a single stream, carrying every write and its log line
+    for name in ["backup1", "backup2"]:
+        assert server.log_shippers[backup1 if name == "backup1" else backup2].streams_opened == 1
+        assert len(batches[name]) < 3
+        operations = [operation for batch in batches[name] for operation in batch]
+        assert sorted(operation.method for operation in operations) == ["log_update"] * 3 + ["schedule_public_event"] * 3
+    backup1.schedule_public_event.assert_not_called()
+
+    # A backup applies the batches in order
+    backup = CalendarServicer()
+    for batch in batches["backup1"]:
+        assert backup.apply_batch(proto.Batch(operations=batch), None).text == "Done"
+    assert sorted(event.description for event in backup.public_events) == ["event 0", "event 1", "event 2"]
+
+    # Applying does not wait for the backup's own log copies, so a peer that never answers does not hold it up
+    backup = CalendarServicer()
+    backup.replication_batcher.send = lambda peer, operations: futures.Future()
+    backup.other_servers = {"other backup": 3}
+    applier = threading.Thread(target=lambda: [backup.apply_batch(proto.Batch(operations=batch), None) for batch in batches["backup1"]], daemon=True)
+    applier.start()
+    applier.join(timeout=1)
+    assert not applier.is_alive()
+    assert len(backup.public_events) == 3
+
+
+"""Testing that a log shipper keeps one stream open across batches and reopens it after the peer fails"""
+def test_log_shipper():
+    # Setting up mocks: the peer answers two batches on its first stream, then drops it
+    received = []
+    def ship_batches(request_iterator):
+        for batch in request_iterator:
+            received.append(batch)
+            if len(received) == 3:
+                raise ConnectionError("peer went down")
+            yield proto.Text(text=f"applied {len(received)}")
+    shipper = LogShipper(ship_batches)
+
+    assert shipper.send(proto.Batch()).result(timeout=5).text == "applied 1"
+    assert shipper.send(proto.Batch()).result(timeout=5).text == "applied 2"
+    assert shipper.streams_opened == 1
+
+    # A batch on a failed stream fails like a failed call, and the next batch opens a new stream
+    assert isinstance(shipper.send(proto.Batch()).exception(timeout=5), ConnectionError)
+    assert shipper.send(proto.Batch()).result(timeout=5).text == "applied 4"
+    assert shipper.streams_opened == 2
+    assert shipper.batches_shipped == 4
+
+    # A peer that takes a batch but never answers fails it after the timeout, and its stream is cancelled
+    class HungCall:
+        def __init__(self, request_iterator):
+            self.request_iterator = request_iterator
+            self.cancelled = threading.Event()
+        def __iter__(self):
+            next(self.request_iterator)
+            self.cancelled.wait()
+            return iter([])
+        def cancel(self):
+            self.cancelled.set()
+    calls = []
+    shipper = LogShipper(lambda request_iterator: calls.append(HungCall(request_iterator)) or calls[-1], timeout=0.05)
+    assert isinstance(shipper.send(proto.Batch()).exception(timeout=5), TimeoutError)
+    assert calls[0].cancelled.wait(timeout=5)
+    assert shipper.batches_timed_out == 1
+
+
+"""Testing when writers are released under each replication acknowledgment mode"""
+def test_replication_ack_modes():
+    # Setting up mocks: each peer's batch call is a future the test resolves by hand
+    sent = {}
+    def send(peer, operations):
+        sent[peer] = futures.Future()
+        return sent[peer]
+    def wait_until_sent(*peers):
+        for _ in range(200):
+            if all(peer in sent for peer in peers):
+                return
+            threading.Event().wait(0.01)
+
+    # Sync waits for every backup
+    sent.clear()
+    batcher = ReplicationBatcher(send, window=0, ack_mode=ACK_SYNC)
+    write = batcher.submit([("backup1", "op"), ("backup2", "op")])
+    wait_until_sent("backup1", "backup2")
+    sent["backup1"].set_result("Done")
+    assert not write.acknowledged.wait(timeout=0.1)
+    sent["backup2"].set_result("Done")
+    assert write.acknowledged.wait(timeout=1)
+    assert write.replicated
+
+    # Quorum needs one of two backups for a majority of three servers
+    sent.clear()
+    batcher = ReplicationBatcher(send, window=0, ack_mode=ACK_QUORUM)
+    write = batcher.submit([("backup1", "op"), ("backup2", "op")])
+    wait_until_sent("backup1", "backup2")
+    assert not write.acknowledged.wait(timeout=0.1)
+    sent["backup2"].set_result("Done")
+    assert write.acknowledged.wait(timeout=1)
+    assert write.replicated
+
+    # A backup that has not answered does not hold up the next batch
+    first = sent["backup2"]
+    write = batcher.submit([("backup1", "op"), ("backup2", "op")])
+    for _ in range(200):
+        if sent["backup2"] is not first:
+            break
+        threading.Event().wait(0.01)
+    sent["backup2"].set_result("Done")
+    assert write.acknowledged.wait(timeout=1)
+    sent["backup1"].set_exception(Exception("unavailable"))
+
+    # A quorum that cannot be reached still answers the write, but it is counted as unreplicated
+    sent.clear()
+    write = batcher.submit([("backup1", "op"), ("backup2", "op")])
+    wait_until_sent("backup1", "backup2")
+    sent["backup1"].set_exception(Exception("unavailable"))
+    sent["backup2"].set_exception(Exception("unavailable"))
+    assert write.acknowledged.wait(timeout=1)
+    assert not write.replicated
+    assert batcher.writes_unreplicated == 1
+
+    # Async answers right away, but only max_in_flight writes may run ahead of the backups. Submitting never
+    # blocks; the writer waits for room afterwards
+    sent.clear()
+    batcher = ReplicationBatcher(send, window=0, ack_mode=ACK_ASYNC, max_in_flight=1)
+    write = batcher.submit([("backup1", "op")])
+    assert write.acknowledged.is_set()
+    batcher.wait(write)
+    wait_until_sent("backup1")
+    write = batcher.submit([("backup1", "op")])
+    second = threading.Thread(target=batcher.wait, args=(write,))
+    second.start()
+    second.join(timeout=0.1)
+    assert second.is_alive()
+    sent["backup1"].set_result("Done")
+    second.join(timeout=1)
+    assert not second.is_alive()
+
+    # A writer waiting for room holds no lock, so searches go on meanwhile
+    leader = CalendarServicer(ack_mode=ACK_ASYNC, max_in_flight=1)
+    leader.is_leader = True
+    leader.replication_batcher.send = lambda peer, operations: futures.Future()
+    leader.other_servers = {"backup": 2}
+    leader.schedule_public_event(proto.Event(host="alyssa", starttime=3600, duration=1, description="first"), None)
+    second = threading.Thread(target=leader.schedule_public_event, args=(proto.Event(host="alyssa", starttime=7200, duration=1, description="second"), None), daemon=True)
+    second.start()
+    second.join(timeout=0.1)
+    assert second.is_alive()
+    found = []
+    search = threading.Thread(target=lambda: found.extend(leader.search_events(proto.Search(function=SEARCH_HOST, value="alyssa"), None)), daemon=True)
+    search.start()
+    search.join(timeout=1)
+    assert [event.description for event in found] == ["first", "second"]
+
+
+"""Testing that writes are numbered and a lagging backup catches up on exactly the operations after its LSN"""
+def test_lsn_catch_up(tmp_path):
+    lines = ["1: Registration successful!: alyssa\n", "2: Registration successful!: dale\n", "3: Logout successful.: dale\n",
+             "4: Public event scheduled.: alyssa: 3600: 1: lunch\n", "5: Logout successful.: alyssa\n"]
+    server = CalendarServicer(id=str(tmp_path / "leader"))
+    with open(tmp_path / "leader.log", "w") as log:
+        log.writelines(lines)
+    server.applied_lsn = 5
+
+    # Setting up mocks: the backup has applied the first three operations
+    backup = CalendarServicer()
+    for line in lines[:3]:
+        backup.process_line(line)
+    assert backup.applied_lsn == 3
+    stub = MagicMock()
+    stub.get_applied_lsn.side_effect = lambda request: backup.get_applied_lsn(request, None)
+    stub.replay_log.side_effect = lambda request: backup.replay_log(request, None)
+    server.backup_connections = {stub: "backup"}
+
+    # Only the missing suffix is sent
+    server.sync_backups()
+    assert list(stub.replay_log.call_args.args[0].lines) == lines[3:]
+    assert backup.applied_lsn == 5
+    assert [event.description for event in backup.public_events] == ["lunch"]
+    assert len(backup.active_accounts) == 0
+
+    # Replaying operations that were already applied changes nothing
+    backup.process_line(lines[3])
+    assert len(backup.public_events) == 1
+
+    # New writes get the next LSN, and batches skip operations already applied
+    backup.register_user(MagicMock(text="maegan"), None)
+    assert backup.applied_lsn == 6
+    duplicate = proto.Operation(method="register_user", text=proto.Text(text="bob"), lsn=6)
+    backup.apply_batch(proto.Batch(operations=[duplicate]), None)
+    assert "bob" not in backup.accounts
+
+
+"""Testing that a backup that missed a batch applies nothing past the gap until the leader catches it up"""
+def test_lost_batch():
+    operations = [proto.Operation(method="register_user", text=proto.Text(text=username), lsn=lsn)
+                  for lsn, username in [(1, "alyssa"), (2, "dale"), (3, "maegan")]]
+    backup = CalendarServicer()
+    assert backup.apply_batch(proto.Batch(operations=operations[:1]), None).text == "Done"
+
+    # The batch with LSN 2 is lost, so LSN 3 is refused and the backup reports how far it got
+    response = backup.apply_batch(proto.Batch(operations=operations[2:]), None)
+    assert response.text == REPLICA_BEHIND
+    assert response.lsn == backup.get_applied_lsn(proto.Empty(), None).lsn == 1
+    assert "maegan" not in backup.accounts
+
+    # The leader treats the answer as a failure and stops sending the backup writes until it is caught up
+    leader = CalendarServicer()
+    leader.peer_breaker.probe_interval = 60
+    shipped = futures.Future()
+    shipped.set_result(response)
+    shipper = MagicMock()
+    shipper.send.return_value = shipped
+    with patch.object(leader, "log_shipper", return_value=shipper):
+        assert leader.ship("backup", operations[2:]).exception(timeout=5) is not None
+    assert not leader.peer_breaker.is_up("backup")
+
+    # Catching up replays the missing operation and the refused one, in order
+    backup.replay_log(proto.LogLines(lines=["2: Registration successful!: dale\n", "3: Registration successful!: maegan\n"]), None)
+    assert backup.applied_lsn == 3
+    assert list(backup.accounts) == ["alyssa", "dale", "maegan"]
+
+
+"""Testing that concurrent event writes are numbered in the order they commit, so backups assign the same ids"""
+def test_event_write_order(tmp_path):
+    leader = CalendarServicer(id=str(tmp_path / "leader"))
+    leader.setup_logger(leader.id, str(tmp_path / "leader.log"))
+
+    # Setting up mocks: the first writer is slow to notify subscribers after scheduling its event
+    slow = threading.Event()
+    def notify_all(except_username):
+        if not slow.is_set():
+            slow.set()
+            threading.Event().wait(0.2)
+    leader.subscriptions.notify_all = notify_all
+    first = threading.Thread(target=leader.schedule_public_event, args=(proto.Event(host="alyssa", starttime=3600, duration=1, description="first"), None))
+    first.start()
+    assert slow.wait(timeout=5)
+    leader.schedule_public_event(proto.Event(host="dale", starttime=7200, duration=1, description="second"), None)
+    first.join(timeout=5)
+
+    # A registration is numbered before an invitation of the new user, even if it is slow to log
+    leader.register_user(proto.Text(text="alyssa"), None)
+    submit_log = leader.submit_log
+    registering = threading.Event()
+    def slow_submit_log(text, replication=()):
+        if text == REGISTRATION_SUCCESSFUL + SEPARATOR + "maegan":
+            registering.set()
+            threading.Event().wait(0.2)
+        return submit_log(text, replication)
+    with patch.object(leader, "submit_log", side_effect=slow_submit_log):
+        register = threading.Thread(target=leader.register_user, args=(proto.Text(text="maegan"), None))
+        register.start()
+        assert registering.wait(timeout=5)
+        leader.schedule_private_event(proto.Event(host="alyssa", starttime=10800, duration=1, description="invite", guestlist="maegan"), None)
+        register.join(timeout=5)
+
+    backup = CalendarServicer()
+    with open(tmp_path / "leader.log") as log:
+        for line in log:
+            backup.process_line(line)
+    assert [(event.id, event.description) for event in backup.public_events] == [(event.id, event.description) for event in leader.public_events] == [(1, "first"), (2, "second")]
+    assert [(event.id, event.description) for event in backup.private_events] == [(event.id, event.description) for event in leader.private_events] == [(3, "invite")]
+    assert backup.next_event_id == leader.next_event_id == 4
+
+
+"""Testing that a backup that stops hearing heartbeats wins an election only with a majority and an up-to-date log"""
+def test_leader_election():
+    # Votes: once per term, only for candidates that have applied our LSN, and a later term resets the vote
+    election = Election(3)
+    assert election.vote(2, 2, candidate_lsn=5, lsn=5)
+    assert not election.vote(2, 1, candidate_lsn=9, lsn=5)
+    assert not election.vote(3, 1, candidate_lsn=4, lsn=5)
+    assert election.vote(3, 1, candidate_lsn=5, lsn=5)
+    assert not election.observe(2, 2)
+    assert election.observe(3, 1) and election.leader_id == 1
+
+    # Setting up mocks: server 1 is down, servers 2 and 3 call each other directly
+    def stub(target):
+        replica = MagicMock()
+        for method in ["heartbeat", "request_vote"]:
+            def call(request, timeout=None, method=method):
+                future = futures.Future()
+                if target is None:
+                    future.set_exception(Exception("unavailable"))
+                else:
+                    future.set_result(getattr(target, method)(request, None))
+                return future
+            getattr(replica, method).future.side_effect = call
+        return replica
+    server2, server3 = CalendarServicer(id=2), CalendarServicer(id=3)
+    server2.other_servers = {stub(None): 1, stub(server3): 3}
+    server3.other_servers = {stub(None): 1, stub(server2): 2}
+    for server in [server2, server3]:
+        server.election.bootstrap(leader_id=1)
+    server2.applied_lsn = 7
+    server3.applied_lsn = 6
+
+    # Server 3 is missing a write, so server 2 refuses to vote for it
+    with patch.object(server3, "sync_backups"):
+        assert not server3.run_election()
+    assert not server3.is_leader
+
+    # Server 2 wins with server 3's vote, catches the others up and becomes the leader everyone reports
+    heard_during_sync = []
+    def sync_backups():
+        heard = server3.leader_heard
+        threading.Event().wait(0.3)
+        heard_during_sync.append(server3.leader_heard != heard)
+    with patch.object(server2, "sync_backups", side_effect=sync_backups), patch("server.HEARTBEAT_INTERVAL_SECONDS", 0.05):
+        threading.Thread(target=server2.run_heartbeat_timer, daemon=True).start()
+        assert server2.run_election()
+    # Heartbeats continue while the new leader catches the others up, so they do not start another election
+    assert heard_during_sync == [True]
+    assert server2.is_leader
+    assert len(server2.backup_connections) == 2
+    assert server3.get_leader(proto.Empty(), None).address == f"{SERVER2}:{PORT2}"
+    assert server3.get_leader(proto.Empty(), None).term == server2.election.term == 3
+
+    # A leader that hears from a later term steps down
+    server3.election.start_candidacy()
+    server2.send_heartbeats()
+    assert not server2.is_leader
+
+
+"""Testing that replication is fenced by term, so a replaced leader cannot get its writes applied or acknowledged"""
+def test_term_fencing():
+    # Setting up mocks: server 7 led term 1, server 8 follows the leader elected in term 2
+    old_leader, backup = CalendarServicer(id=7), CalendarServicer(id=8)
+    old_leader.election.bootstrap(leader_id=7)
+    old_leader.is_leader = True
+    old_leader.backup_connections = {"backup": 8}
+    backup.election.bootstrap(leader_id=9, term=2)
+    submitted = []
+    def submit(entries):
+        submitted.extend(entries)
+        write = PendingWrite(entries)
+        write.acknowledged.set()
+        return write
+
+    # The old leader still numbers its writes in the term it led
+    with patch.object(old_leader.replication_batcher, "submit", side_effect=submit):
+        old_leader.register_user(proto.Text(text="alyssa"), None)
+    operations = [operation for peer, operation in submitted if peer == "backup"]
+    assert [(operation.lsn, operation.term) for operation in operations] == [(1, 1)]
+
+    # The backup refuses them and answers with its term
+    response = backup.apply_batch(proto.Batch(operations=operations), None)
+    assert response.text == STALE_TERM
+    assert response.term == 2
+    assert "alyssa" not in backup.accounts
+    assert backup.applied_lsn == 0
+
+    # The old leader steps down on the refusal, which fails the write without marking the backup down
+    shipped = futures.Future()
+    shipped.set_result(response)
+    shipper = MagicMock()
+    shipper.send.return_value = shipped
+    with patch.object(old_leader, "log_shipper", return_value=shipper):
+        assert old_leader.ship("backup", operations).exception(timeout=5) is not None
+    assert not old_leader.is_leader
+    assert old_leader.election.term == 2
+    assert old_leader.peer_breaker.is_up("backup")
+
+    # The new leader's writes are applied
+    operation = proto.Operation(method="register_user", text=proto.Text(text="dale"), lsn=1, term=2)
+    assert backup.apply_batch(proto.Batch(operations=[operation]), None).text == "Done"
+    assert "dale" in backup.accounts
+
+    # A server that does not lead refuses client writes, so the client retries on the leader
+    context = MagicMock()
+    assert old_leader.register_user(proto.Text(text="maegan"), context).text == NOT_LEADER
+    context.abort.assert_called_once()
+    assert "maegan" not in old_leader.accounts
+
+
+"""Testing that a backup holding a replaced leader's writes is found by term and LSN and brought up from a snapshot"""
+def test_diverged_backup(tmp_path):
+    # Setting up mocks: the leader of term 2 applied one write, the backup applied two from the leader of term 1
+    leader = CalendarServicer(id=str(tmp_path / "leader"))
+    leader.setup_logger(leader.id, str(tmp_path / "leader.log"))
+    leader.election.bootstrap(leader_id=leader.id, term=2)
+    leader.register_user(proto.Text(text="dale"), None)
+    backup = CalendarServicer()
+    backup.election.bootstrap(leader_id=leader.id, term=2)
+    for lsn, username in [(1, "alyssa"), (2, "bob")]:
+        backup.apply_with_lsn(lsn, lambda: backup.register_user(proto.Text(text=username), None), term=1)
+    assert leader.get_applied_lsn(proto.Empty(), None).term == 2
+    assert backup.get_applied_lsn(proto.Empty(), None).term == 1
+
+    # The new leader's write at an LSN the backup already applied in another term is refused, not skipped
+    operation = proto.Operation(method="register_user", text=proto.Text(text="maegan"), lsn=2, term=2)
+    response = backup.apply_batch(proto.Batch(operations=[operation]), None)
+    assert response.text == REPLICA_BEHIND
+    assert "maegan" not in backup.accounts
+
+    # A backup past our LSN is sent a snapshot that replaces the old leader's writes
+    stub = MagicMock()
+    stub.get_applied_lsn.side_effect = lambda request: backup.get_applied_lsn(request, None)
+    stub.install_state.side_effect = lambda request_iterator: backup.install_state(request_iterator, None)
+    with patch.object(backup, "member_logger"):
+        assert leader.sync_backup(stub, leader.log_index(f"{leader.id}.log"))
+    assert list(backup.accounts) == ["dale"]
+    assert (backup.applied_lsn, backup.applied_term) == (1, 2)
+    stub.replay_log.assert_not_called()
+
+    # So is a backup at our LSN whose write there was from another term
+    backup.applied_term = 1
+    stub.install_state.reset_mock()
+    with patch.object(backup, "member_logger"):
+        assert leader.sync_backup(stub, leader.log_index(f"{leader.id}.log"))
+    stub.install_state.assert_called_once()
+    assert list(backup.accounts) == ["dale"]
+
+    # Catching up fails while the backup stops short of the lines sent, so it is not attached
+    leader.register_user(proto.Text(text="maegan"), None)
+    stub.replay_log.return_value = proto.Position(lsn=1)
+    assert not leader.sync_backup(stub, leader.log_index(f"{leader.id}.log"))
+    stub.replay_log.side_effect = lambda request: backup.replay_log(request, None)
+    assert leader.sync_backup(stub, leader.log_index(f"{leader.id}.log"))
+    assert list(backup.accounts) == ["dale", "maegan"]
+
+
+"""Testing that a backup answers reads only once it has applied the reader's writes and is within the staleness bound"""
+def test_bounded_staleness_reads():
+    server = CalendarServicer()
+    for event in range(3):
+        server.add_event(Event(id=event, host="alyssa", starttime=event * 3600, duration=1, description="lunch", guestlist=""), public=True)
+
+    # Setting up the backup's view of the leader from its last heartbeat
+    server.election_timer = MagicMock()
+    server.applied_lsn = 5
+    server.heartbeat(proto.Heartbeat(term=1, leader_id=1, lsn=9), None)
+
+    with patch("server.READ_WAIT_SECONDS", 0.05):
+        # Four operations behind the leader
+        request = proto.Search(function=SEARCH_ALL_EVENTS, max_lag=2)
+        assert [event.returntext for event in server.search_events(request, None)] == [REPLICA_BEHIND]
+        request = proto.Search(function=SEARCH_ALL_EVENTS, max_lag=4)
+        assert len(list(server.search_events(request, None))) == 3
+
+        # Missing the reader's own write
+        assert server.check_user_exists(proto.Text(text="alyssa", min_lsn=6), None).text == REPLICA_BEHIND
+
+    # The backup waits for a write it is about to apply
+    threading.Timer(0.05, lambda: setattr(server, "applied_lsn", 6)).start()
+    assert server.check_user_exists(proto.Text(text="alyssa", min_lsn=6), None).text == USER_DOES_NOT_EXIST
+
+    # The leader is always current
+    server.is_leader = True
+    assert server.check_user_exists(proto.Text(text="alyssa", min_lsn=100), None).text == USER_DOES_NOT_EXIST
+
+
+"""Testing that a far-behind backup is brought up from a chunked state snapshot and the log lines after it"""
+def test_state_transfer(tmp_path):
+    leader = CalendarServicer(id=str(tmp_path / "leader"))
+    leader.setup_logger(leader.id, str(tmp_path / "leader.log"))
+    for username in ["alyssa", "dale", "maegan"]:
+        leader.register_user(proto.Text(text=username), None)
+    leader.logout(proto.Text(text="dale"), None)
+    leader.schedule_public_event(proto.Event(host="alyssa", starttime=3600, duration=1, description="lunch"), None)
+    leader.schedule_private_event(proto.Event(host="alyssa", starttime=7200, duration=1, description="dinner", guestlist="dale"), None)
+    leader.membership.add(Member(4, "localhost", 50054, voter=False))
+    leader.membership.remove(3)
+
+    # Setting up mocks: the backup has applied nothing and still knows server 3
+    backup = CalendarServicer()
+    backup.member_connections[3] = MagicMock()
+    stub = MagicMock()
+    stub.get_applied_lsn.side_effect = lambda request: backup.get_applied_lsn(request, None)
+    chunks = []
+    stub.install_state.side_effect = lambda request_iterator: backup.install_state((chunks.append(chunk) or chunk for chunk in request_iterator), None)
+    stub.replay_log.side_effect = lambda request: backup.replay_log(request, None)
+    leader.backup_connections = {stub: "backup"}
+
+    # The snapshot is streamed in several chunks, then the lines logged after it are replayed
+    with patch("server.STATE_CHUNK_BYTES", 64), patch("server.SNAPSHOT_THRESHOLD_LSNS", 2):
+        data = leader.capture_state()
+        leader.schedule_public_event(proto.Event(host="maegan", starttime=10800, duration=1, description="coffee"), None)
+        with patch.object(leader, "capture_state", return_value=data), patch.object(backup, "member_logger"):
+            leader.sync_backups()
+    assert len(chunks) == (len(data) + 63) // 64 > 1
+    with open(tmp_path / "leader.log") as log:
+        assert list(stub.replay_log.call_args.args[0].lines) == log.readlines()[-1:]
+
+    assert backup.applied_lsn == leader.applied_lsn == 7
+    assert list(backup.accounts) == list(leader.accounts)
+    assert backup.active_accounts == leader.active_accounts
+    assert [(event.id, event.description) for event in backup.public_events] == [(1, "lunch"), (3, "coffee")]
+    assert [(event.id, event.guestlist) for event in backup.private_events] == [(2, "dale")]
+    assert backup.private_mappings == leader.private_mappings
+    assert backup.next_event_id == leader.next_event_id == 4
+    # Member changes before the snapshot are in it too
+    assert [(member.id, member.voter) for member in backup.membership] == [(1, True), (2, True), (4, False)]
+    assert sorted(backup.member_connections) == [1, 2, 4]
+    assert [event.description for event in backup.new_event_notifications.pending("dale")] == ["lunch", "dinner", "coffee"]
+    assert [event.id for event in backup.find_events(SEARCH_HOST, "alyssa")] == [1, 2]
+
+    # A server brought up from the snapshot has no log before it, so it sends a backup behind it the snapshot too
+    joined = CalendarServicer(id=str(tmp_path / "joined"))
+    other = CalendarServicer()
+    stub.get_applied_lsn.side_effect = lambda request: other.get_applied_lsn(request, None)
+    stub.install_state.side_effect = lambda request_iterator: other.install_state(request_iterator, None)
+    with patch.object(joined, "member_logger"), patch.object(other, "member_logger"):
+        joined.install_state([proto.StateChunk(data=data)], None)
+        assert joined.sync_backup(stub, joined.log_index(f"{joined.id}.log"))
+    assert other.applied_lsn == joined.applied_lsn == 6
+    assert list(other.accounts) == ["alyssa", "dale", "maegan"]
+
+
+"""Testing that cluster members come from the cluster file and member changes are logged and replayed"""
+def test_cluster_membership(tmp_path):
+    path = tmp_path / "cluster.txt"
+    path.write_text("# id host port\n1 localhost 50051\n2 localhost 50052\n\n4 localhost 50054 reader\n")
+    membership = Membership(load_members(str(path)))
+    assert [(member.id, member.address(), member.voter) for member in membership] == [
+        (1, "localhost:50051", True), (2, "localhost:50052", True), (4, "localhost:50054", False)]
+    assert membership.majority() == 2
+    assert membership.first_leader() == 1
+    # Without the file the members are REPLICA_IDS
+    assert [member.id for member in load_members(str(tmp_path / "missing.txt"))] == [1, 2, 3]
+
+    # Read replicas do not count towards a quorum
+    batcher = ReplicationBatcher(MagicMock(), ack_mode=ACK_QUORUM, is_voter=lambda peer: peer != "reader")
+    write = PendingWrite([(peer, None) for peer in ["backup1", "backup2", "reader"]])
+    write.acked_peers = {"reader"}
+    assert batcher.required_acks(write) == 1
+    assert batcher.acks(write) == 0
+
+    # The quorum is a majority of all the voters, however few backups a write reached
+    batcher = ReplicationBatcher(MagicMock(), ack_mode=ACK_QUORUM, voter_count=lambda: 5)
+    assert batcher.required_acks(PendingWrite([("backup1", None)])) == 2
+    assert not batcher.submit([]).replicated
+
+    # A backup applies a member change, logging it so other servers replay it
+    server = CalendarServicer(id=str(tmp_path / "backup"))
+    server.setup_logger(server.id, str(tmp_path / "backup.log"))
+    with patch.object(server, "member_logger"):
+        response = server.add_member(proto.Member(id=4, host="localhost", port=50054, voter=False), None)
+    assert response.text == MEMBER_ADDED
+    assert response.lsn == server.applied_lsn
+    assert 4 in server.membership and not server.membership.is_voter(4)
+    assert server.other_servers[server.member_connections[4]] == 4
+    assert server.membership.majority() == 2
+
+    other = CalendarServicer()
+    with open(tmp_path / "backup.log") as log, patch.object(other, "member_logger"):
+        other.process_line(log.readlines()[-1])
+    assert other.membership.get(4).address() == "localhost:50054"
+    assert not other.membership.is_voter(4)
+
+    # Removing the member disconnects from it
+    assert server.remove_member(proto.Member(id=4), None).text == MEMBER_REMOVED
+    assert 4 not in server.membership
+    assert server.member_connections == {}
+    assert server.other_servers == {}
+
+    # Only the leader adds servers
+    assert len(server.join_cluster(proto.Member(id=5, host="localhost", port=50055), None).members) == 0
+
+    # A server the leader could not catch up is not left connected
+    server.is_leader = True
+    with patch.object(server, "member_logger"), patch.object(server, "catch_up", return_value=False):
+        assert len(server.join_cluster(proto.Member(id=5, host="localhost", port=50055), None).members) == 0
+    assert 5 not in server.membership
+    assert server.member_connections == {}
+    assert server.other_servers == {}
+    server.is_leader = False
+
+    # A server joining with an id no cluster file lists still writes its own log
+    joiner = CalendarServicer(id=5)
+    with patch.object(joiner.channels, "stub") as stub, patch.object(joiner, "member_logger") as member_logger, patch.object(joiner, "start_election_timer"):
+        stub.return_value.get_leader.return_value = proto.Leader(term=1, leader_id=1, address="localhost:50051")
+        stub.return_value.join_cluster.return_value = proto.Members(members=[proto.Member(id=1, host="localhost", port=50051, voter=True),
+                                                                             proto.Member(id=5, host="localhost", port=50055)], leader_id=1, term=1)
+        joiner.join_cluster_through("localhost:50051")
+    assert [call.args[0] for call in member_logger.call_args_list] == [5, 1]
+    assert server.leave_cluster(proto.Member(id=2), None).text == ACTION_UNSUCCESSFUL
+
+
+"""Testing that writes skip a backup that keeps failing until it answers a probe and is caught up"""
+def test_circuit_breaker():
+    # Setting up mocks: the probe fails once, then the backup answers
+    probe = MagicMock(side_effect=[Exception("unavailable"), None])
+    recovered = threading.Event()
+    breaker = CircuitBreaker(probe, lambda peer: (breaker.reset(peer), recovered.set()), failures_to_trip=2, probe_interval=0.01)
+    breaker.record("backup", False)
+    breaker.record("backup", True)
+    breaker.record("backup", False)
+    assert breaker.is_up("backup")
+    breaker.record("backup", False)
+    assert not breaker.is_up("backup")
+    assert breaker.trips == 1
+
+    # Late answers to calls sent before the trip do not reopen the breaker
+    breaker.record("backup", True)
+    assert not breaker.is_up("backup")
+    assert recovered.wait(timeout=5)
+    assert probe.call_count == 2
+    assert breaker.is_up("backup")
+    assert breaker.recoveries == 1
+
+    # A leader fails writes to the backup that is down without calling it, for both replication and log copies
+    server = CalendarServicer(ack_mode=ACK_QUORUM)
+    server.is_leader = True
+    backup = MagicMock()
+    server.backup_connections = {backup: 2}
+    server.other_servers = {backup: 2}
+    server.peer_breaker.probe_interval = 60
+    for failure in range(FAILURES_TO_TRIP):
+        server.peer_breaker.record(backup, False)
+    assert server.register_user(proto.Text(text="alyssa"), None).text == LOGIN_SUCCESSFUL
+    backup.ship_batches.assert_not_called()
+
+    # The skipped backup counts against the quorum of all voters, so the write is not counted as replicated
+    assert server.replication_batcher.writes_unreplicated == 1
+    assert server.replication_batcher.required_acks(PendingWrite([])) == 1
+
+    # Once it answers, the backup gets the writes it missed before rejoining the write path
+    with patch.object(server, "sync_backup", return_value=True) as sync_backup:
+        server.recover_peer(backup)
+    assert sync_backup.call_count == 2
+    assert server.peer_breaker.is_up(backup)
+
+
+"""Testing that log tails are read from the nearest checkpoint and the index only reads appended lines"""
+def test_log_index(tmp_path):
+    path = tmp_path / "1.log"
+    with open(path, "w") as log:
+        log.writelines(f"{lsn}: Login successful!: user{lsn}\n" for lsn in range(1, 201))
+    index = LogIndex(str(path))
+    assert index.count_lines() == 200
+    assert index.numbered()
+
+    # The tail after an LSN starts from a checkpoint near it, not from the start of the file
+    with patch.object(index, "read_from", wraps=index.read_from) as read_from:
+        lines = list(index.lines_after_lsn(150))
+        assert read_from.call_args.args[0] > 0
+    assert lines == [f"{lsn}: Login successful!: user{lsn}\n" for lsn in range(151, 201)]
+    assert list(index.lines_from(198)) == ["199: Login successful!: user199\n", "200: Login successful!: user200\n"]
+
+    # Appended lines are indexed incrementally; a line still being written waits for its newline
+    indexed = index.offset
+    with open(path, "a") as log:
+        log.write("201: Logout successful.: user1\n202: Logout")
+    assert index.count_lines() == 201
+    assert index.offset == indexed + len("201: Logout successful.: user1\n")
+    assert list(index.lines_after_lsn(200)) == ["201: Logout successful.: user1\n"]
+
+    # Files written before LSNs are recognised so the line-count sync can be used
+    legacy = tmp_path / "2.log"
+    legacy.write_text("Registration successful!: alyssa\nLogout successful.: alyssa\n")
+    assert not LogIndex(str(legacy)).numbered()
+    assert LogIndex(str(legacy)).first_lsn() is None
+    assert index.first_lsn() == 1
+
+    # A log that was never written has no lines
+    missing = LogIndex(str(tmp_path / "4.log"))
+    assert missing.count_lines() == 0
+    assert list(missing.lines_after_lsn(0)) == []
+
+
 # Testing account-specific functions
 
 """Testing login flow"""
@@ -68,18 +771,18 @@ def test_login_flow():
     proto.Text.assert_called_with(text="Username does not exist.")
 
     # Test user already logged in
-    server.accounts.append("dale")
-    server.active_accounts.append("dale")
+    server.accounts.add("dale")
+    server.active_accounts.add("dale")
 
     server.login_user(request, None)
     proto.Text.assert_called_with(text="User is already logged in.")
 
     # Test successful login
-    server.active_accounts = []
+    server.active_accounts = set()
     assert len(server.accounts) == 1
 
     server.login_user(request, None)
-    proto.Text.assert_called_with(text=LOGIN_SUCCESSFUL)
+    proto.Text.assert_called_with(text=LOGIN_SUCCESSFUL, lsn=server.applied_lsn)
 
 
 """Testing registration flow"""
@@ -92,24 +795,24 @@ def test_registration_flow():
     request.text = "dale"
 
     # Test username already exists
-    server.accounts.append("dale")
+    server.accounts.add("dale")
     assert len(server.accounts) == 1
 
     server.register_user(request, None)
     proto.Text.assert_called_with(text="Username already exists.")
 
     # Test successful login
-    server.accounts = []
+    server.accounts = AccountRegistry()
 
     server.register_user(request, None)
     assert len(server.accounts) == 1
-    assert server.accounts[0] == "dale"
+    assert list(server.accounts) == ["dale"]
     
     assert "dale" in server.active_accounts
     assert "dale" in server.new_event_notifications
     assert "dale" in server.private_mappings
 
-    proto.Text.assert_called_with(text=LOGIN_SUCCESSFUL)
+    proto.Text.assert_called_with(text=LOGIN_SUCCESSFUL, lsn=server.applied_lsn)
 
 
 """Testing checking user exists flow"""
@@ -127,7 +830,7 @@ def test_check_user_exists_flow():
     proto.Text.assert_called_with(text=USER_DOES_NOT_EXIST)
 
     # Test successful find
-    server.accounts.append("dale")
+    server.accounts.add("dale")
     server.check_user_exists(request, None)
     proto.Text.assert_called_with(text="User exists.")
 
@@ -142,12 +845,13 @@ def test_delete_account_flow():
     request.text = "dale"
 
     # Test delete account
-    server.accounts.append("dale")
-    server.active_accounts.append("dale")
-    server.new_event_notifications["dale"] = ["new event"]
+    server.accounts.add("dale")
+    server.active_accounts.add("dale")
+    server.new_event_notifications.register("dale")
     server.private_mappings["dale"] = ["event_id"]
-    server.public_events = [Event(host="dale")]
-    server.private_events = [Event(host="dale", guestlist="bob"), Event(host="alyssa", guestlist="dale"), Event(host="alyssa", guestlist="dale, bob")]
+    server.public_events = [Event(id=1, host="dale", starttime=0, duration=1)]
+    server.private_events = [Event(id=2, host="dale", starttime=3600, duration=1, guestlist="bob"), Event(id=3, host="alyssa", starttime=7200, duration=1, guestlist="dale"), Event(id=4, host="alyssa", starttime=10800, duration=1, guestlist="dale, bob"),
+                             Event(id=5, host="bob", starttime=14400, duration=1, guestlist="alyssa")]
 
     server.delete_account(request, None)
 
@@ -158,11 +862,143 @@ def test_delete_account_flow():
 
     # Tests 1) that all events with the account as host are removed, 2) that the account is removed from all guestlists,
     #       3) that if the account removal results in an event with no guests, that event is removed
+    #       4) that private events the account is not part of are kept
     assert len(server.public_events) == 0
-    assert len(server.private_events) == 1
+    assert len(server.private_events) == 2
     assert server.private_events[0].guestlist == "bob"
+    assert server.private_events[1].host == "bob"
+
+    proto.Text.assert_called_with(text=DELETION_SUCCESSFUL, lsn=server.applied_lsn)
+
 
-    proto.Text.assert_called_with(text=DELETION_SUCCESSFUL)
+"""Testing account display queries answered by the account registry"""
+def test_display_accounts():
+    server = CalendarServicer()
+
+    # Setting up mocks
+    proto.Text=MagicMock(side_effect=lambda text: text)
+    request = MagicMock(page_size=0, page_token="")
+    server.accounts = AccountRegistry(["dale", "alyssa", "dallen", "aly"])
+
+    # Empty pattern lists every account in registration order
+    request.text = ""
+    assert list(server.display_accounts(request, None)) == ["dale", "alyssa", "dallen", "aly"]
+
+    # Anchored prefix and exact patterns come from the sorted index
+    request.text = "^da"
+    with patch.object(server.regex_guard, "filter") as search:
+        assert list(server.display_accounts(request, None)) == ["dale", "dallen"]
+        request.text = "^aly$"
+        assert list(server.display_accounts(request, None)) == ["aly"]
+        search.assert_not_called()
+
+    # Other regular expressions are still supported
+    request.text = "l+en$"
+    assert list(server.display_accounts(request, None)) == ["dallen"]
+    request.text = "^bob"
+    assert list(server.display_accounts(request, None)) == ["No user matches this!"]
+
+    # The index follows account deletion
+    server.accounts.remove("dallen")
+    request.text = "^da"
+    assert list(server.display_accounts(request, None)) == ["dale"]
+
+
+"""Testing cached patterns and the time budget on regular expression searches"""
+def test_regex_guard():
+    server = CalendarServicer()
+
+    # Setting up mocks
+    proto.Text=MagicMock(side_effect=lambda text: text)
+    request = MagicMock(page_size=0, page_token="")
+    server.accounts = AccountRegistry(["dale", "alyssa", "dallen"])
+
+    # Repeated patterns are compiled once, even after a registration invalidates cached results
+    request.text = "l+en$"
+    assert list(server.display_accounts(request, None)) == ["dallen"]
+    server.accounts.add("allen")
+    assert list(server.display_accounts(request, None)) == ["dallen", "allen"]
+    assert server.regex_guard.patterns.misses == 1
+    assert server.regex_guard.patterns.hits == 1
+
+    # Invalid patterns are reported instead of failing the stream
+    request.text = "da("
+    assert list(server.display_accounts(request, None)) == [INVALID_PATTERN]
+
+    # A pattern that nests quantifiers is refused before it runs, and is not cached
+    server.public_events = [Event(id=i, host="alyssa", starttime=i * 3600, duration=1, description="a" * 18 + "b", guestlist="") for i in range(1, 50)]
+    request.function = SEARCH_DESCRIPTION
+    request.value = "(a+)+$"
+    assert [result.returntext for result in server.search_events(request, None)] == [SEARCH_TOO_EXPENSIVE]
+    assert "(a+)+$" not in server.regex_guard.patterns.patterns
+
+    # A search gives up once it runs over the budget
+    guard = RegexGuard(workers=1, budget=0.01)
+    release = threading.Event()
+    blocking = lambda row: release.wait(5) and row
+    try:
+        guard.filter("a", ["a"], key=blocking)
+        assert False
+    except SearchBudgetExceeded:
+        pass
+    assert guard.stuck == 1
+
+    # Once every worker is stuck past its deadline, searches are refused instead of queueing behind it
+    try:
+        guard.filter("a", ["a"])
+        assert False
+    except SearchBudgetExceeded:
+        pass
+    assert guard.searches_refused == 1
+
+    # The worker takes searches again once its match returns
+    release.set()
+    while guard.stuck > 0:
+        time.sleep(0.01)
+    assert guard.filter("a", ["a", "b"]) == ["a"]
+
+
+"""Testing that repeated searches and listings are served from the result cache until a write"""
+def test_result_cache():
+    server = CalendarServicer()
+
+    # Setting up mocks
+    proto.Text=MagicMock(side_effect=lambda text, lsn=0: text)
+    request = MagicMock(page_size=0, page_token="")
+    server.public_events = [Event(id=1, host="alyssa", starttime=3600, duration=1, description="lunch", guestlist=""),
+                            Event(id=2, host="maegan", starttime=7200, duration=1, description="dinner", guestlist="")]
+
+    # Test a repeated search is a hit and does not touch the indexes
+    request.function = SEARCH_HOST
+    request.value = "alyssa"
+    assert [result.id for result in server.search_events(request, None)] == [1]
+    with patch.object(server, "find_events") as find_events:
+        assert [result.id for result in server.search_events(request, None)] == [1]
+        find_events.assert_not_called()
+    assert server.search_cache.hits == 1
+    assert server.search_cache.misses == 1
+
+    # Test a write invalidates cached results
+    server.delete_event(MagicMock(id=1), None)
+    assert [result.returntext for result in server.search_events(request, None)] == [NO_MATCH]
+    assert server.search_cache.misses == 2
+
+    # Test account listings follow registrations and deletions
+    server.accounts = AccountRegistry(["dale", "dallen"])
+    request.text = "^da"
+    assert list(server.display_accounts(request, None)) == ["dale", "dallen"]
+    assert list(server.display_accounts(request, None)) == ["dale", "dallen"]
+    assert server.account_cache.hits == 1
+    server.accounts.remove("dallen")
+    assert list(server.display_accounts(request, None)) == ["dale"]
+
+    # Test the cache stays within its size bound
+    server.search_cache.max_queries = 2
+    request.function = SEARCH_KEYWORD
+    for keyword in ["lunch", "dinner", "breakfast"]:
+        request.value = keyword
+        list(server.search_events(request, None))
+    assert len(server.search_cache) == 2
 
 
 """Testing logout flow"""
@@ -174,9 +1010,9 @@ def test_logout_flow():
     request = MagicMock()
     request.text = "dale"
 
-    server.accounts.append("dale")
-    server.active_accounts.append("dale")
-    server.new_event_notifications["dale"] = ["new event"]
+    server.accounts.add("dale")
+    server.active_accounts.add("dale")
+    server.new_event_notifications.register("dale")
     server.private_mappings["dale"] = ["event_id"]
 
     server.logout(request, None)
@@ -187,11 +1023,149 @@ def test_logout_flow():
     assert "dale" in server.private_mappings
     assert "dale" not in server.active_accounts
 
-    proto.Text.assert_called_with(text=LOGOUT_SUCCESSFUL)
+    proto.Text.assert_called_with(text=LOGOUT_SUCCESSFUL, lsn=server.applied_lsn)
 
 
 # Testing event-specific functions
 
+"""Testing that public events are published once and read through each user's cursor"""
+def test_notify_new_event():
+    server = CalendarServicer()
+
+    # Setting up mocks
+    proto.Text=MagicMock()
+    request = MagicMock()
+    for username in ["alyssa", "maegan"]:
+        server.register_user(MagicMock(text=username), None)
+        server.private_mappings[username] = []
+
+    request.host = "alyssa"
+    request.starttime = 0
+    request.duration = 1
+    request.description = "public"
+    server.schedule_public_event(request, None)
+
+    # Users registered later do not see earlier public events
+    server.register_user(MagicMock(text="dale"), None)
+    request.starttime = 3600
+    request.description = "private"
+    request.guestlist = "maegan"
+    server.schedule_private_event(request, None)
+
+    # The public event is stored once, not once per account
+    assert len(server.new_event_notifications.public_feed) == 1
+
+    # Hosts are not notified of their own events; guests see public and private events in order
+    assert list(server.notify_new_event(MagicMock(text="alyssa"), None)) == []
+    assert [event.description for event in server.notify_new_event(MagicMock(text="maegan"), None)] == ["public", "private"]
+    assert list(server.notify_new_event(MagicMock(text="maegan"), None)) == []
+    assert list(server.notify_new_event(MagicMock(text="dale"), None)) == []
+
+    # Events every user has read are compacted away
+    server.new_event_notifications.compact()
+    assert len(server.new_event_notifications.public_feed) == 0
+
+
+"""Testing that subscribers are pushed new events and the stream ends on logout"""
+def test_subscribe_events():
+    server = CalendarServicer()
+
+    # Setting up mocks
+    proto.Text=MagicMock()
+    request = MagicMock()
+    for username in ["alyssa", "maegan"]:
+        server.register_user(MagicMock(text=username), None)
+
+    stream = server.subscribe_events(MagicMock(text="maegan"), None)
+
+    request.host = "alyssa"
+    request.starttime = 0
+    request.duration = 1
+    request.description = "public"
+    server.schedule_public_event(request, None)
+
+    # Events scheduled before the stream started are read from the log first
+    assert next(stream).description == "public"
+
+    # Later events wake the subscriber up with a single pending signal, however many there are
+    for starttime in [3600, 7200]:
+        request.starttime = starttime
+        server.schedule_public_event(request, None)
+    assert server.subscriptions.subscriptions["maegan"][0].wakeups.qsize() == 1
+    assert [next(stream).starttime, next(stream).starttime] == [3600, 7200]
+
+    # Events pushed through the stream are not delivered again by polling
+    assert list(server.notify_new_event(MagicMock(text="maegan"), None)) == []
+
+    server.logout(MagicMock(text="maegan"), None)
+    assert list(stream) == []
+    assert "maegan" not in server.subscriptions.subscriptions
+
+    # Subscriptions are rejected at capacity
+    server.subscriptions.max_subscribers = 0
+    assert list(server.subscribe_events(MagicMock(text="alyssa"), None)) == []
+
+
+"""Testing that searches share the events lock while writers get it exclusively, per servicer"""
+def test_events_lock():
+    server = CalendarServicer()
+    other_server = CalendarServicer()
+    assert server.events_lock is not other_server.events_lock
+
+    # Any number of readers at once
+    server.events_lock.acquire_read()
+    server.events_lock.acquire_read()
+
+    # A writer waits for the readers to finish
+    writer = threading.Thread(target=server.events_lock.acquire_write)
+    writer.start()
+    writer.join(timeout=0.2)
+    assert writer.is_alive()
+
+    # Another servicer in the same process is not blocked
+    other_server.events_lock.acquire_write()
+    other_server.events_lock.release_write()
+
+    server.events_lock.release_read()
+    server.events_lock.release_read()
+    writer.join(timeout=1)
+    assert not writer.is_alive()
+    assert server.events_lock.writer
+    server.events_lock.release_write()
+
+
+"""Testing that searches stream an immutable snapshot while writes go ahead"""
+def test_event_snapshot():
+    server = CalendarServicer()
+    server.public_events = [Event(id=1, host="alyssa", starttime=1682830800, duration=1, description="lunch", guestlist=""), Event(id=2, host="alyssa", starttime=1682841600, duration=1, description="dinner", guestlist="")]
+
+    snapshot = server.event_snapshot()
+    assert [event.id for event in snapshot] == [1, 2]
+    # Reads without writes in between share one snapshot
+    assert server.event_snapshot() is snapshot
+
+    request = MagicMock(page_size=0, page_token="")
+    request.function = SEARCH_ALL_EVENTS
+    stream = server.search_events(request, None)
+    assert next(stream).description == "lunch"
+
+    # The open stream holds no lock, so an edit commits straight away
+    request = Event(id=2, starttime=1682845200, duration=2, description="late dinner")
+    editor = threading.Thread(target=server.edit_event, args=(request, None))
+    editor.start()
+    editor.join(timeout=1)
+    assert not editor.is_alive()
+
+    # The stream and the old snapshot keep the version they started with
+    assert next(stream).description == "dinner"
+    assert snapshot.events[1].description == "dinner"
+
+    new_snapshot = server.event_snapshot()
+    assert new_snapshot.version > snapshot.version
+    assert new_snapshot.events[1].description == "late dinner"
+    assert new_snapshot.events[1].duration == 2
+
+
 """Testing time conflicts in events"""
 def test_check_conflict():
     server = CalendarServicer()
@@ -202,33 +1176,60 @@ def test_check_conflict():
     assert server.check_conflict(event1, event2)
 
 
+"""Testing the interval index used for event conflicts against a brute-force scan"""
+def test_conflict_index():
+    index = ConflictIndex()
+    events = [Event(id=i, host="alyssa", starttime=(i * 7) % 50 * 3600, duration=(i % 3) + 1, guestlist="maegan") for i in range(1, 40)]
+    for event in events:
+        index.add(event.id, event.starttime, event.duration, participants=["alyssa" if event.id % 2 else "maegan"])
+    for event in events[::3]:
+        index.remove(event.id)
+    remaining = [event for event in events if event.id not in [removed.id for removed in events[::3]]]
+
+    server = CalendarServicer()
+    for starttime in range(0, 60 * 3600, 1800):
+        query = Event(starttime=starttime, duration=2)
+        expected = any(server.check_conflict(query, event) for event in remaining)
+        assert index.conflicts_public(starttime, 2) == expected
+
+        expected = any(server.check_conflict(query, event) for event in remaining if event.id % 2)
+        assert index.conflicts_private(starttime, 2, ["alyssa"]) == expected
+
+
 """Testing public event creation flow"""
 def test_schedule_public_event():
     server = CalendarServicer()
 
     # Setting up mocks
     server.check_conflict = MagicMock(return_value=False)
-    server.accounts = ["alyssa", "maegan"]
+    server.accounts = AccountRegistry(["alyssa", "maegan"])
     proto.Text=MagicMock()
     request = MagicMock()
     request.host = "alyssa"
-    request.starttime = 1
+    request.starttime = 0
     request.duration = 1
     request.description = "description"
-    server.new_event_notifications["maegan"] = []
-    server.public_events = [3, 4]
-    server.private_events = [1, 2]
+    server.new_event_notifications.register("maegan")
+    server.public_events = [Event(id=3, host="maegan", starttime=7200, duration=1), Event(id=4, host="maegan", starttime=14400, duration=1)]
+    server.private_events = [Event(id=1, host="maegan", starttime=3600, duration=1, guestlist="bob"), Event(id=2, host="bob", starttime=10800, duration=1, guestlist="maegan")]
 
     # Test creating a public event
     server.schedule_public_event(request, None)
 
     # Check that a notification was sent to all users
-    assert len(server.new_event_notifications["maegan"]) == 1
-    # Checks that time conflict is checked for all events (public and private)
-    assert server.check_conflict.call_count == 4
+    assert len(server.new_event_notifications.pending("maegan")) == 1
+    # Checks that time conflicts are answered by the index instead of scanning every event
+    assert server.check_conflict.call_count == 0
     assert len(server.public_events) == 3
 
-    proto.Text.assert_called_with(text=PUBLIC_EVENT_SCHEDULED)
+    proto.Text.assert_called_with(text=PUBLIC_EVENT_SCHEDULED, lsn=server.applied_lsn)
+
+    # Test that public events conflict with both public and private events
+    for starttime in [3600, 7200, 10800]:
+        request.starttime = starttime
+        server.schedule_public_event(request, None)
+        proto.Text.assert_called_with(text=EVENT_CONFLICT)
+    assert len(server.public_events) == 3
 
 
 """Testing private event creation flow"""""
@@ -240,27 +1241,41 @@ def test_schedule_private_event():
     proto.Text=MagicMock()
     request = MagicMock()
     request.host = "alyssa"
-    request.starttime = 1
+    request.starttime = 0
     request.duration = 1
     request.description = "description"
     request.guestlist = "maegan"
 
     server.private_mappings["alyssa"] = []
     server.private_mappings["maegan"] = [1]
-    server.public_events = [3, 4]
-    server.private_events = [Event(id=1), Event(id=2)]
-    server.new_event_notifications["maegan"] = []
+    server.private_mappings["bob"] = [2]
+    server.public_events = [Event(id=3, starttime=7200, duration=1), Event(id=4, starttime=14400, duration=1)]
+    server.private_events = [Event(id=1, host="maegan", starttime=3600, duration=1, guestlist="bob"), Event(id=2, host="bob", starttime=10800, duration=1, guestlist="dale")]
+    server.new_event_notifications.register("maegan")
 
     # Test creating a private event
     server.schedule_private_event(request, None)
 
     # Check that a notification was sent to invited guests
-    assert len(server.new_event_notifications["maegan"]) == 1
-    # Checks that time conflict is checked for all public events and guest's private events
-    assert server.check_conflict.call_count == 3
+    assert len(server.new_event_notifications.pending("maegan")) == 1
+    # Checks that time conflicts are answered by the index instead of scanning every event
+    assert server.check_conflict.call_count == 0
+    assert len(server.private_events) == 3
+
+    proto.Text.assert_called_with(text=PRIVATE_EVENT_SCHEDULED, lsn=server.applied_lsn)
+
+    # Test conflicts with public events and the guest's private events
+    for starttime in [3600, 7200]:
+        request.starttime = starttime
+        server.schedule_private_event(request, None)
+        proto.Text.assert_called_with(text=EVENT_CONFLICT)
     assert len(server.private_events) == 3
 
-    proto.Text.assert_called_with(text=PRIVATE_EVENT_SCHEDULED)
+    # Private events of other users do not conflict
+    request.starttime = 10800
+    server.schedule_private_event(request, None)
+    proto.Text.assert_called_with(text=PRIVATE_EVENT_SCHEDULED, lsn=server.applied_lsn)
+    assert len(server.private_events) == 4
 
 
 """Testing public event editing flow"""
@@ -276,18 +1291,24 @@ def test_edit_public_event():
     request.duration = 1
     request.description = "description"
 
-    server.public_events = [Event(id=3), Event(id=4)]
-    server.private_events = [Event(id=1), Event(id=2)]
+    server.public_events = [Event(id=3, starttime=0, duration=2), Event(id=4, starttime=7200, duration=1)]
+    server.private_events = [Event(id=1, host="alyssa", starttime=10800, duration=1, guestlist="maegan"), Event(id=2, host="maegan", starttime=14400, duration=1, guestlist="alyssa")]
 
-    # Test editing a public event
+    # Test editing a public event (an event never conflicts with itself)
     server.edit_event(request, None)
 
-    # Ensures that time conflicts are checked for all public events
-    assert server.check_conflict.call_count == 2
+    assert server.check_conflict.call_count == 0
     assert len(server.public_events) == 2
     assert server.public_events[0].duration == 1
 
-    proto.Text.assert_called_with(text=UPDATE_SUCCESSFUL)
+    proto.Text.assert_called_with(text=UPDATE_SUCCESSFUL, lsn=server.applied_lsn)
+
+    # Test that the edited event conflicts with public and private events
+    for starttime in [7200, 10800]:
+        request.starttime = starttime
+        server.edit_event(request, None)
+        proto.Text.assert_called_with(text=EVENT_CONFLICT)
+    assert server.public_events[0].starttime == 1
 
 
 """Testing private event editing flow"""
@@ -303,18 +1324,24 @@ def test_edit_private_event():
     request.duration = 1
     request.description = "description"
 
-    server.public_events = [Event(id=3), Event(id=4)]
-    server.private_events = [Event(id=1), Event(id=2)]
+    server.public_events = [Event(id=3, starttime=7200, duration=1), Event(id=4, starttime=14400, duration=1)]
+    server.private_events = [Event(id=1, host="bob", starttime=0, duration=1, guestlist="dale"), Event(id=2, host="alyssa", starttime=3600, duration=1, guestlist="maegan")]
 
     # Test editing a private event
     server.edit_event(request, None)
 
-    # Ensures that time conflicts are checked for all public events and private events
-    assert server.check_conflict.call_count == 2
+    # Ensures that private events of other users do not conflict
+    assert server.check_conflict.call_count == 0
     assert len(server.private_events) == 2
     assert server.private_events[1].duration == 1
 
-    proto.Text.assert_called_with(text=UPDATE_SUCCESSFUL)
+    proto.Text.assert_called_with(text=UPDATE_SUCCESSFUL, lsn=server.applied_lsn)
+
+    # Ensures that the edited event conflicts with public events
+    request.starttime = 7200
+    server.edit_event(request, None)
+    proto.Text.assert_called_with(text=EVENT_CONFLICT)
+    assert server.private_events[1].starttime == 1
 
 
 """Testing event deletion flow"""
@@ -325,8 +1352,8 @@ def test_delete_event():
     proto.Text=MagicMock()
     request = MagicMock()
     request.id = 3
-    server.public_events = [Event(id=3), Event(id=4)]
-    server.private_events = [Event(id=1), Event(id=2, host="alyssa", guestlist="maegan")]
+    server.public_events = [Event(id=3, starttime=0, duration=1), Event(id=4, starttime=3600, duration=1)]
+    server.private_events = [Event(id=1, starttime=7200, duration=1), Event(id=2, host="alyssa", starttime=10800, duration=1, guestlist="maegan")]
     server.private_mappings["maegan"] = [2]
     server.private_mappings["alyssa"] = [2]
 
@@ -337,7 +1364,7 @@ def test_delete_event():
     assert server.public_events[0].id == 4
     assert len(server.private_events) == 2
 
-    proto.Text.assert_called_with(text=EVENT_DELETED)
+    proto.Text.assert_called_with(text=EVENT_DELETED, lsn=server.applied_lsn)
 
     # Test deleting a private event
     request.id = 2
@@ -350,7 +1377,29 @@ def test_delete_event():
     assert len(server.private_mappings["maegan"]) == 0
     assert len(server.private_mappings["alyssa"]) == 0
 
-    proto.Text.assert_called_with(text=EVENT_DELETED)
+    proto.Text.assert_called_with(text=EVENT_DELETED, lsn=server.applied_lsn)
+
+
+"""Testing that edits and deletes replayed from the log resolve events through the id registry"""
+def test_event_registry_replay():
+    server = CalendarServicer()
+
+    server.process_line("Registration successful!: alyssa\n")
+    server.process_line("Registration successful!: maegan\n")
+    server.process_line("Public event scheduled.: alyssa: 0: 1: public\n")
+    server.process_line("Private event scheduled.: alyssa: 3600: 1: private: maegan\n")
+    assert list(server.events) == [1, 2]
+    assert server.private_mappings["maegan"] == [2]
+
+    server.process_line("Event edited.: 2: 7200: 2: edited\n")
+    assert server.events[2].starttime == 7200
+    assert server.events[2].description == "edited"
+
+    server.process_line("Event deleted.: 2\n")
+    assert list(server.events) == [1]
+    assert len(server.private_events) == 0
+    assert server.private_mappings["maegan"] == []
+    assert server.private_mappings["alyssa"] == []
 
 
 """Testing event search flow for all events"""
@@ -359,7 +1408,7 @@ def test_search_all_events():
 
     # Setting up mocks
     proto.Text=MagicMock()
-    request = MagicMock()
+    request = MagicMock(page_size=0, page_token="")
 
     server.public_events = [Event(id=1, host="alyssa", starttime=1, duration=1, description="public event 1", guestlist="maegan"),
                             Event(id=2, host="maegan", starttime=1, duration=1, description="public event 2", guestlist="alyssa")]
@@ -377,13 +1426,54 @@ def test_search_all_events():
     assert count == 4
 
 
+"""Testing paged searches and account listings resumed by token"""
+def test_search_pagination():
+    server = CalendarServicer()
+
+    # Setting up mocks
+    proto.Text=MagicMock(side_effect=lambda text, lsn=0: MagicMock(text=text, next_page_token=""))
+    request = MagicMock(page_size=2, page_token="")
+    server.public_events = [Event(id=i, host="alyssa", starttime=i * 3600, duration=1, description=f"event {i}", guestlist="") for i in range(1, 6)]
+
+    # The first page carries a token on its last event
+    request.function = SEARCH_ALL_EVENTS
+    page = list(server.search_events(request, None))
+    assert [result.id for result in page] == [1, 2]
+    assert page[0].next_page_token == ""
+    token = page[1].next_page_token
+    assert token != ""
+
+    # Later pages come from the same snapshot, even after a write
+    server.delete_event(MagicMock(id=3), None)
+    request.page_token = token
+    page = list(server.search_events(request, None))
+    assert [result.id for result in page] == [3, 4]
+
+    # The last page has no token, and a token can be retried
+    request.page_token = page[1].next_page_token
+    assert [(result.id, result.next_page_token) for result in server.search_events(request, None)] == [(5, "")]
+    assert [result.id for result in server.search_events(request, None)] == [5]
+
+    # Unknown tokens ask the client to search again
+    request.page_token = "expired"
+    assert [result.returntext for result in server.search_events(request, None)] == [INVALID_PAGE_TOKEN]
+
+    # Account listings page the same way
+    server.accounts = AccountRegistry(["dale", "alyssa", "dallen"])
+    request = MagicMock(text="", page_size=2, page_token="")
+    page = list(server.display_accounts(request, None))
+    assert [result.text for result in page] == ["dale", "alyssa"]
+    request.page_token = page[1].next_page_token
+    assert [result.text for result in server.display_accounts(request, None)] == ["dallen"]
+
+
 """Testing searching for events by user (host)"""
 def test_search_user_events():
     server = CalendarServicer()
 
     # Setting up mocks
     proto.Text=MagicMock()
-    request = MagicMock()
+    request = MagicMock(page_size=0, page_token="")
 
     server.public_events = [Event(id=1, host="alyssa", starttime=1, duration=1, description="public event 1", guestlist="maegan"),
                             Event(id=2, host="maegan", starttime=1, duration=1, description="public event 2", guestlist="alyssa")]
@@ -415,13 +1505,49 @@ def test_search_user_events():
     assert count == 1
 
 
+"""Testing exact host and participant searches served from the per-user indexes"""
+def test_search_host_and_participant_events():
+    server = CalendarServicer()
+
+    # Setting up mocks
+    proto.Text=MagicMock()
+    request = MagicMock(page_size=0, page_token="")
+
+    server.public_events = [Event(id=1, host="alyssa", starttime=1, duration=1, description="public event 1", guestlist="All"),
+                            Event(id=2, host="aly", starttime=7201, duration=1, description="public event 2", guestlist="All")]
+    server.private_events = [Event(id=3, host="maegan", starttime=14401, duration=1, description="private event 1", guestlist="aly"),
+                             Event(id=4, host="maegan", starttime=21601, duration=1, description="private event 2", guestlist="alyssa")]
+    server.private_mappings = {"alyssa": [4], "aly": [3], "maegan": [3, 4]}
+
+    # Regex search matches both hosts, exact search only the given host
+    request.function = SEARCH_USER
+    request.value = "aly"
+    assert [result.id for result in server.search_events(request, None)] == [1, 2]
+
+    request.function = SEARCH_HOST
+    assert [result.id for result in server.search_events(request, None)] == [2]
+
+    # Participant search includes events the user hosts and is invited to
+    request.function = SEARCH_PARTICIPANT
+    assert [result.id for result in server.search_events(request, None)] == [2, 3]
+
+    # Indexes follow deletes
+    request.id = 2
+    server.delete_event(request, None)
+    request.function = SEARCH_HOST
+    results = list(server.search_events(request, None))
+    assert len(results) == 1
+    assert results[0].returntext == NO_MATCH
+    assert "aly" not in server.host_events
+
+
 """Testing searching for events by description"""""
 def test_search_description_events():
     server = CalendarServicer()
 
     # Setting up mocks
     proto.Text=MagicMock()
-    request = MagicMock()
+    request = MagicMock(page_size=0, page_token="")
 
     server.public_events = [Event(id=1, host="alyssa", starttime=1, duration=1, description="public event 1", guestlist="maegan"),
                             Event(id=2, host="maegan", starttime=1, duration=1, description="public event 2", guestlist="alyssa")]
@@ -451,3 +1577,82 @@ def test_search_description_events():
         count += 1
     
     assert count == 1
+
+
+"""Testing keyword search and regex narrowing with the description index"""
+def test_search_keyword_events():
+    server = CalendarServicer()
+
+    # Setting up mocks
+    proto.Text=MagicMock()
+    request = MagicMock(page_size=0, page_token="")
+
+    server.public_events = [Event(id=1, host="alyssa", starttime=1, duration=1, description="Team standup", guestlist="All"),
+                            Event(id=2, host="maegan", starttime=7201, duration=1, description="Project review meeting", guestlist="All")]
+    server.private_events = [Event(id=3, host="alyssa", starttime=14401, duration=1, description="Team review", guestlist="maegan")]
+
+    # Every keyword must match the start of a word, case insensitively
+    request.function = SEARCH_KEYWORD
+    request.value = "team rev"
+    assert [result.id for result in server.search_events(request, None)] == [3]
+    request.value = "REVIEW"
+    assert [result.id for result in server.search_events(request, None)] == [2, 3]
+    request.value = "eview"
+    assert [result.returntext for result in server.search_events(request, None)] == [NO_MATCH]
+
+    # Plain substring searches only run the regular expression over indexed candidates
+    request.function = SEARCH_DESCRIPTION
+    request.value = "Project review m"
+    with patch.object(server.regex_guard, "filter", wraps=server.regex_guard.filter) as search:
+        assert [result.id for result in server.search_events(request, None)] == [2]
+        assert len(search.call_args.args[1]) == 1
+
+    # Index follows edits
+    request.id = 2
+    request.starttime = 7201
+    request.duration = 1
+    request.description = "Retro"
+    server.edit_event(request, None)
+    request.function = SEARCH_KEYWORD
+    request.value = "review"
+    assert [result.id for result in server.search_events(request, None)] == [3]
+
+
+"""Testing time window searches served from the start time index"""
+def test_search_time_events():
+    server = CalendarServicer()
+
+    # Setting up mocks
+    proto.Text=MagicMock()
+    request = MagicMock(page_size=0, page_token="")
+
+    server.public_events = [Event(id=1, host="alyssa", starttime=0, duration=5, description="long", guestlist="All"),
+                            Event(id=2, host="maegan", starttime=36000, duration=1, description="later", guestlist="All")]
+    server.private_events = [Event(id=3, host="alyssa", starttime=18000, duration=1, description="private", guestlist="maegan"),
+                             Event(id=4, host="bob", starttime=21600, duration=2, description="other", guestlist="dale")]
+    server.private_mappings = {"alyssa": [3], "maegan": [3], "bob": [4], "dale": [4]}
+
+    # Events overlapping the window, including one that started before it
+    request.function = SEARCH_TIME
+    request.value = "14400: 25200"
+    assert [result.id for result in server.search_events(request, None)] == [1, 3, 4]
+
+    # Half open windows: events ending at the window start are excluded
+    request.value = "18000: 36000"
+    assert [result.id for result in server.search_events(request, None)] == [3, 4]
+
+    # Only public events and the participant's own events
+    request.value = "0: 40000: maegan"
+    assert [result.id for result in server.search_events(request, None)] == [1, 3, 2]
+
+    # Index follows edits
+    request.id = 4
+    request.starttime = 50000
+    request.duration = 1
+    request.description = "other"
+    server.edit_event(request, None)
+    request.value = "14400: 25200"
+    assert [result.id for result in server.search_events(request, None)] == [1, 3]
+
+    request.value = "not a time"
+    assert [result.returntext for result in server.search_events(request, None)] == [NO_MATCH]
@@ -0,0 +1,29 @@
+import json
+import zlib
+
+from commands import Event
+
+# Size of each piece of a serialized state snapshot streamed to a replica
+STATE_CHUNK_BYTES = 1 << 20
+# A backup further than this many operations behind the leader gets a snapshot instead of a log replay
+SNAPSHOT_THRESHOLD_LSNS = 1024
+
+'''Serialized form of an event: [id, host, starttime, duration, description, guestlist].'''
+def event_fields(event):
+    return [event.id, event.host, event.starttime, event.duration, event.description, event.guestlist]
+
+def event_from_fields(fields):
+    id, host, starttime, duration, description, guestlist = fields
+    return Event(id=id, host=host, starttime=starttime, duration=duration, description=description, guestlist=guestlist)
+
+'''Serializes a state snapshot (a dict of lists, dicts, strings and numbers) to compressed JSON.'''
+def encode_state(state):
+    return zlib.compress(json.dumps(state, separators=(",", ":")).encode("utf-8"))
+
+def decode_state(data):
+    return json.loads(zlib.decompress(data).decode("utf-8"))
+
+'''Splits serialized state into pieces of at most size bytes.'''
+def state_chunks(data, size=STATE_CHUNK_BYTES):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
@@ -0,0 +1,37 @@
+import bisect
+import math
+
+from conflict_index import event_interval
+
+'''Sorted index of event start times answering "which events overlap [start, end)" by bisection.'''
+class StartTimeIndex:
+    def __init__(self):
+        self.entries = [] # sorted list of (start, event_id)
+        self.starts = {} # {event_id: (start, end)}
+        # Longest event seen; bounds how far before the window an overlapping event can start
+        self.max_length = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    '''Indexes an event by its start time.'''
+    def add(self, event_id, starttime, duration):
+        start, end = event_interval(starttime, duration)
+        self.starts[event_id] = (start, end)
+        self.max_length = max(self.max_length, end - start)
+        bisect.insort(self.entries, (start, event_id))
+
+    '''Removes an event from the index.'''
+    def remove(self, event_id):
+        if event_id not in self.starts:
+            return
+        start, end = self.starts.pop(event_id)
+        i = bisect.bisect_left(self.entries, (start, event_id))
+        if i < len(self.entries) and self.entries[i] == (start, event_id):
+            del self.entries[i]
+
+    '''Returns the ids of events overlapping [start, end) ordered by start time.'''
+    def overlapping(self, start, end):
+        lo = bisect.bisect_right(self.entries, (start - self.max_length, math.inf))
+        hi = bisect.bisect_left(self.entries, (end, -math.inf))
+        return [event_id for event_start, event_id in self.entries[lo:hi] if event_start >= start or self.starts[event_id][1] > start]